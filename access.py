@@ -0,0 +1,239 @@
+# access.py
+import argparse
+import os
+
+import instrumentation
+import tickets
+
+# ==============================
+# ROLE SCOPES
+# ==============================
+# Every dashboard ticket read goes through here. A role gets a fixed column list and a
+# row scope that is added to the WHERE clause, so a client session only ever receives
+# its own tickets, and none of the internal triage fields.
+ROLE_COLUMNS = {
+    "Client": [
+        "query_id",
+        "mail_id",
+        "mobile_number",
+        "query_heading",
+        "query_description",
+        "priority",
+        "status",
+        "due_at",
+        "query_created_time",
+        "query_closed_time",
+    ],
+    "Support": list(tickets.TICKET_COLUMNS),
+    "Admin": list(tickets.TICKET_COLUMNS),
+}
+
+def row_scope(role, username):
+    """Filters a role's ticket reads are always narrowed by."""
+    if role == "Client":
+        return {"username": username}
+    if role in ("Support", "Admin"):
+        return {}
+    raise PermissionError(f"Unknown role: {role!r}")
+
+def scoped(role, user, columns=None, **filters):
+    """``(columns, filters)`` for a read by ``role``; asking for more than it may see raises PermissionError.
+
+    ``user`` is the reader, kept apart from the ``username`` filter it may be passed with.
+    """
+    scope = row_scope(role, user)
+    allowed = ROLE_COLUMNS[role]
+    columns = list(columns or allowed)
+    denied = [c for c in columns if c not in allowed]
+    if denied:
+        raise PermissionError(f"{role} may not read ticket columns {denied}")
+    for field, value in scope.items():
+        if filters.get(field) not in (None, value):
+            raise PermissionError(f"{role} may not read tickets outside its own {field}")
+    return columns, {**filters, **scope}
+
+# ==============================
+# ROW-LEVEL SECURITY (optional)
+# ==============================
+# Defence in depth for deployments where the app connects as a non-superuser role
+# (superusers and BYPASSRLS roles skip policies). The policy denies by default: a session
+# sees rows only once it says who it is. Every connection the app, CLIs and background
+# jobs open declares itself SYSTEM_ROLE at connect time (db.connection_kwargs), and scoped
+# reads override that for their transaction with the dashboard role and user. Anything
+# else using the same database user (a stray psql, a reporting tool) sees no tickets.
+# Jobs may instead connect as a dedicated BYPASSRLS database role.
+RLS_ENABLED = os.getenv("PG_RLS", "0") == "1"
+SYSTEM_ROLE = "System"
+
+RLS_DDL = """
+    ALTER TABLE queries ENABLE ROW LEVEL SECURITY;
+    ALTER TABLE queries FORCE ROW LEVEL SECURITY;
+    DROP POLICY IF EXISTS cqms_role_scope ON queries;
+    CREATE POLICY cqms_role_scope ON queries
+        USING (CASE current_setting('cqms.role', true)
+                   WHEN 'Client' THEN username = current_setting('cqms.username', true)
+                   WHEN 'Support' THEN true
+                   WHEN 'Admin' THEN true
+                   WHEN 'System' THEN true
+                   ELSE false
+               END);
+"""
+
+DROP_RLS_DDL = """
+    DROP POLICY IF EXISTS cqms_role_scope ON queries;
+    ALTER TABLE queries NO FORCE ROW LEVEL SECURITY;
+    ALTER TABLE queries DISABLE ROW LEVEL SECURITY;
+"""
+
+def _run_ddl(conn, ddl):
+    cur = conn.cursor()
+    try:
+        cur.execute(ddl)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def install_rls(conn):
+    _run_ddl(conn, RLS_DDL)
+
+def drop_rls(conn):
+    _run_ddl(conn, DROP_RLS_DDL)
+
+def session_options(role=SYSTEM_ROLE):
+    """libpq ``options`` that tag a new connection's session with ``role``."""
+    return f"-c cqms.role={role}"
+
+def tag_transaction(conn, role, username):
+    """Make the RLS policy see this role/user for the rest of the current transaction."""
+    if not RLS_ENABLED:
+        return
+    cur = conn.cursor()
+    cur.execute("SELECT set_config('cqms.role', %s, true), set_config('cqms.username', %s, true)",
+                (role, username or ""))
+    cur.close()
+
+# ==============================
+# SCOPED READS
+# ==============================
+def fetch_tickets(conn, role, user, columns=None, after=None, limit=50, **filters):
+    columns, filters = scoped(role, user, columns, **filters)
+    tag_transaction(conn, role, user)
+    return tickets.fetch_tickets(conn, columns=columns, after=after, limit=limit, **filters)
+
+def get_ticket(conn, role, username, qid):
+    """One ticket as a dict with the role's columns, or None if missing or out of scope."""
+    columns, filters = scoped(role, username)
+    clauses, params = tickets._where(**filters)
+    tag_transaction(conn, role, username)
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT {', '.join(columns)} FROM queries WHERE {' AND '.join(['query_id = %s'] + clauses)}",
+        [int(qid)] + params
+    )
+    row = cur.fetchone()
+    cur.close()
+    return None if row is None else dict(zip(columns, row))
+
+def visible_ids(conn, role, username, ids):
+    """The subset of ``ids`` the role may see (e.g. to filter duplicate suggestions)."""
+    ids = sorted({int(i) for i in ids})
+    _, filters = scoped(role, username)
+    if not ids or not filters:
+        return set(ids)
+    clauses, params = tickets._where(**filters)
+    tag_transaction(conn, role, username)
+    cur = conn.cursor()
+    cur.execute(f"SELECT query_id FROM queries WHERE query_id = ANY(%s) AND {' AND '.join(clauses)}",
+                [ids] + params)
+    visible = {r[0] for r in cur.fetchall()}
+    cur.close()
+    return visible
+
+# ==============================
+# OVER-FETCH CHECK
+# ==============================
+def check_client_scope(conn, username, page_size=50):
+    """Read every page a client's dashboard can reach and return a list of problems (empty if none).
+
+    Checks that the pages hold exactly the client's tickets and only the Client columns.
+    The cursor factory's row counter also checks that the database sent no more rows
+    than that, plus the one look-ahead row per page.
+    """
+    problems = []
+    cur = conn.cursor()
+    cur.execute("SELECT query_id FROM queries WHERE username = %s AND NOT archived", (username,))
+    owned = {r[0] for r in cur.fetchall()}
+    cur.execute("SELECT query_id FROM queries WHERE username IS DISTINCT FROM %s LIMIT 1", (username,))
+    foreign = cur.fetchone()
+    cur.close()
+    conn.rollback()
+
+    seen, pages, after = [], 0, None
+    with instrumentation.render("access-check") as trace:
+        while True:
+            df, after = fetch_tickets(conn, "Client", username, after=after, limit=page_size)
+            pages += 1
+            extra = set(df.columns) - set(ROLE_COLUMNS["Client"])
+            if extra:
+                problems.append(f"page {pages} returned columns outside the Client scope: {sorted(extra)}")
+            seen.extend(int(q) for q in df["query_id"])
+            if after is None:
+                break
+        conn.rollback()
+    if set(seen) != owned or len(seen) != len(owned):
+        problems.append(f"pages held {len(seen)} tickets ({len(set(seen) - owned)} foreign), "
+                        f"client owns {len(owned)}")
+    if trace.rows > len(owned) + pages:
+        problems.append(f"database sent {trace.rows} rows for {len(owned)} owned tickets over {pages} pages")
+
+    if foreign is not None and get_ticket(conn, "Client", username, foreign[0]) is not None:
+        problems.append(f"get_ticket returned ticket #{foreign[0]} owned by someone else")
+    conn.rollback()
+    try:
+        scoped("Client", username, username="someone-else")
+        problems.append("a Client read with another username filter was allowed")
+    except PermissionError:
+        pass
+    return problems
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Role-scoped ticket access: RLS setup and over-fetch check")
+    parser.add_argument("--install-rls", action="store_true", help="enable the row-level security policy")
+    parser.add_argument("--drop-rls", action="store_true", help="remove the row-level security policy")
+    parser.add_argument("--check", nargs="*", metavar="CLIENT",
+                        help="check these clients (default: the five with the most tickets)")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        if args.install_rls:
+            install_rls(conn)
+            print("✅ Row-level security enabled on queries (set PG_RLS=1 for the app)")
+        if args.drop_rls:
+            drop_rls(conn)
+            print("✅ Row-level security removed from queries")
+        if args.check is not None:
+            clients = args.check
+            if not clients:
+                cur = conn.cursor()
+                cur.execute("""SELECT username FROM queries WHERE username IS NOT NULL
+                               GROUP BY username ORDER BY COUNT(*) DESC LIMIT 5""")
+                clients = [r[0] for r in cur.fetchall()]
+                cur.close()
+            failed = False
+            for client in clients:
+                problems = check_client_scope(conn, client)
+                for problem in problems:
+                    print(f"❌ {client}: {problem}")
+                if not problems:
+                    print(f"✅ {client}: only their own tickets and Client columns were fetched")
+                failed = failed or bool(problems)
+            if failed:
+                raise SystemExit(1)
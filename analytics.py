@@ -0,0 +1,76 @@
+# analytics.py
+import pandas as pd
+
+import tickets
+
+# ==============================
+# SQL PATH (one round trip)
+# ==============================
+# GROUPING SETS aggregates every breakdown in a single scan of queries; the result is a
+# few dozen rows that are split into per-chart frames in Python.
+TOP_SUPPORT_LIMIT = 10
+
+_MONTH = "to_char(date_trunc('month', query_created_time), 'YYYY-MM')"
+
+def _breakdowns(with_group):
+    # (output column, SQL expression) — one grouping set each.
+    cols = [("month", _MONTH), ("status", "status"), ("assigned_to", "assigned_to")]
+    if with_group:
+        cols.append(("support_group", "support_group"))
+    return cols
+
+def _analytics_sql(cols):
+    exprs = [expr for _, expr in cols]
+    select = ",\n               ".join(f"{expr} AS {name}" for name, expr in cols)
+    return f"""
+        SELECT {select},
+               GROUPING({', '.join(exprs)}) AS grouping_id,
+               COUNT(*) AS count
+        FROM queries
+        GROUP BY GROUPING SETS ({', '.join(f'({e})' for e in exprs)})
+    """
+
+def admin_analytics(conn):
+    """Return {"monthly", "status", "top_support", "group_usage"} frames in one query."""
+    cols = _breakdowns(tickets.has_ticket_column(conn, "support_group"))
+    raw = pd.read_sql(_analytics_sql(cols), conn)
+
+    # GROUPING() sets a bit for every column *not* in the row's set, first column = MSB.
+    width = len(cols)
+    parts = {}
+    for i, (name, _) in enumerate(cols):
+        bits = ((1 << width) - 1) ^ (1 << (width - 1 - i))
+        part = raw.loc[(raw["grouping_id"] == bits) & raw[name].notna(), [name, "count"]]
+        parts[name] = part.reset_index(drop=True)
+    return _finish(
+        parts["month"].sort_values("month"),
+        parts["status"].sort_values("count", ascending=False),
+        parts["assigned_to"],
+        parts.get("support_group", pd.DataFrame(columns=["support_group", "count"])),
+    )
+
+# ==============================
+# VECTORISED PATH (cached compact frame)
+# ==============================
+def frame_analytics(df):
+    """Same results as ``admin_analytics`` computed from an in-memory ticket frame."""
+    created = pd.to_datetime(df["query_created_time"], errors="coerce")
+    monthly = created.dt.to_period("M").value_counts().sort_index()
+    monthly = pd.DataFrame({"month": monthly.index.astype(str), "count": monthly.values})
+
+    status = df["status"].value_counts().rename_axis("status").reset_index(name="count")
+    assigned = df["assigned_to"].value_counts().rename_axis("assigned_to").reset_index(name="count")
+    if "support_group" in df.columns:
+        groups = df["support_group"].value_counts().rename_axis("support_group").reset_index(name="count")
+    else:
+        groups = pd.DataFrame(columns=["support_group", "count"])
+    return _finish(monthly, status, assigned, groups)
+
+def _finish(monthly, status, assigned, groups):
+    top = assigned.sort_values("count", ascending=False, kind="stable").head(TOP_SUPPORT_LIMIT)
+    return {
+        "monthly": monthly.reset_index(drop=True),
+        "status": status.reset_index(drop=True),
+        "top_support": top.reset_index(drop=True),
+        "group_usage": groups.sort_values("count", ascending=False).reset_index(drop=True),
+    }
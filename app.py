@@ -1,37 +1,233 @@
 import streamlit as st
-import psycopg2
 import pandas as pd
-import hashlib
-from datetime import datetime
+import logging
 import os
+import psycopg2
+import tempfile
+from datetime import datetime
 from dotenv import load_dotenv
 
+import access
+import analytics
+import assignment
+import db
+import export
+import feeds
+import hashing
+import instrumentation
+import metrics
+import notify
+import partitioning
+import similarity
+import sla
+import ticket_store
+import tickets
+import timeline
+import writebehind
+from cache import QueryCache
+
 # -------------------- Row color helper --------------------
-def color_status(val):
-    if val == "Open":
-        return "background-color:#D6EAF8; color:#154360;"
-    elif val == "In Progress":
-        return "background-color:#FAD7A0; color:#7D6608;"
-    elif val == "Closed":
-        return "background-color:#D5F5E3; color:#145A32;"
-    return ""
+STATUS_STYLES = {
+    "Open": "background-color:#D6EAF8; color:#154360;",
+    "In Progress": "background-color:#FAD7A0; color:#7D6608;",
+    "Closed": "background-color:#D5F5E3; color:#145A32;",
+}
+
+def status_css(df):
+    # One vectorised map over the status column instead of a Python callback per cell.
+    css = pd.DataFrame("", index=df.index, columns=df.columns)
+    if "status" in df.columns:
+        css["status"] = df["status"].astype(object).map(STATUS_STYLES).fillna("")
+    return css
 
 # -------------------- Load env --------------------
 load_dotenv()
 
 # -------------------- DB connection --------------------
+def get_pool():
+    # db's module-level pool: one per process, shared by every session, rerun, the
+    # write-behind flusher and db.get_connection(), so the connection budget is counted once.
+    return db.get_pool()
+
 def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("PG_HOST", "localhost"),
-        port=os.getenv("PG_PORT", "5432"),
-        database=os.getenv("PG_DB", "CQMS"),
-        user=os.getenv("PG_USER", "postgres"),
-        password=os.getenv("PG_PASSWORD", "123")
-    )
+    # Use as ``with get_connection() as conn:`` — the connection goes back to the pool on exit.
+    return get_pool().connection()
+
+@st.cache_resource
+def get_cache():
+    # Shared by all sessions, so one user's write invalidates everyone's stale reads.
+    return QueryCache()
+
+def _apply_event(cache, engine, event):
+    # Events from this process were already applied synchronously by the writer.
+    if event.get("origin") == notify.ORIGIN:
+        return
+    topic = event.get("topic")
+    if topic == "tickets":
+        cache.invalidate_tickets(event.get("rows"))
+        rows = event.get("rows")
+        if rows and len(rows) == 2:
+            engine.apply_change(rows[0], rows[1])
+        elif rows:
+            engine.apply_change(None, rows[0])
+        else:
+            engine.stale = True
+    elif topic == "availability" and event.get("username"):
+        cache.invalidate("availability")
+        engine.set_availability(event["username"], event.get("status") == "Available")
+    elif topic == "chat" and event.get("sender"):
+        people = (None, event["sender"], event["receiver"])
+        cache.invalidate("chat", predicate=lambda tags: tags["participant"] in people)
+    elif topic == "doubts" and event.get("user_name"):
+        cache.invalidate("doubts", predicate=lambda tags: tags["user_name"] in (None, event["user_name"]))
+    elif topic in ("chat", "doubts", "availability"):
+        cache.invalidate(topic)
+
+@st.cache_resource
+def get_event_hub():
+    # One LISTEN connection per process; it keeps every process's cache in step with writes.
+    cache, engine = get_cache(), get_assignment_engine()
+    hub = notify.EventHub(db.connection_kwargs())
+    hub.subscribe(lambda event: _apply_event(cache, engine, event))
+    return hub.start()
+
+@st.cache_resource
+def _assignment_engine():
+    engine = assignment.AssignmentEngine()
+    engine.stale = True  # loaded on first use
+    return engine
+
+def get_assignment_engine():
+    # Loaded from the database once, then kept current by the write paths and LISTEN events.
+    engine = _assignment_engine()
+    if engine.stale:
+        with get_connection() as conn:
+            assignment.load_engine(conn, engine)
+    return engine
+
+@st.cache_resource
+def get_sla_sweeper():
+    # One breach sweeper per process; SKIP LOCKED keeps several processes from colliding.
+    cache, hub = get_cache(), get_event_hub()
+
+    def on_flagged(rows):
+        cache.invalidate_tickets(rows)
+        hub.bump("tickets")
+
+    interval = float(os.getenv("SLA_SWEEP_INTERVAL", "60"))
+    return sla.SlaSweeper(get_pool(), interval=interval, on_flagged=on_flagged).start()
+
+WRITE_ACK_TIMEOUT = 5.0
+
+@st.cache_resource
+def get_write_queue():
+    # Chat, doubts and availability toggles are batched by one flusher per process instead
+    # of a connection and commit per click; caches and the engine update once the batch commits.
+    cache, engine, hub = get_cache(), get_assignment_engine(), get_event_hub()
+
+    def on_flush(written):
+        for sender, receiver in written["chat"]:
+            people = (None, sender, receiver)
+            cache.invalidate("chat", predicate=lambda tags: tags["participant"] in people)
+        for user_name in written["doubts"]:
+            cache.invalidate("doubts", predicate=lambda tags: tags["user_name"] in (None, user_name))
+        if written["availability"]:
+            cache.invalidate("availability")
+            for username, status in written["availability"].items():
+                engine.set_availability(username, status == "Available")
+        for topic in ("chat", "doubts", "availability"):
+            if written[topic]:
+                hub.bump(topic)
+
+    return writebehind.WriteBehindQueue(
+        get_pool(),
+        interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "0.25")),
+        max_batch=int(os.getenv("WRITE_BEHIND_BATCH", "500")),
+        on_flush=on_flush,
+    ).start()
+
+@st.cache_resource
+def get_metrics_exporter():
+    # Pool and cache gauges sit next to the span histograms; METRICS_PORT also serves /metrics.
+    pool, cache, write_queue = get_pool(), get_cache(), get_write_queue()
+    instrumentation.register_gauge("cqms_pool", pool.stats, label="stat",
+                                   help_text="Connection pool counters")
+    instrumentation.register_gauge("cqms_write_behind", write_queue.stats, label="stat",
+                                   help_text="Write-behind queue depth, flushes and flush latency")
+    for counter in ("hits", "misses", "size", "invalidations"):
+        instrumentation.register_gauge(
+            f"cqms_cache_{counter}",
+            lambda counter=counter: {name: s[counter] for name, s in cache.stats().items()},
+            label="dataset",
+        )
+    port = os.getenv("METRICS_PORT")
+    return instrumentation.start_exporter(int(port)) if port else None
+
+@st.cache_resource
+def _similarity_index():
+    # Signatures persist on disk, so a restart only re-reads tickets changed since the last save.
+    index = similarity.SimilarityIndex.load(similarity.INDEX_PATH)
+    with get_connection() as conn:
+        index.refresh(conn)
+    try:
+        index.save(similarity.INDEX_PATH)
+    except OSError:
+        pass
+    return index
+
+def get_similarity_index():
+    index = _similarity_index()
+    version, purges = get_event_hub().version("tickets", "purges")
+    if index.purges != purges:
+        index.request_reconcile()
+        index.purges = purges
+    if index.version != version or index.reconcile_due():
+        # Picks up tickets other processes created or edited (an updated_at range read),
+        # and now and then drops tickets deleted or moved to cold storage.
+        with get_connection() as conn:
+            index.refresh(conn)
+        index.version = version
+    return index
+
+def owned_ticket_ids(username, ids):
+    """The subset of ``ids`` raised by ``username``."""
+    with get_connection() as conn:
+        return access.visible_ids(conn, "Client", username, ids)
+
+@instrumentation.timed()
+def find_similar_tickets(heading, desc, exclude=None):
+    if not (heading or "").strip() and not (desc or "").strip():
+        return []
+    matches = get_similarity_index().similar(heading, desc, exclude=exclude)
+    role, username = current_scope()
+    if matches and access.row_scope(role, username):
+        # Clients only get hints about their own tickets, never other clients' headings.
+        with get_connection() as conn:
+            visible = access.visible_ids(conn, role, username, [m[0] for m in matches])
+        matches = [m for m in matches if m[0] in visible]
+    return matches
+
+def similar_tickets_hint(matches, title):
+    if matches:
+        st.markdown(f"**{title}**")
+        for qid, score, heading, status in matches:
+            st.caption(f"#{qid} · {heading} [{status}] — {score:.0%} similar")
+
+def _filters_key(filters):
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, set)) else v) for k, v in filters.items()))
 
 # -------------------- Password hash --------------------
+@st.cache_resource
+def get_password_pool():
+    # Slow KDF work runs on a small bounded pool, never on the script thread.
+    return hashing.VerificationPool(
+        hashing.hasher_from_env(),
+        workers=int(os.getenv("LOGIN_WORKERS", "4")),
+        max_pending=int(os.getenv("LOGIN_MAX_PENDING", "32")),
+    )
+
 def make_hash(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return get_password_pool().hash(password)
 
 # -------------------- Priority index --------------------
 def safe_priority_index(value):
@@ -39,144 +235,511 @@ def safe_priority_index(value):
     return priorities.index(value) if value in priorities else 1
 
 # -------------------- Auth --------------------
+@instrumentation.timed()
 def authenticate_user(username, password, role):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT 1 FROM users WHERE username=%s AND hashed_password=%s AND role=%s",
-        (username.strip(), make_hash(password), role)
-    )
-    res = cur.fetchone()
-    conn.close()
-    return res is not None
+    username = username.strip()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT hashed_password FROM users WHERE username=%s AND role=%s",
+            (username, role)
+        )
+        res = cur.fetchone()
+    if res is None:
+        return False
+
+    ok, new_hash = get_password_pool().verify(password, res[0])
+    if ok and new_hash:
+        # Transparent upgrade of legacy / lower-cost hashes; skipped if the row changed meanwhile.
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE users SET hashed_password=%s WHERE username=%s AND role=%s AND hashed_password=%s",
+                (new_hash, username, role, res[0])
+            )
+            conn.commit()
+    return ok
 
 def register_user(username, password, role):
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
+    # Hash first: a busy verification pool is not a duplicate username.
+    hashed = make_hash(password)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "INSERT INTO users (username, hashed_password, role) VALUES (%s,%s,%s)",
+                (username.strip(), hashed, role)
+            )
+            conn.commit()
+        except psycopg2.IntegrityError:
+            conn.rollback()
+            raise ValueError("Username already exists or invalid input")
+    if role == "Support":
+        get_cache().invalidate("support_users")
+        # No availability row yet counts as Available.
+        get_assignment_engine().set_availability(username.strip(), True)
+
+def reset_password(username, password, role):
+    hashed = make_hash(password)
+    with get_connection() as conn:
+        cur = conn.cursor()
         cur.execute(
-            "INSERT INTO users (username, hashed_password, role) VALUES (%s,%s,%s)",
-            (username.strip(), make_hash(password), role)
+            "UPDATE users SET hashed_password=%s WHERE username=%s AND role=%s",
+            (hashed, username.strip(), role)
         )
         conn.commit()
-    except Exception:
-        conn.rollback()
-        raise ValueError("Username already exists or invalid input")
-    finally:
-        conn.close()
-
-def reset_password(username, password, role):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET hashed_password=%s WHERE username=%s AND role=%s",
-        (make_hash(password), username.strip(), role)
-    )
-    conn.commit()
-    conn.close()
 
 # -------------------- Queries --------------------
+@instrumentation.timed()
 def submit_query(username, email, mobile, heading, desc):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO queries
-           (username, mail_id, mobile_number, query_heading, query_description,
-            status, priority, query_created_time)
-           VALUES (%s,%s,%s,%s,%s,'Open','Medium',%s)""",
-        (username, email, mobile, heading, desc, datetime.now())
+    """Create the ticket; returns ``(query_id, linked_to)`` where ``linked_to`` is an auto-linked duplicate."""
+    # Route straight to the least-loaded Available support user (None if nobody is available).
+    engine = get_assignment_engine()
+    agent = engine.pick("Medium")
+    index = get_similarity_index()
+    matches = index.similar(heading, desc)
+    try:
+        with get_connection() as conn:
+            qid = tickets.create_ticket(conn, username, email, mobile, heading, desc, assigned_to=agent)
+    except Exception:
+        engine.apply_change({"assigned_to": agent, "priority": "Medium", "status": "Open"}, None)
+        raise
+    index.add(qid, heading, desc)
+    get_cache().invalidate_tickets([
+        {"username": username, "status": "Open", "priority": "Medium", "assigned_to": agent}
+    ])
+    get_event_hub().bump("tickets")
+
+    # The ticket is already committed, so linking is best-effort: a failure here must
+    # not look like a failed submit (the client would resubmit and create a duplicate).
+    linked_to = next(
+        (m for m in matches if m[1] >= similarity.AUTO_LINK_THRESHOLD and m[3] != "Closed"), None
     )
-    conn.commit()
-    conn.close()
-
-def get_queries():
-    conn = get_connection()
-    df = pd.read_sql("SELECT * FROM queries ORDER BY query_created_time DESC", conn)
-    conn.close()
-    return df
-
+    if linked_to:
+        try:
+            with get_connection() as conn:
+                similarity.link_duplicates(conn, [(qid, linked_to[0], linked_to[1])])
+        except Exception:
+            logging.getLogger(__name__).warning(
+                "Could not link ticket #%s to #%s", qid, linked_to[0], exc_info=True)
+            linked_to = None
+    return qid, linked_to[0] if linked_to else None
+
+@instrumentation.timed()
 def update_ticket(qid, status, heading, desc, priority, assigned_to=None):
-    conn = get_connection()
-    cur = conn.cursor()
-    if assigned_to:
-        cur.execute(
-            """UPDATE queries SET
-               status=%s, query_heading=%s, query_description=%s,
-               priority=%s, assigned_to=%s,
-               query_closed_time = CASE WHEN %s='Closed' THEN %s ELSE query_closed_time END
-               WHERE query_id=%s""",
-            (status, heading, desc, priority, assigned_to, status, datetime.now(), qid)
+    with get_connection() as conn:
+        before, after = tickets.update_ticket(
+            conn, qid, status, heading, desc, priority, assigned_to,
+            changed_by=st.session_state.get("username"),
         )
-    else:
-        cur.execute(
-            """UPDATE queries SET
-               status=%s, query_heading=%s, query_description=%s, priority=%s,
-               query_closed_time = CASE WHEN %s='Closed' THEN %s ELSE query_closed_time END
-               WHERE query_id=%s""",
-            (status, heading, desc, priority, status, datetime.now(), qid)
+    if after is not None:
+        get_cache().invalidate_tickets([before, after])
+        get_assignment_engine().apply_change(before, after)
+        get_similarity_index().add(int(qid), heading, desc, status)
+        get_event_hub().bump("tickets")
+
+@instrumentation.timed()
+def bulk_update_tickets(ids, status, priority, assigned_to=None):
+    with get_connection() as conn:
+        results = tickets.bulk_update_tickets(
+            conn, ids, status, priority, assigned_to, changed_by=st.session_state.get("username")
         )
-    conn.commit()
-    conn.close()
+    get_cache().invalidate_tickets()
+    get_assignment_engine().stale = True
+    get_event_hub().bump("tickets")
+    return results
+
+@instrumentation.timed()
+def auto_assign_backlog(rebalance=False):
+    engine = get_assignment_engine()
+    with get_connection() as conn:
+        moved = assignment.rebalance(conn, engine) if rebalance else assignment.assign_backlog(conn, engine)
+    if moved:
+        get_cache().invalidate_tickets()
+        get_event_hub().bump("tickets")
+    return moved
+
+def current_scope():
+    # (role, username) of the logged-in session; ticket reads are narrowed to what the role may see.
+    return st.session_state.get("role"), st.session_state.get("username")
+
+@instrumentation.timed()
+def get_ticket_page(after=None, limit=50, columns=None, **filters):
+    role, username = current_scope()
+    columns, filters = access.scoped(role, username, columns, **filters)
+    key = (_filters_key(filters), after, limit, tuple(columns))
+    def load():
+        with get_connection() as conn:
+            return access.fetch_tickets(conn, role, username, columns=columns, after=after, limit=limit, **filters)
+    return get_cache().get_or_load("ticket_pages", key, load, tags=filters)
+
+@instrumentation.timed()
+def get_ticket(qid):
+    with get_connection() as conn:
+        return access.get_ticket(conn, *current_scope(), qid)
+
+@instrumentation.timed()
+def search_ticket_page(text, after=None, limit=20, **filters):
+    key = ("search", text.strip().lower(), _filters_key(filters), after, limit)
+    def load():
+        with get_connection() as conn:
+            return tickets.search_tickets(conn, text, after=after, limit=limit, **filters)
+    return get_cache().get_or_load("ticket_pages", key, load, tags=filters)
+
+@instrumentation.timed()
+def search_ticket_facets(text, **filters):
+    key = ("search_facets", text.strip().lower(), _filters_key(filters))
+    def load():
+        with get_connection() as conn:
+            return tickets.search_facets(conn, text, **filters)
+    return get_cache().get_or_load("ticket_counts", key, load, tags=filters)
+
+@instrumentation.timed()
+def add_ticket_comment(qid, comment):
+    with get_connection() as conn:
+        timeline.add_comment(conn, qid, st.session_state.get("username"), comment)
+
+@instrumentation.timed()
+def get_ticket_timeline(qid, before=None, limit=20):
+    # Uncached: one bounded, indexed read per page, and comments should show up at once.
+    with get_connection() as conn:
+        return timeline.fetch_timeline(conn, qid, before=before, limit=limit)
+
+@instrumentation.timed()
+def with_latest_comments(df):
+    """Add latest_comment / commented_at columns for the tickets in ``df`` in one query."""
+    if df.empty:
+        return df
+    with get_connection() as conn:
+        latest = timeline.latest_comments(conn, df["query_id"].tolist())
+    df = df.copy()
+    df["latest_comment"] = [latest.get(int(q), {}).get("comment") for q in df["query_id"]]
+    df["commented_at"] = [latest.get(int(q), {}).get("commented_at") for q in df["query_id"]]
+    return df
+
+@instrumentation.timed()
+def get_triage_queue(**scope):
+    def load():
+        with get_connection() as conn:
+            return tickets.fetch_triage_queue(conn, **scope)
+    return get_cache().get_or_load("ticket_pages", ("triage", _filters_key(scope)), load, tags=scope)
+
+@instrumentation.timed()
+def get_ticket_summary():
+    # KPI tiles: O(1) counter rows maintained by triggers, plus SLA counts from the due_at index.
+    def load():
+        with get_connection() as conn:
+            summary = metrics.get_ticket_metrics(conn)
+            summary.update(sla.sla_counts(conn))
+        return summary
+    return dict(get_cache().get_or_load("ticket_counts", ("summary",), load, tags={}))
+
+@instrumentation.timed()
+def get_ticket_count(**filters):
+    # An indexed COUNT over live tickets only (tickets._where adds NOT archived).
+    def load():
+        with get_connection() as conn:
+            return tickets.count_tickets(conn, **filters)
+    return get_cache().get_or_load("ticket_counts", ("count", _filters_key(filters)), load, tags=filters)
+
+@instrumentation.timed()
+def get_due_tickets(**scope):
+    def load():
+        with get_connection() as conn:
+            return sla.fetch_due(conn, **scope)
+    return get_cache().get_or_load("ticket_counts", ("due", _filters_key(scope)), load, tags=scope)
+
+@st.cache_resource
+def get_ticket_store():
+    # One compact, categorical copy of the ticket table per process, shared by all sessions.
+    # Analytics only: it includes archived tickets, so dashboards count with get_ticket_count.
+    return ticket_store.TicketStore(get_pool())
+
+@instrumentation.timed()
+def current_tickets():
+    store, hub = get_ticket_store(), get_event_hub()
+    purges = hub.version("purges")
+    if store.purges != purges:
+        # Tickets moved to cold storage never show up in an updated_at refresh.
+        store.request_full_reload()
+        store.purges = purges
+    store.refresh_if_needed(hub.version("tickets"))
+    return store.frame()
+
+@instrumentation.timed()
+def get_analytics():
+    # Charts come from vectorised groupbys over the shared compact frame; cached until a ticket write.
+    def load():
+        return analytics.frame_analytics(current_tickets())
+    return get_cache().get_or_load("ticket_counts", ("analytics",), load, tags={})
+
+# -------------------- Export --------------------
+@instrumentation.timed()
+def export_dataset(fmt, dataset, **filters):
+    """Stream an export into a temp file; returns ``(path, stats)``. Rows never pass through pandas."""
+    fd, path = tempfile.mkstemp(prefix="cqms_export_", suffix=export.FORMATS[fmt][0])
+    try:
+        with os.fdopen(fd, "wb") as out, get_connection() as conn:
+            stats = export.export(conn, out, fmt, dataset, **filters)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, stats
+
+# -------------------- Partitions --------------------
+def get_partition_stats():
+    # Catalog estimates only, so this stays cheap however large the archive gets.
+    with get_connection() as conn:
+        return pd.DataFrame(partitioning.partition_stats(conn))
 
 # -------------------- Chat (persistent) --------------------
+@instrumentation.timed()
 def save_chat_message(sender, receiver, message):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO support_chat (sender, receiver, message) VALUES (%s,%s,%s)",
-        (sender, receiver, message)
-    )
-    conn.commit()
-    conn.close()
-
-def get_chat_messages():
-    conn = get_connection()
-    df = pd.read_sql(
-        "SELECT sender, receiver, message, created_at FROM support_chat ORDER BY created_at DESC",
-        conn
-    )
-    conn.close()
-    return df
+    # True once committed; False if the batch has not landed within WRITE_ACK_TIMEOUT.
+    # Raises writebehind.WriteFailed if the write was rejected or failed for good.
+    return get_write_queue().submit_chat(sender, receiver, message).wait(WRITE_ACK_TIMEOUT)
+
+@instrumentation.timed()
+def get_chat_feed(participant=None, after_id=None, before_id=None):
+    def load():
+        with get_connection() as conn:
+            return feeds.fetch_chat(conn, participant, after_id, before_id, FEED_PAGE)
+    key = (participant, after_id, before_id)
+    return get_cache().get_or_load("chat", key, load, tags={"participant": participant})
 
 # -------------------- Doubts (persistent) --------------------
+@instrumentation.timed()
 def save_support_doubt(user_name, doubt):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO support_doubts (user_name, doubt) VALUES (%s,%s)",
-        (user_name, doubt)
-    )
-    conn.commit()
-    conn.close()
-
-def get_support_doubts():
-    conn = get_connection()
-    df = pd.read_sql(
-        "SELECT user_name, doubt, created_at FROM support_doubts ORDER BY created_at DESC",
-        conn
-    )
-    conn.close()
-    return df
+    return get_write_queue().submit_doubt(user_name, doubt).wait(WRITE_ACK_TIMEOUT)
+
+@instrumentation.timed()
+def get_doubts_feed(user_name=None, after_id=None, before_id=None):
+    def load():
+        with get_connection() as conn:
+            return feeds.fetch_doubts(conn, user_name, after_id, before_id, FEED_PAGE)
+    key = (user_name, after_id, before_id)
+    return get_cache().get_or_load("doubts", key, load, tags={"user_name": user_name})
+
+# -------------------- Feeds (session state) --------------------
+FEED_PAGE = 100
+
+def sync_feed(key, fetch, topic):
+    # Pull only rows newer than what this session already holds, and only after the
+    # listener has seen a change on the topic (falls back to checking every rerun).
+    hub = get_event_hub()
+    feed = st.session_state.setdefault(key, feeds.new_feed())
+    version = hub.version(topic)
+    if hub.connected and feed["items"] is not None and feed.get("version") == version:
+        return feed
+    while True:
+        new_rows = fetch(after_id=feed["newest"])
+        feeds.merge_new(feed, new_rows, FEED_PAGE)
+        if len(new_rows) < FEED_PAGE:
+            break
+    feed["version"] = version
+    return feed
+
+def show_feed(key, feed, fetch, empty_message):
+    if feed["items"] is None or feed["items"].empty:
+        st.info(empty_message)
+        return
+    # Newest first, as before; the id watermark is an implementation detail.
+    st.dataframe(feed["items"].iloc[::-1].drop(columns="id"), use_container_width=True, hide_index=True)
+    if feed["has_older"] and st.button("Load older", key=f"{key}_older"):
+        feeds.merge_older(feed, fetch(before_id=feed["oldest"]), FEED_PAGE)
+        st.rerun()
 
 # -------------------- Availability (persistent) --------------------
+@instrumentation.timed()
 def set_support_availability(username, status):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO support_availability (username, status, updated_at)
-           VALUES (%s,%s,%s)
-           ON CONFLICT (username)
-           DO UPDATE SET status=EXCLUDED.status, updated_at=EXCLUDED.updated_at""",
-        (username, status, datetime.now())
-    )
-    conn.commit()
-    conn.close()
+    return get_write_queue().submit_availability(username, status).wait(WRITE_ACK_TIMEOUT)
 
+@instrumentation.timed()
 def get_support_availability():
-    conn = get_connection()
-    df = pd.read_sql("SELECT username, status, updated_at FROM support_availability", conn)
-    conn.close()
-    return df
+    def load():
+        with get_connection() as conn:
+            return pd.read_sql("SELECT username, status, updated_at FROM support_availability", conn)
+    return get_cache().get_or_load("availability", "all", load)
+
+# -------------------- Support users --------------------
+@instrumentation.timed()
+def get_support_users():
+    def load():
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT username FROM users WHERE role='Support' ORDER BY username")
+            return [r[0] for r in cur.fetchall()]
+    return list(get_cache().get_or_load("support_users", "all", load))
+
+# -------------------- Ticket grid --------------------
+GRID_ROW_HEIGHT = 35
+
+def ticket_grid(key, page_size=50, window=200, height=400, columns=None, decorate=None,
+                empty_message="No tickets to show.", **filters):
+    """Show a scrolling window of at most ``window`` tickets and return it as a DataFrame.
+
+    Only the window is fetched, styled and sent to the browser. Moving down loads the next
+    keyset page from the database and drops the oldest page once the window is full;
+    moving up re-reads the dropped page from its saved cursor. Session state holds
+    cursors only, and each page read goes through the shared cache. ``decorate`` adds
+    columns to the window (e.g. latest comments) before it is styled.
+    """
+    state_key = f"{key}_grid"
+    grid = st.session_state.get(state_key)
+    if grid is None or grid["filters"] != filters:
+        # "pages" are the start cursors of the pages in view; "above" those scrolled past.
+        grid = st.session_state[state_key] = {"filters": filters, "above": [], "pages": [None]}
+    max_pages = max(1, window // page_size)
+
+    frames, next_cursor = [], None
+    for cursor in grid["pages"]:
+        page_df, next_cursor = get_ticket_page(after=cursor, limit=page_size, columns=columns, **filters)
+        frames.append(page_df)
+    view = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if decorate is not None:
+        view = decorate(view)
+
+    first_row = len(grid["above"]) * page_size
+    if view.empty:
+        st.info(empty_message)
+    else:
+        with instrumentation.span("render.ticket_grid"):
+            css = status_css(view)
+            st.dataframe(
+                view.style.apply(lambda _: css, axis=None),
+                height=min(height, GRID_ROW_HEIGHT * (len(view) + 1) + 3),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    c1, c2, c3 = st.columns([1, 1, 4])
+    if c1.button("⬆ Earlier", key=f"{key}_up", disabled=not grid["above"]):
+        grid["pages"].insert(0, grid["above"].pop())
+        if len(grid["pages"]) > max_pages:
+            grid["pages"].pop()
+        st.rerun()
+    if c2.button("⬇ Load more", key=f"{key}_down", disabled=next_cursor is None):
+        grid["pages"].append(next_cursor)
+        if len(grid["pages"]) > max_pages:
+            grid["above"].append(grid["pages"].pop(0))
+        st.rerun()
+    if not view.empty:
+        c3.caption(f"Rows {first_row + 1:,}–{first_row + len(view):,}"
+                   + ("" if next_cursor is None else " (more below)"))
+    return view
+
+def ticket_picker(key, limit=20, **filters):
+    # Loads only the handful of tickets matching what was typed (or the newest ones).
+    text = st.text_input("🔎 Find ticket (words or ticket number)", key=f"{key}_search")
+    if text.strip():
+        df, _ = search_ticket_page(text, limit=limit, **filters)
+    else:
+        df, _ = get_ticket_page(limit=limit, columns=["query_id", "query_heading", "status"], **filters)
+    if df.empty:
+        st.info("No matching tickets")
+        return None
+    labels = {int(r.query_id): f"#{r.query_id} · {r.query_heading} [{r.status}]" for r in df.itertuples()}
+    return st.selectbox("Select Ticket", list(labels), format_func=labels.get, key=f"{key}_pick")
+
+def search_panel(key, page_size=20, **filters):
+    text = st.text_input("Search headings and descriptions", key=f"{key}_text")
+    if not text.strip():
+        return
+    facets = search_ticket_facets(text, **filters)
+    fc1, fc2 = st.columns(2)
+    statuses = fc1.multiselect(
+        "Status", list(facets["status"]), key=f"{key}_status",
+        format_func=lambda s: f"{s} ({facets['status'][s]})",
+    )
+    priorities = fc2.multiselect(
+        "Priority", list(facets["priority"]), key=f"{key}_priority",
+        format_func=lambda p: f"{p} ({facets['priority'][p]})",
+    )
+    query = {**filters, "status": statuses or None, "priority": priorities or None}
+
+    cursors_key, state_key = f"{key}_cursors", f"{key}_state"
+    if st.session_state.get(state_key) != (text, query):
+        st.session_state[state_key] = (text, query)
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+    results, next_cursor = search_ticket_page(text, after=cursors[-1], limit=page_size, **query)
+    if results.empty:
+        st.info("No tickets match your search")
+        return
+    st.dataframe(results, use_container_width=True)
+    c1, c2, c3 = st.columns([1, 1, 4])
+    if c1.button("⬅ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if c2.button("Next ➡", key=f"{key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    c3.caption(f"Page {len(cursors)}")
+
+def ticket_timeline_panel(key, qid, page_size=20):
+    with st.expander(f"🕑 Timeline for ticket #{qid}"):
+        comment = st.text_area("Add a comment", key=f"{key}_comment_{qid}")
+        if st.button("Post comment", key=f"{key}_post_{qid}"):
+            if comment.strip():
+                add_ticket_comment(qid, comment.strip())
+                st.rerun()
+            else:
+                st.warning("Please enter a comment.")
+
+        cursors_key = f"{key}_timeline_{qid}"
+        cursors = st.session_state.setdefault(cursors_key, [None])
+        events, next_cursor = get_ticket_timeline(qid, before=cursors[-1], limit=page_size)
+        if events.empty:
+            st.info("No comments or changes yet.")
+            return
+        for event in events.itertuples():
+            if event.kind == "comment":
+                st.markdown(f"💬 **{event.actor}** · {event.at}  \n{event.comment}")
+            else:
+                st.markdown(f"✏️ **{event.actor or 'system'}** changed {event.field} "
+                            f"from `{event.old_value}` to `{event.new_value}` · {event.at}")
+        c1, c2 = st.columns(2)
+        if c1.button("Newer", key=f"{key}_newer_{qid}", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if c2.button("Older", key=f"{key}_older_{qid}", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def export_panel(key, **filters):
+    c1, c2 = st.columns(2)
+    dataset = c1.selectbox("Dataset", export.DATASETS, key=f"{key}_dataset")
+    fmt = c2.selectbox("Format", list(export.FORMATS), key=f"{key}_format")
+    file_key = f"{key}_file"
+    if st.button("Prepare export", key=f"{key}_prepare"):
+        st.session_state.pop(file_key, None)
+        try:
+            path, stats = export_dataset(fmt, dataset, **filters)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        # Read the finished file once and drop it, so no temp file outlives the request
+        # and reruns reuse the bytes instead of re-reading the disk.
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+        st.session_state[file_key] = {
+            "data": data,
+            "name": f"cqms_{dataset}_{datetime.now():%Y%m%d_%H%M%S}{export.FORMATS[fmt][0]}",
+            "mime": export.FORMATS[fmt][1],
+            "stats": stats,
+        }
+
+    prepared = st.session_state.get(file_key)
+    if prepared:
+        stats = prepared["stats"]
+        st.caption(f"{stats['rows']:,} rows · {stats['bytes'] / 1e6:.1f} MB · {stats['seconds']}s")
+        # The bytes are released once downloaded; "Prepare export" builds a fresh file.
+        st.download_button(f"⬇ Download {prepared['name']}", prepared["data"], file_name=prepared["name"],
+                           mime=prepared["mime"], key=f"{key}_download",
+                           on_click=st.session_state.pop, args=(file_key, None))
 
 # -------------------- Sidebar logout --------------------
 def sidebar_logout():
@@ -217,14 +780,19 @@ def login_page():
             p = st.text_input("Password", type="password", key="login_p")
             r = st.selectbox("Role", ["Client","Support","Admin"], key="login_r")
             if st.button("LOG IN", key="btn_login"):
-                if authenticate_user(u,p,r):
+                try:
+                    authenticated = authenticate_user(u,p,r)
+                except hashing.VerificationBusy as e:
+                    st.warning(str(e))
+                    authenticated = None
+                if authenticated:
                     st.session_state.logged_in = True
                     st.session_state.username = u
                     st.session_state.role = r
                     if r == "Support":
                         st.session_state.support_login_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     st.rerun()
-                else:
+                elif authenticated is False:
                     st.error("Invalid credentials")
 
         with t2:
@@ -235,6 +803,8 @@ def login_page():
                 try:
                     register_user(ru, rp, rr)
                     st.success("User registered successfully")
+                except hashing.VerificationBusy as e:
+                    st.warning(str(e))
                 except Exception as e:
                     st.error(str(e))
 
@@ -243,8 +813,11 @@ def login_page():
             fr = st.selectbox("Role", ["Client","Support","Admin"], key="fp_r")
             fp = st.text_input("New Password", type="password", key="fp_p")
             if st.button("Reset Password", key="btn_reset"):
-                reset_password(fu, fp, fr)
-                st.success("Password reset successful")
+                try:
+                    reset_password(fu, fp, fr)
+                    st.success("Password reset successful")
+                except hashing.VerificationBusy as e:
+                    st.warning(str(e))
 
         st.markdown("</div></div>", unsafe_allow_html=True)
 
@@ -265,14 +838,8 @@ def client_dashboard():
     if "client_logout_time" in st.session_state:
         st.info(f"Last Logout Time: {st.session_state.client_logout_time}")
 
-    df = get_queries()
-    if "username" in df.columns:
-        my_queries = df[df["username"] == client_name]
-        st.subheader("📋 Your Queries")
-        if not my_queries.empty:
-            st.dataframe(my_queries.style.applymap(color_status, subset=["status"]), use_container_width=True)
-        else:
-            st.info("No queries submitted yet.")
+    st.subheader("📋 Your Queries")
+    client_queries_panel(client_name)
 
     st.markdown("---")
     st.subheader("📝 Submit Query")
@@ -282,9 +849,17 @@ def client_dashboard():
     heading = st.text_input("Heading", key="client_heading")
     desc = st.text_area("Description", key="client_desc")
 
+    similar_tickets_hint(find_similar_tickets(heading, desc), "Your earlier tickets that look similar:")
+
     if st.button("Submit Query", key="btn_submit_query"):
-        submit_query(client_name, email, mobile, heading, desc)
+        qid, linked_to = submit_query(client_name, email, mobile, heading, desc)
         st.success("Query submitted successfully")
+        if linked_to:
+            # Only name the linked ticket if it is the client's own.
+            if linked_to in owned_ticket_ids(client_name, [linked_to]):
+                st.info(f"Ticket #{qid} was linked to your matching open ticket #{linked_to}.")
+            else:
+                st.info(f"Ticket #{qid} matches an issue our support team is already working on.")
 
 # -------------------- Support dashboard --------------------
 def support_dashboard():
@@ -312,9 +887,12 @@ def support_dashboard():
 
         if st.button("Toggle Availability"):
             new_status = "Not Available" if current_status == "Available" else "Available"
-            set_support_availability(support_name, new_status)
-            st.success(f"Status updated to {new_status}")
-            st.rerun()
+            try:
+                if set_support_availability(support_name, new_status):
+                    st.rerun()
+                st.info(f"Saving status {new_status}…")
+            except writebehind.WriteFailed as e:
+                st.warning(str(e))
 
     # Chat with Admin (persistent)
     with st.sidebar:
@@ -322,23 +900,32 @@ def support_dashboard():
         chat_input = st.text_area("Type your message")
         if st.button("Send to Admin"):
             if chat_input.strip():
-                save_chat_message(support_name, "Admin", chat_input.strip())
-                st.success("Message sent to Admin.")
+                try:
+                    if save_chat_message(support_name, "Admin", chat_input.strip()):
+                        st.success("Message sent to Admin.")
+                    else:
+                        st.info("Sending… it will appear in the conversation shortly.")
+                except writebehind.WriteFailed as e:
+                    st.warning(str(e))
             else:
                 st.warning("Please enter a valid message.")
 
+        # Only this user's own conversation is pulled, newest rows since the last rerun.
+        def fetch_my_chat(**cursor):
+            return get_chat_feed(support_name, **cursor)
+
+        with st.expander("Your conversation"):
+            support_chat_panel(fetch_my_chat)
+
     if "support_login_time" in st.session_state:
         st.info(f"Login Time: {st.session_state.support_login_time}")
     if "support_logout_time" in st.session_state:
         st.info(f"Last Logout Time: {st.session_state.support_logout_time}")
 
-    df = get_queries()
-    if "assigned_to" in df.columns:
-        my_tickets = df[df["assigned_to"] == support_name]
-        ticket_count = len(my_tickets)
-        if st.button(f"🎫 You have {ticket_count} tickets assigned. Click to view"):
-            st.subheader(f"Tickets assigned to {support_name}")
-            st.dataframe(my_tickets.style.applymap(color_status, subset=["status"]), use_container_width=True)
+    ticket_count = get_ticket_count(assigned_to=support_name)
+    if st.toggle(f"🎫 You have {ticket_count} tickets assigned. Click to view", key="show_my_tickets"):
+        st.subheader(f"Tickets assigned to {support_name}")
+        ticket_grid("support_my_tickets", decorate=with_latest_comments, assigned_to=support_name)
 
     # Ask Admin (persistent doubts)
     st.markdown("---")
@@ -346,57 +933,71 @@ def support_dashboard():
     doubt_text = st.text_area("Enter your doubt/question for Admin")
     if st.button("Submit to Admin"):
         if doubt_text.strip():
-            save_support_doubt(support_name, doubt_text.strip())
-            st.success("Your doubt has been sent to Admin.")
+            try:
+                if save_support_doubt(support_name, doubt_text.strip()):
+                    st.success("Your doubt has been sent to Admin.")
+                else:
+                    st.info("Sending… Admin will see it shortly.")
+            except writebehind.WriteFailed as e:
+                st.warning(str(e))
         else:
             st.warning("Please enter a valid doubt before submitting.")
 
     # Metrics
-    if df.empty:
+    summary = get_ticket_summary()
+    if summary["total"] == 0:
         st.info("No tickets available")
         return
 
-    df["query_created_time"] = pd.to_datetime(df.get("query_created_time"), errors="coerce")
-    total_count = len(df)
-    open_count = (df["status"] == "Open").sum()
-    closed_count = (df["status"] == "Closed").sum()
-    inprogress_count = (df["status"] == "In Progress").sum()
-    overdue_count = ((pd.Timestamp.now() - df["query_created_time"]) > pd.Timedelta(hours=42)).sum()
-    assigned_count = df["assigned_to"].notna().sum() if "assigned_to" in df.columns else 0
-
     c1, c2, c3, c4, c5 = st.columns(5)
-    c1.metric("📊 Total", total_count)
-    c2.metric("📂 Open", open_count)
-    c3.metric("✅ Closed", closed_count)
-    c4.metric("🔄 In Progress", inprogress_count)
-    c5.metric("⏱ Overdue", overdue_count)
-    st.metric("👨‍💻 Assigned", assigned_count)
+    c1.metric("📊 Total", summary["total"])
+    c2.metric("📂 Open", summary["open"])
+    c3.metric("✅ Closed", summary["closed"])
+    c4.metric("🔄 In Progress", summary["in_progress"])
+    c5.metric("⏱ Overdue", summary["overdue"])
+    s1, s2 = st.columns(2)
+    s1.metric("👨‍💻 Assigned", summary["assigned"])
+    s2.metric("⚠️ Due within 4h", summary["at_risk"])
+
+    my_triage = get_triage_queue(assigned_to=support_name)
+    if not my_triage.empty:
+        st.subheader("🔥 Your triage queue (unhappy clients first)")
+        st.dataframe(my_triage, use_container_width=True)
+
+    my_due = get_due_tickets(assigned_to=support_name)
+    if not my_due.empty:
+        st.subheader("⏱ Your overdue and at-risk tickets")
+        st.dataframe(my_due, use_container_width=True)
+
+    st.subheader("🔎 Search Tickets")
+    search_panel("support_search")
 
     status_filter = st.selectbox("Status Filter", ["All","Open","In Progress","Closed"])
-    filtered_df = df if status_filter == "All" else df[df["status"] == status_filter]
-    st.dataframe(filtered_df.style.applymap(color_status, subset=["status"]), use_container_width=True)
+    filtered_df = ticket_grid("support_all", status=None if status_filter == "All" else status_filter)
 
     st.markdown("---")
     tab1, tab2 = st.tabs(["✏️ Single Ticket", "📦 Bulk Update"])
 
-    conn = get_connection()
-    support_users = pd.read_sql("SELECT username FROM users WHERE role='Support'", conn)["username"].tolist()
-    conn.close()
+    support_users = get_support_users()
 
     with tab1:
-        ticket_ids = filtered_df["query_id"].astype(str).tolist()
-        if ticket_ids:
-            qid = st.selectbox("Select Ticket ID", ticket_ids)
-            row = filtered_df[filtered_df["query_id"].astype(str) == qid].iloc[0]
-            st.text_input("Heading", value=row.query_heading, disabled=True)
-            st.text_area("Description", value=row.query_description, disabled=True)
-            status = st.selectbox("Status", ["Open","In Progress","Closed"], index=["Open","In Progress","Closed"].index(row.status))
-            priority = st.selectbox("Priority", ["Low","Medium","High"], index=safe_priority_index(row.priority))
+        qid = ticket_picker("support_single", status=None if status_filter == "All" else status_filter)
+        row = get_ticket(qid) if qid is not None else None
+        if row:
+            st.text_input("Heading", value=row["query_heading"], disabled=True)
+            st.text_area("Description", value=row["query_description"], disabled=True)
+            similar_tickets_hint(
+                find_similar_tickets(row["query_heading"], row["query_description"], exclude=qid),
+                "Likely duplicates:",
+            )
+            status = st.selectbox("Status", ["Open","In Progress","Closed"], index=["Open","In Progress","Closed"].index(row["status"]))
+            priority = st.selectbox("Priority", ["Low","Medium","High"], index=safe_priority_index(row["priority"]))
             assigned_to = st.selectbox("Assign To", support_users) if support_users else None
             if st.button("Update Ticket"):
-                update_ticket(qid, status, row.query_heading, row.query_description, priority, assigned_to)
+                update_ticket(qid, status, row["query_heading"], row["query_description"], priority, assigned_to)
                 st.success("Ticket updated")
                 st.rerun()
+            ticket_timeline_panel("support_single", qid)
 
     with tab2:
         selected_ids = st.multiselect("Select Ticket IDs", filtered_df["query_id"].astype(str).tolist())
@@ -405,56 +1006,44 @@ def support_dashboard():
             priority_bulk = st.selectbox("Bulk Priority", ["Low","Medium","High"])
             assigned_bulk = st.selectbox("Bulk Assign To", support_users) if support_users else None
             if st.button("Apply Bulk Update"):
-                for qid in selected_ids:
-                    row = filtered_df[filtered_df["query_id"].astype(str) == qid].iloc[0]
-                    update_ticket(qid, status_bulk, row.query_heading, row.query_description, priority_bulk, assigned_bulk)
-                st.success(f"Updated {len(selected_ids)} tickets")
+                results = bulk_update_tickets(selected_ids, status_bulk, priority_bulk, assigned_bulk)
+                updated = sum(1 for r in results.values() if r == "updated")
+                st.success(f"Updated {updated} tickets")
                 st.rerun()
 
     st.markdown("---")
     st.subheader("📊 Support analytics")
-    if "assigned_to" in df.columns:
-        top_support = df[df["assigned_to"].notna()].groupby("assigned_to").size().reset_index(name="count")
-        top_support = top_support.sort_values("count", ascending=False).head(10)
-        st.markdown("#### 👨‍💻 Top support users")
-        st.bar_chart(top_support.set_index("assigned_to"))
-
-    if "support_group" in df.columns:
-        group_usage = df.groupby("support_group").size().reset_index(name="count")
-        group_usage = group_usage.sort_values("count", ascending=False)
+    stats = get_analytics()
+    st.markdown("#### 👨‍💻 Top support users")
+    st.bar_chart(stats["top_support"].set_index("assigned_to"))
+
+    group_usage = stats["group_usage"]
+    if not group_usage.empty:
         st.markdown("#### 🧩 Support group usage")
         st.bar_chart(group_usage.set_index("support_group"))
 
-# -------------------- Admin dashboard --------------------
-def admin_dashboard():
-    st.header("👑 Admin Dashboard")
-
-    df = get_queries()
-    if df.empty:
-        st.info("No tickets available")
-        return
-
-    st.markdown("---")
-    st.subheader("💬 Chat from Support Users")
-    chat_df = get_chat_messages()
-    if not chat_df.empty:
-        st.table(chat_df)
-    else:
-        st.info("No chat messages from support users yet.")
-
-    df["query_created_time"] = pd.to_datetime(df.get("query_created_time"), errors="coerce")
-    total_count = len(df)
-    open_count = (df["status"] == "Open").sum()
-    closed_count = (df["status"] == "Closed").sum()
-    inprogress_count = (df["status"] == "In Progress").sum()
+# -------------------- Live panels --------------------
+# Fragments re-run on their own timer without rerunning the page. Their reads go through
+# the cache (invalidated by the LISTEN hub) and the version-gated feeds, so a tick with
+# no change behind it makes no database round trip.
+LIVE_REFRESH_SECONDS = 3
+live_fragment = (getattr(st, "fragment", None) or st.experimental_fragment)(run_every=LIVE_REFRESH_SECONDS)
 
+@live_fragment
+def admin_kpis():
+    summary = get_ticket_summary()
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("📊 Total", total_count)
-    c2.metric("📂 Open", open_count)
-    c3.metric("✅ Closed", closed_count)
-    c4.metric("🔄 In Progress", inprogress_count)
-
-    st.subheader("👥 Support Users Availability")
+    c1.metric("📊 Total", summary["total"])
+    c2.metric("📂 Open", summary["open"])
+    c3.metric("✅ Closed", summary["closed"])
+    c4.metric("🔄 In Progress", summary["in_progress"])
+    s1, s2, s3 = st.columns(3)
+    s1.metric("⏱ Overdue", summary["overdue"])
+    s2.metric("⚠️ Due within 4h", summary["at_risk"])
+    s3.metric("🚨 SLA breaches", summary["breached"])
+
+@live_fragment
+def admin_availability_panel():
     avail_df = get_support_availability()
     if not avail_df.empty:
         available_users = avail_df[avail_df["status"] == "Available"]["username"].tolist()
@@ -474,33 +1063,119 @@ def admin_dashboard():
     else:
         st.info("No availability support users now.")
 
+@live_fragment
+def admin_chat_panel(feed_key, fetch_chat):
+    chat_feed = sync_feed(feed_key, fetch_chat, "chat")
+    show_feed("admin_chat", chat_feed, fetch_chat, "No chat messages from support users yet.")
+
+@live_fragment
+def admin_doubts_panel():
+    doubts_feed = sync_feed("admin_doubts_feed", get_doubts_feed, "doubts")
+    show_feed("admin_doubts", doubts_feed, get_doubts_feed, "No doubts submitted by support users yet.")
+
+@live_fragment
+def support_chat_panel(fetch_my_chat):
+    my_chat = sync_feed("support_chat_feed", fetch_my_chat, "chat")
+    show_feed("support_chat", my_chat, fetch_my_chat, "No messages yet.")
+
+@live_fragment
+def client_queries_panel(client_name):
+    ticket_grid("client_queries", empty_message="No queries submitted yet.", username=client_name)
+
+# -------------------- Admin dashboard --------------------
+def admin_dashboard():
+    st.header("👑 Admin Dashboard")
+
+    summary = get_ticket_summary()
+    if summary["total"] == 0:
+        st.info("No tickets available")
+        return
+
+    st.markdown("---")
+    st.subheader("💬 Chat from Support Users")
+    chat_with = st.selectbox("Conversation with", ["All"] + get_support_users(), key="admin_chat_with")
+    participant = None if chat_with == "All" else chat_with
+
+    def fetch_chat(**cursor):
+        return get_chat_feed(participant, **cursor)
+
+    admin_chat_panel(f"admin_chat_feed_{chat_with}", fetch_chat)
+
+    admin_kpis()
+
+    st.subheader("👥 Support Users Availability")
+    admin_availability_panel()
+
     st.markdown("---")
     st.subheader("📩 Doubts from Support Users")
-    doubts_df = get_support_doubts()
-    if not doubts_df.empty:
-        st.table(doubts_df)
+    admin_doubts_panel()
+
+    st.subheader("🔥 Triage queue (unhappy clients first)")
+    st.dataframe(get_triage_queue(), use_container_width=True)
+
+    st.subheader("⏱ Overdue and at-risk tickets")
+    due_df = get_due_tickets()
+    if due_df.empty:
+        st.info("No tickets are overdue or due soon.")
     else:
-        st.info("No doubts submitted by support users yet.")
+        st.dataframe(due_df, use_container_width=True)
+
+    st.subheader("⚖️ Ticket Assignment")
+    engine = get_assignment_engine()
+    ac1, ac2 = st.columns(2)
+    if ac1.button("Auto-assign backlog"):
+        assigned = auto_assign_backlog()
+        st.success(f"Assigned {len(assigned)} tickets")
+    if ac2.button("Rebalance"):
+        moved = auto_assign_backlog(rebalance=True)
+        st.success(f"Moved {len(moved)} tickets")
+    available = set(engine.available())
+    load_df = pd.DataFrame(
+        [(agent, load, agent in available) for agent, load in engine.loads().items()],
+        columns=["support_user", "weighted_load", "available"],
+    )
+    st.dataframe(load_df, use_container_width=True)
+
+    st.subheader("🔎 Search Tickets")
+    search_panel("admin_search")
 
     st.subheader("📄 All Tickets")
-    st.dataframe(df.style.applymap(color_status, subset=["status"]), use_container_width=True)
+    fc1, fc2 = st.columns(2)
+    admin_status = fc1.selectbox("Status Filter", ["All","Open","In Progress","Closed"], key="admin_status_filter")
+    admin_priority = fc2.selectbox("Priority Filter", ["All","Low","Medium","High"], key="admin_priority_filter")
+    df = ticket_grid(
+        "admin_all",
+        status=None if admin_status == "All" else admin_status,
+        priority=None if admin_priority == "All" else admin_priority,
+    )
+
+    with st.expander("📤 Export (uses the filters above)"):
+        export_panel(
+            "admin_export",
+            status=None if admin_status == "All" else admin_status,
+            priority=None if admin_priority == "All" else admin_priority,
+        )
 
     st.markdown("---")
     tab1, tab2 = st.tabs(["✏️ Single Ticket", "📦 Bulk Update"])
 
     with tab1:
-        ticket_ids = df["query_id"].astype(str).tolist()
-        if ticket_ids:
-            qid = st.selectbox("Select Ticket ID", ticket_ids)
-            row = df[df["query_id"].astype(str) == qid].iloc[0]
-            heading = st.text_input("Heading", value=row.query_heading)
-            desc = st.text_area("Description", value=row.query_description)
-            status = st.selectbox("Status", ["Open","In Progress","Closed"], index=["Open","In Progress","Closed"].index(row.status))
-            priority = st.selectbox("Priority", ["Low","Medium","High"], index=safe_priority_index(row.priority))
+        qid = ticket_picker(
+            "admin_single",
+            status=None if admin_status == "All" else admin_status,
+            priority=None if admin_priority == "All" else admin_priority,
+        )
+        row = get_ticket(qid) if qid is not None else None
+        if row:
+            heading = st.text_input("Heading", value=row["query_heading"])
+            desc = st.text_area("Description", value=row["query_description"])
+            status = st.selectbox("Status", ["Open","In Progress","Closed"], index=["Open","In Progress","Closed"].index(row["status"]))
+            priority = st.selectbox("Priority", ["Low","Medium","High"], index=safe_priority_index(row["priority"]))
             if st.button("Apply Changes"):
                 update_ticket(qid, status, heading, desc, priority)
                 st.success("Ticket updated")
                 st.rerun()
+            ticket_timeline_panel("admin_single", qid)
 
     with tab2:
         selected_ids = st.multiselect("Select Ticket IDs", df["query_id"].astype(str).tolist())
@@ -508,38 +1183,94 @@ def admin_dashboard():
             status_bulk = st.selectbox("Bulk Status", ["Open","In Progress","Closed"])
             priority_bulk = st.selectbox("Bulk Priority", ["Low","Medium","High"])
             if st.button("Apply Bulk Update"):
-                for qid in selected_ids:
-                    row = df[df["query_id"].astype(str) == qid].iloc[0]
-                    update_ticket(qid, status_bulk, row.query_heading, row.query_description, priority_bulk)
-                st.success(f"Bulk updated {len(selected_ids)} tickets")
+                results = bulk_update_tickets(selected_ids, status_bulk, priority_bulk)
+                updated = sum(1 for r in results.values() if r == "updated")
+                st.success(f"Bulk updated {updated} tickets")
                 st.rerun()
 
     st.markdown("---")
     st.subheader("📊 Admin analytics")
+    stats = get_analytics()
 
-    if "query_created_time" in df.columns:
-        monthly = df.copy()
-        monthly["month"] = monthly["query_created_time"].dt.strftime("%b")
-        monthly_stats = monthly.groupby("month").size().reset_index(name="count")
-        st.markdown("#### 📅 Monthly query volume")
-        st.line_chart(monthly_stats.set_index("month"))
+    st.markdown("#### 📅 Monthly query volume")
+    st.line_chart(stats["monthly"].set_index("month"))
 
-    status_stats = df["status"].value_counts().reset_index()
-    status_stats.columns = ["status", "count"]
     st.markdown("#### 📌 Status distribution")
-    st.bar_chart(status_stats.set_index("status"))
+    st.bar_chart(stats["status"].set_index("status"))
 
-    if "assigned_to" in df.columns:
-        top_support = df[df["assigned_to"].notna()].groupby("assigned_to").size().reset_index(name="count")
-        top_support = top_support.sort_values("count", ascending=False).head(10)
-        st.markdown("#### 👨‍💻 Top support users")
-        st.bar_chart(top_support.set_index("assigned_to"))
+    st.markdown("#### 👨‍💻 Top support users")
+    st.bar_chart(stats["top_support"].set_index("assigned_to"))
 
-    if "support_group" in df.columns:
-        group_usage = df.groupby("support_group").size().reset_index(name="count")
-        group_usage = group_usage.sort_values("count", ascending=False)
+    group_usage = stats["group_usage"]
+    if not group_usage.empty:
         st.markdown("#### 🧩 Support group usage")
         st.bar_chart(group_usage.set_index("support_group"))
+
+    st.markdown("---")
+    with st.expander("⚙️ Cache & connection pool stats"):
+        st.markdown("#### Cache")
+        st.dataframe(pd.DataFrame(get_cache().stats()).T, use_container_width=True)
+        st.markdown("#### Connection pool")
+        st.json(get_pool().stats())
+        st.markdown("#### Ticket store")
+        st.json(get_ticket_store().memory_usage())
+        st.markdown("#### Password verification")
+        st.json(get_password_pool().stats())
+        st.markdown("#### Similarity index")
+        st.json(get_similarity_index().stats())
+        st.markdown("#### SLA sweeper")
+        st.json(get_sla_sweeper().stats())
+        st.markdown("#### Write-behind queue")
+        st.json(get_write_queue().stats())
+        st.markdown("#### Ticket partitions")
+        partitions = get_partition_stats()
+        if partitions.empty:
+            st.caption("queries is not partitioned yet (python partitioning.py --convert)")
+        else:
+            st.dataframe(partitions, use_container_width=True, hide_index=True)
+
+    diagnostics_panel()
+
+def diagnostics_panel():
+    with st.expander("🩺 Render diagnostics"):
+        last = st.session_state.get("last_render_trace")
+        if last is not None:
+            st.markdown(f"#### Previous render of this page ({last.seconds:.3f}s)")
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("DB queries", last.queries)
+            d2.metric("Rows fetched", f"{last.rows:,}")
+            d3.metric("DB time", f"{last.db_seconds:.3f}s")
+            d4.metric("DataFrames", f"{sum(f['bytes'] for f in last.frames) / 1e6:.2f} MB")
+            if last.spans:
+                spans = pd.DataFrame(last.spans)
+                spans["span"] = ["  " * d + name for d, name in zip(spans["depth"], spans["span"])]
+                st.dataframe(spans.drop(columns="depth"), use_container_width=True, hide_index=True)
+            if last.frames:
+                st.dataframe(pd.DataFrame(last.frames), use_container_width=True, hide_index=True)
+
+        profiled = st.session_state.get("last_profile_trace")
+        if profiled is not None:
+            st.markdown(f"#### Profile of the {profiled.summary()['started_at']} render ({profiled.seconds:.3f}s)")
+            st.code(profiled.profile, language="text")
+
+        st.markdown("#### This process, all sessions")
+        span_stats = instrumentation.span_stats()
+        if span_stats:
+            st.dataframe(
+                pd.DataFrame(span_stats).T.sort_values("seconds", ascending=False),
+                use_container_width=True,
+            )
+        st.dataframe(pd.DataFrame(instrumentation.recent_renders()), use_container_width=True, hide_index=True)
+        st.download_button("Download Prometheus metrics", instrumentation.prometheus_text(),
+                           file_name="cqms_metrics.prom", mime="text/plain")
+
+        st.checkbox("Deep DataFrame sizing (counts string bytes, slower)", key="diagnostics_detail")
+        p1, p2 = st.columns(2)
+        mode = p1.selectbox("Profiler", ["cprofile", "pyinstrument"], key="diagnostics_profiler")
+        if p2.button("Profile next render"):
+            st.session_state.profile_next_render = mode
+            st.rerun()
+
 def main():
     st.set_page_config("CQMS Portal", layout="wide")
 
@@ -547,14 +1278,27 @@ def main():
         st.session_state.logged_in = False
 
     if st.session_state.logged_in:
+        get_event_hub()
+        get_sla_sweeper()
+        get_metrics_exporter()
         sidebar_logout()
         role = st.session_state.get("role", "Client")
-        if role == "Client":
-            client_dashboard()
-        elif role == "Support":
-            support_dashboard()
-        elif role == "Admin":
-            admin_dashboard()
+        dashboard = {"Client": client_dashboard, "Support": support_dashboard, "Admin": admin_dashboard}.get(role)
+        if dashboard is None:
+            return
+        # Profiling is opt-in from the admin diagnostics panel and covers a single render.
+        profile = st.session_state.pop("profile_next_render", None) if role == "Admin" else None
+        trace = None
+        try:
+            with instrumentation.render(role, profile=profile,
+                                        detail=st.session_state.get("diagnostics_detail", False)) as trace:
+                dashboard()
+        finally:
+            # Also kept when the render ends in st.rerun(), which unwinds as an exception.
+            if trace is not None:
+                st.session_state.last_render_trace = trace
+                if trace.profile:
+                    st.session_state.last_profile_trace = trace
     else:
         login_page()
 
@@ -0,0 +1,230 @@
+# assignment.py
+import heapq
+import itertools
+import threading
+
+from psycopg2.extras import execute_values
+
+import notify
+import timeline
+
+# ==============================
+# LOAD MODEL
+# ==============================
+# An agent's load is the priority-weighted count of their unclosed tickets, so one High
+# ticket weighs as much as three Low ones.
+PRIORITY_WEIGHT = {"High": 3, "Medium": 2, "Low": 1}
+
+def ticket_weight(priority):
+    return PRIORITY_WEIGHT.get(priority, PRIORITY_WEIGHT["Medium"])
+
+def _counts_toward_load(row):
+    return bool(row) and row.get("assigned_to") is not None and row.get("status") != "Closed"
+
+# Lazy deletion only pops stale entries that reach the top, so a busy agent's old entries
+# pile up underneath; past this many entries per available agent the heap is rebuilt.
+COMPACT_FACTOR = 4
+
+
+class AssignmentEngine:
+    """In-memory min-heap of available agents keyed by current load.
+
+    The heap uses lazy deletion: every load change pushes a fresh entry and stale
+    entries are discarded when they reach the top, so pick/update are O(log n) and
+    nothing is ever recomputed with a groupby. The heap is rebuilt from the live
+    entries once it outgrows ``COMPACT_FACTOR`` entries per available agent.
+    """
+
+    def __init__(self, loads=None, available=()):
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self.reset(loads or {}, available)
+
+    def reset(self, loads, available):
+        with self._lock:
+            self._load = dict(loads)
+            self._available = set(available)
+            for agent in self._available:
+                self._load.setdefault(agent, 0)
+            self._rebuild()
+            self.stale = False
+
+    def _rebuild(self):
+        self._heap = [(self._load[agent], next(self._order), agent) for agent in self._available]
+        heapq.heapify(self._heap)
+
+    # ---------- updates ----------
+    def _push(self, agent):
+        heapq.heappush(self._heap, (self._load[agent], next(self._order), agent))
+        if len(self._heap) > COMPACT_FACTOR * max(len(self._available), 1):
+            self._rebuild()
+
+    def _adjust(self, agent, delta):
+        self._load[agent] = self._load.get(agent, 0) + delta
+        self._push(agent)
+
+    def set_availability(self, agent, available):
+        with self._lock:
+            if available:
+                self._available.add(agent)
+                self._load.setdefault(agent, 0)
+                self._push(agent)
+            else:
+                self._available.discard(agent)
+
+    def apply_change(self, before, after):
+        """Account for one ticket write given its before/after facet dicts (either may be None)."""
+        with self._lock:
+            if _counts_toward_load(before):
+                self._adjust(before["assigned_to"], -ticket_weight(before.get("priority")))
+            if _counts_toward_load(after):
+                self._adjust(after["assigned_to"], ticket_weight(after.get("priority")))
+
+    # ---------- routing ----------
+    def pick(self, priority="Medium"):
+        """Reserve the least-loaded available agent for a new ticket; None if nobody is available."""
+        with self._lock:
+            while self._heap:
+                load, _, agent = self._heap[0]
+                if agent not in self._available or load != self._load.get(agent):
+                    heapq.heappop(self._heap)  # stale entry
+                    continue
+                self._adjust(agent, ticket_weight(priority))
+                return agent
+            return None
+
+    def loads(self):
+        with self._lock:
+            return {a: l for a, l in sorted(self._load.items(), key=lambda kv: kv[1])}
+
+    def available(self):
+        with self._lock:
+            return sorted(self._available)
+
+# ==============================
+# DATABASE STATE
+# ==============================
+def load_engine(conn, engine):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT assigned_to,
+               SUM(CASE priority WHEN 'High' THEN %s WHEN 'Low' THEN %s ELSE %s END)
+        FROM queries
+        WHERE status <> 'Closed' AND assigned_to IS NOT NULL
+        GROUP BY assigned_to
+    """, (PRIORITY_WEIGHT["High"], PRIORITY_WEIGHT["Low"], PRIORITY_WEIGHT["Medium"]))
+    loads = {agent: int(load) for agent, load in cur.fetchall()}
+    # Support users without an availability row count as Available, like the dashboard.
+    cur.execute("""
+        SELECT u.username FROM users u
+        LEFT JOIN support_availability a ON a.username = u.username
+        WHERE u.role = 'Support' AND COALESCE(a.status, 'Available') = 'Available'
+    """)
+    available = [r[0] for r in cur.fetchall()]
+    cur.close()
+    engine.reset(loads, available)
+    return engine
+
+def assign_backlog(conn, engine, limit=500):
+    """Route unassigned open tickets, earliest SLA deadline first.
+
+    Returns ``{query_id: agent}`` for the tickets assigned in one bulk UPDATE.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT query_id, priority FROM queries
+        WHERE assigned_to IS NULL AND status <> 'Closed'
+        ORDER BY due_at NULLS LAST
+        LIMIT %s
+    """, (limit,))
+    plan = []
+    for qid, priority in cur.fetchall():
+        agent = engine.pick(priority)
+        if agent is None:
+            break
+        plan.append((qid, agent, priority))
+    if not plan:
+        cur.close()
+        return {}
+    try:
+        # The assigned_to IS NULL guard skips tickets someone assigned by hand meanwhile.
+        done = execute_values(cur, """
+            UPDATE queries q SET assigned_to = v.agent
+            FROM (VALUES %s) AS v(query_id, agent)
+            WHERE q.query_id = v.query_id AND q.assigned_to IS NULL
+            RETURNING q.query_id
+        """, [(qid, agent) for qid, agent, _ in plan], fetch=True)
+        done = {r[0] for r in done}
+        timeline.record_changes(cur, [
+            (qid, {"assigned_to": None}, {"assigned_to": agent}) for qid, agent, _ in plan if qid in done
+        ], "auto-assign")
+        notify.publish(cur, "tickets", count=len(done))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Nothing was assigned, so hand back every load pick() reserved.
+        for qid, agent, priority in plan:
+            engine.apply_change({"assigned_to": agent, "priority": priority, "status": "Open"}, None)
+        raise
+    finally:
+        cur.close()
+    for qid, agent, priority in plan:
+        if qid not in done:
+            engine.apply_change({"assigned_to": agent, "priority": priority, "status": "Open"}, None)
+    return {qid: agent for qid, agent, _ in plan if qid in done}
+
+def rebalance(conn, engine, tolerance=0.25, limit=200):
+    """Move not-yet-started tickets off agents whose load exceeds the mean by ``tolerance``."""
+    loads = {a: l for a, l in engine.loads().items() if a in set(engine.available())}
+    if len(loads) < 2:
+        return {}
+    ceiling = sum(loads.values()) / len(loads) * (1 + tolerance)
+    overloaded = [a for a, l in loads.items() if l > ceiling]
+    if not overloaded:
+        return {}
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT query_id, assigned_to, priority FROM queries
+        WHERE assigned_to = ANY(%s) AND status = 'Open'
+        ORDER BY query_created_time DESC NULLS LAST
+        LIMIT %s
+    """, (overloaded, limit))
+    moves, priorities = [], {}
+    for qid, owner, priority in cur.fetchall():
+        if engine.loads().get(owner, 0) <= ceiling:
+            continue
+        engine.apply_change({"assigned_to": owner, "priority": priority, "status": "Open"}, None)
+        target = engine.pick(priority)
+        if target is None or target == owner:
+            engine.apply_change({"assigned_to": target, "priority": priority, "status": "Open"},
+                                {"assigned_to": owner, "priority": priority, "status": "Open"})
+            continue
+        moves.append((qid, target, owner))
+        priorities[qid] = priority
+    moved = set()
+    if moves:
+        try:
+            moved = execute_values(cur, """
+                UPDATE queries q SET assigned_to = v.agent
+                FROM (VALUES %s) AS v(query_id, agent, previous)
+                WHERE q.query_id = v.query_id AND q.assigned_to = v.previous
+                RETURNING q.query_id
+            """, moves, page_size=len(moves), fetch=True)
+            moved = {r[0] for r in moved}
+            # A ticket reassigned by hand meanwhile leaves the in-memory loads off; reload them.
+            engine.stale = len(moved) != len(moves)
+            timeline.record_changes(cur, [
+                (qid, {"assigned_to": owner}, {"assigned_to": target})
+                for qid, target, owner in moves if qid in moved
+            ], "rebalance")
+            notify.publish(cur, "tickets", count=len(moved))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Nothing moved, so put every load shifted above back on its owner.
+            for qid, target, owner in moves:
+                engine.apply_change({"assigned_to": target, "priority": priorities[qid], "status": "Open"},
+                                    {"assigned_to": owner, "priority": priorities[qid], "status": "Open"})
+            raise
+    cur.close()
+    return {qid: target for qid, target, _ in moves if qid in moved}
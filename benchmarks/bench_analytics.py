@@ -0,0 +1,96 @@
+# benchmarks/bench_analytics.py
+"""Compare the old Admin analytics code with analytics.frame_analytics (and optionally SQL).
+
+    python benchmarks/bench_analytics.py                 # 10k, 100k, 1M synthetic tickets
+    python benchmarks/bench_analytics.py --sizes 10000 --sql
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "data", "synthetic_client_queries.csv")
+SUPPORT_USERS = [f"support_{i:02d}" for i in range(25)]
+GROUPS = ["Billing", "Technical", "Accounts", "General"]
+
+# ==============================
+# DATA
+# ==============================
+def scaled_frame(n, seed=0):
+    """n tickets sampled from the bundled CSV, spread over three years of created times."""
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(CSV_PATH)
+    df = base.sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+    start = pd.Timestamp("2023-01-01")
+    df["query_created_time"] = start + pd.to_timedelta(rng.integers(0, 3 * 365 * 24, n), unit="h")
+    assigned = rng.choice(SUPPORT_USERS, n).astype(object)
+    assigned[rng.random(n) < 0.2] = None
+    df["assigned_to"] = assigned
+    df["support_group"] = rng.choice(GROUPS, n)
+    return df
+
+# ==============================
+# BASELINE (code previously in admin_dashboard)
+# ==============================
+def legacy_analytics(df):
+    monthly = df.copy()
+    monthly["month"] = monthly["query_created_time"].dt.strftime("%b")
+    monthly_stats = monthly.groupby("month").size().reset_index(name="count")
+
+    status_stats = df["status"].value_counts().reset_index()
+    status_stats.columns = ["status", "count"]
+
+    top_support = df[df["assigned_to"].notna()].groupby("assigned_to").size().reset_index(name="count")
+    top_support = top_support.sort_values("count", ascending=False).head(10)
+
+    group_usage = df.groupby("support_group").size().reset_index(name="count")
+    group_usage = group_usage.sort_values("count", ascending=False)
+    return monthly_stats, status_stats, top_support, group_usage
+
+# ==============================
+# RUN
+# ==============================
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sql", action="store_true",
+                        help="also time analytics.admin_analytics against the configured database")
+    args = parser.parse_args()
+
+    print(f"{'tickets':>10} {'legacy ms':>10} {'vectorised ms':>14} {'speedup':>8}")
+    for n in args.sizes:
+        df = scaled_frame(n)
+        legacy = best_of(legacy_analytics, df, args.repeat)
+        vectorised = best_of(analytics.frame_analytics, df, args.repeat)
+        print(f"{n:>10,} {legacy * 1000:>10.1f} {vectorised * 1000:>14.1f} {legacy / vectorised:>7.1f}x")
+
+    if args.sql:
+        from db import get_connection
+
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM queries")
+            rows = cur.fetchone()[0]
+            cur.close()
+            elapsed = best_of(analytics.admin_analytics, conn, args.repeat)
+        print(f"SQL GROUPING SETS over {rows:,} rows: {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
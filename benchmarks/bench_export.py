@@ -0,0 +1,92 @@
+# benchmarks/bench_export.py
+"""Throughput and peak memory of the streaming export on the scaled ticket table.
+
+    python benchmarks/bench_export.py --seed-rows 1000000          # seed via bench_load, then measure
+    python benchmarks/bench_export.py --rows 10000 100000 1000000 --formats csv csv.gz parquet
+    python benchmarks/bench_export.py --baseline                   # also time pd.read_sql + to_csv
+
+Point PG_DB at a scratch database (seeding inserts rows). Output goes to a temp directory.
+Peak memory is Python heap (tracemalloc) measured in a second pass, so it does not slow
+the throughput numbers. With streaming it should stay flat as --rows grows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db  # noqa: E402
+import export  # noqa: E402
+import tickets  # noqa: E402
+
+def run(path, fmt, rows, chunk, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    with db.get_connection() as conn:
+        stats = export.export_file(conn, path, fmt, chunk=chunk, limit=rows)
+    if trace_memory:
+        stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return stats
+
+def baseline(path, rows):
+    import pandas as pd
+
+    sql, params = export.dataset_sql("tickets", limit=rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with db.get_connection() as conn:
+        df = pd.read_sql(sql, conn, params=params)
+    df.to_csv(path, index=False)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return {"rows": len(df), "bytes": os.path.getsize(path), "seconds": elapsed, "peak_mb": peak}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed-rows", type=int, help="top queries up to this many rows first")
+    parser.add_argument("--rows", type=int, nargs="+", help="export sizes (default: 10k, 100k, all)")
+    parser.add_argument("--formats", nargs="+", choices=list(export.FORMATS), default=list(export.FORMATS))
+    parser.add_argument("--chunk", type=int, default=export.CHUNK_ROWS)
+    parser.add_argument("--baseline", action="store_true", help="compare with pd.read_sql + DataFrame.to_csv")
+    args = parser.parse_args()
+
+    if args.seed_rows:
+        from bench_load import seed
+        seed(args.seed_rows)
+    with db.get_connection() as conn:
+        total = tickets.count_tickets(conn)
+    sizes = sorted({min(n, total) for n in (args.rows or [10_000, 100_000, total])})
+    print(f"queries has {total:,} rows; chunk {args.chunk:,}")
+    print(f"{'format':>9} {'rows':>10} {'seconds':>8} {'rows/sec':>10} {'MB':>8} {'MB/s':>7} {'peak MB':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            path = os.path.join(tmp, "export" + export.FORMATS[fmt][0])
+            for rows in sizes:
+                try:
+                    stats = run(path, fmt, rows, args.chunk, trace_memory=False)
+                except RuntimeError as e:
+                    print(f"{fmt:>9} skipped: {e}")
+                    break
+                peak = run(path, fmt, rows, args.chunk, trace_memory=True)["peak_mb"]
+                mb = stats["bytes"] / 1e6
+                print(f"{fmt:>9} {stats['rows']:>10,} {stats['seconds']:>8.2f} {stats['rows_per_sec'] or 0:>10,} "
+                      f"{mb:>8.1f} {mb / stats['seconds'] if stats['seconds'] else 0:>7.1f} {peak:>8.1f}")
+        if args.baseline:
+            path = os.path.join(tmp, "baseline.csv")
+            for rows in sizes:
+                stats = baseline(path, rows)
+                mb = stats["bytes"] / 1e6
+                print(f"{'pandas':>9} {stats['rows']:>10,} {stats['seconds']:>8.2f} "
+                      f"{stats['rows'] / stats['seconds']:>10,.0f} {mb:>8.1f} {mb / stats['seconds']:>7.1f} "
+                      f"{stats['peak_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
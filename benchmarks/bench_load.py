@@ -0,0 +1,293 @@
+# benchmarks/bench_load.py
+"""Seed a scaled-up ticket table and replay concurrent Client/Support/Admin dashboard renders.
+
+    python benchmarks/bench_load.py --seed-rows 100000                 # top the table up to 100k tickets
+    python benchmarks/bench_load.py --users 20 --duration 60           # run the workload mix
+    python benchmarks/bench_load.py --compare results/a.json results/b.json
+
+Point PG_DB at a scratch database: seeding inserts rows and the workload writes.
+Each "render" is the sequence of data-layer calls one dashboard rerun makes with a cold
+app cache, so the numbers are the worst case a page sees. Every cursor.execute on the
+worker's connection is counted, which gives database round trips per render.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+import db  # noqa: E402
+import feeds  # noqa: E402
+import metrics  # noqa: E402
+import sla  # noqa: E402
+import tickets  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "data", "synthetic_client_queries.csv")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+CLIENTS = [f"bench_client_{i:04d}" for i in range(2000)]
+SUPPORT = [f"bench_support_{i:02d}" for i in range(25)]
+SEARCH_WORDS = ["login", "payment", "export", "bug", "account", "invoice", "crash", "slow"]
+
+# ==============================
+# ROUND-TRIP COUNTING
+# ==============================
+_calls = threading.local()
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        _calls.count = getattr(_calls, "count", 0) + 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _calls.count = getattr(_calls, "count", 0) + 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        _calls.count = getattr(_calls, "count", 0) + 1
+        return super().copy_expert(sql, file, size)
+
+# ==============================
+# SEEDING
+# ==============================
+def scaled_csv(n, start_index, path, seed=0):
+    """Write ``n`` tickets sampled from the bundled CSV, in its format, with fresh ids."""
+    rng = np.random.default_rng(seed + start_index)
+    df = pd.read_csv(CSV_PATH).sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+    df["query_id"] = [f"B{start_index + i:09d}" for i in range(n)]
+    created = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D")
+    closed = created + pd.to_timedelta(rng.integers(0, 15, n), unit="D")
+    df["query_created_time"] = created.strftime("%A, %B %d, %Y")
+    df["query_closed_time"] = np.where(df["status"] == "Closed", closed.strftime("%A, %B %d, %Y"), "")
+    df.to_csv(path, index=False)
+
+def seed(target_rows):
+    """Top ``queries`` up to ``target_rows`` through db.load_csv_into_queries; returns load stats."""
+    db.init_db()
+    with db.get_connection() as conn:
+        current = tickets.count_tickets(conn)
+    missing = target_rows - current
+    if missing <= 0:
+        print(f"✅ queries already has {current:,} rows")
+        return {"rows_before": current, "rows_inserted": 0}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scaled.csv")
+        scaled_csv(missing, current, path)
+        stats = db.load_csv_into_queries(path)
+
+    # The CSV has no owner / priority / assignee columns; spread them deterministically.
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE queries SET
+                username = (%s::text[])[1 + query_id %% %s],
+                priority = (ARRAY['Low','Medium','Medium','High'])[1 + query_id %% 4],
+                assigned_to = CASE WHEN query_id %% 5 = 0 THEN NULL ELSE (%s::text[])[1 + query_id %% %s] END
+            WHERE username IS NULL AND source_query_id LIKE 'B%%'
+        """, (CLIENTS, len(CLIENTS), SUPPORT, len(SUPPORT)))
+        cur.execute("ANALYZE queries")
+        conn.commit()
+        cur.close()
+    return {"rows_before": current, **stats}
+
+# ==============================
+# RENDERS
+# ==============================
+class Context:
+    def __init__(self, conn, write_ratio):
+        cur = conn.cursor()
+        cur.execute("SELECT MIN(query_id), MAX(query_id) FROM queries")
+        self.min_id, self.max_id = cur.fetchone()
+        cur.close()
+        self.write_ratio = write_ratio
+
+    def ticket_id(self, rng):
+        return rng.randint(self.min_id, self.max_id)
+
+
+def client_render(conn, rng, ctx):
+    user = rng.choice(CLIENTS)
+    tickets.fetch_tickets(conn, username=user, limit=50)
+    if rng.random() < ctx.write_ratio:
+        tickets.create_ticket(conn, user, f"{user}@example.com", "5550000000",
+                              "Bug Report", "Form validation not working properly.")
+
+def support_render(conn, rng, ctx):
+    me = rng.choice(SUPPORT)
+    metrics.get_ticket_metrics(conn)
+    sla.sla_counts(conn)
+    tickets.fetch_tickets(conn, assigned_to=me, limit=50)
+    tickets.fetch_tickets(conn, status=rng.choice(["Open", "In Progress", "Closed"]), limit=50)
+    tickets.fetch_triage_queue(conn, assigned_to=me)
+    sla.fetch_due(conn, assigned_to=me)
+    feeds.fetch_chat(conn, me)
+    if rng.random() < ctx.write_ratio:
+        tickets.update_ticket(conn, ctx.ticket_id(rng), rng.choice(["Open", "In Progress", "Closed"]),
+                              "Bug Report", "Form validation not working properly.",
+                              rng.choice(["Low", "Medium", "High"]), changed_by=me)
+
+def admin_render(conn, rng, ctx):
+    metrics.get_ticket_metrics(conn)
+    sla.sla_counts(conn)
+    _, cursor = tickets.fetch_tickets(conn, limit=50)
+    if cursor is not None:
+        tickets.fetch_tickets(conn, after=cursor, limit=50)
+    tickets.search_tickets(conn, rng.choice(SEARCH_WORDS))
+    analytics.admin_analytics(conn)
+    sla.fetch_due(conn)
+    tickets.fetch_triage_queue(conn)
+    feeds.fetch_doubts(conn)
+    if rng.random() < ctx.write_ratio:
+        ids = [ctx.ticket_id(rng) for _ in range(10)]
+        tickets.bulk_update_tickets(conn, ids, "In Progress", "Medium", changed_by="bench_admin")
+
+RENDERS = {"Client": client_render, "Support": support_render, "Admin": admin_render}
+
+# ==============================
+# RUN
+# ==============================
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+def summarise(samples, seconds):
+    latencies = sorted(s[0] for s in samples)
+    trips = [s[1] for s in samples]
+    return {
+        "renders": len(samples),
+        "renders_per_sec": round(len(samples) / seconds, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "round_trips_per_render": round(sum(trips) / len(trips), 2) if trips else None,
+    }
+
+def run_workload(pool, users, duration, warmup, mix, write_ratio, seed_value=0):
+    with pool.connection() as conn:
+        ctx = Context(conn, write_ratio)
+    roles, weights = zip(*mix.items())
+    samples = {role: [] for role in roles}
+    errors = {role: 0 for role in roles}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    def worker(n):
+        rng = random.Random(seed_value * 1000 + n)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            role = rng.choices(roles, weights)[0]
+            _calls.count = 0
+            t0 = time.perf_counter()
+            try:
+                with pool.connection() as conn:
+                    RENDERS[role](conn, rng, ctx)
+            except Exception:
+                with lock:
+                    errors[role] += 1
+                continue
+            elapsed = time.perf_counter() - t0
+            if t0 >= measure_from:
+                with lock:
+                    samples[role].append((elapsed, _calls.count))
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    result = {role: {**summarise(samples[role], duration), "errors": errors[role]} for role in roles}
+    everything = [s for role in roles for s in samples[role]]
+    result["overall"] = {**summarise(everything, duration), "errors": sum(errors.values())}
+    return result
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'role':>8} {'metric':>22} {'old':>10} {'new':>10} {'change':>8}")
+    for role, stats in new["results"].items():
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "renders_per_sec", "round_trips_per_render"):
+            a, b = old["results"].get(role, {}).get(metric), stats.get(metric)
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+            print(f"{role:>8} {metric:>22} {a if a is not None else '-':>10} {b if b is not None else '-':>10} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed-rows", type=int, help="top queries up to this many rows first (10k to 1M)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--mix", default="Client=70,Support=20,Admin=10", help="role weights")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="share of renders that also write")
+    parser.add_argument("--no-run", action="store_true", help="only seed")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/load_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    seed_stats = seed(args.seed_rows) if args.seed_rows else None
+    if args.no_run:
+        return
+
+    mix = {role: float(weight) for role, weight in (part.split("=") for part in args.mix.split(","))}
+    pool = ConnectionPool(minconn=1, maxconn=args.users, cursor_factory=CountingCursor,
+                          **db.connection_kwargs())
+    try:
+        with pool.connection() as conn:
+            rows = tickets.count_tickets(conn)
+        print(f"Running {args.users} users for {args.duration:.0f}s over {rows:,} tickets ({args.mix})")
+        results = run_workload(pool, args.users, args.duration, args.warmup, mix, args.write_ratio)
+    finally:
+        pool.closeall()
+
+    print(f"{'role':>8} {'renders/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'trips':>6} {'errors':>6}")
+    for role, r in results.items():
+        print(f"{role:>8} {r['renders_per_sec']:>10} {r['p50_ms'] or '-':>8} {r['p95_ms'] or '-':>8} "
+              f"{r['p99_ms'] or '-':>8} {r['round_trips_per_render'] or '-':>6} {r['errors']:>6}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": git_commit(), "when": datetime.now().isoformat(timespec="seconds"),
+                "rows": rows, "users": args.users, "duration": args.duration,
+                "mix": mix, "write_ratio": args.write_ratio,
+            },
+            "seed": seed_stats,
+            "results": results,
+        }, f, indent=2)
+    print(f"✅ Results written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_sentiment.py
+"""Rows/sec of the lexicon sentiment scorer on the bundled CSV, serial vs multiprocessing.
+
+    python benchmarks/bench_sentiment.py
+    python benchmarks/bench_sentiment.py --copies 100 --workers 1 2 4 8
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sentiment  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "data", "synthetic_client_queries.csv")
+
+def load_rows(copies):
+    with open(CSV_PATH, newline="", encoding="utf-8") as f:
+        texts = [f"{r['query_heading']}. {r['query_description']}" for r in csv.DictReader(f)]
+    return list(enumerate(texts * copies))
+
+def run(rows, workers, chunk):
+    # Same shape as sentiment.run_pipeline: fixed-size chunks, each split across the pool.
+    start = time.perf_counter()
+    scored = []
+    if workers == 1:
+        for i in range(0, len(rows), chunk):
+            scored.extend(sentiment.score_rows(rows[i:i + chunk]))
+    else:
+        with Pool(workers) as pool:
+            for i in range(0, len(rows), chunk):
+                parts = sentiment._split(rows[i:i + chunk], workers)
+                scored.extend(r for part in pool.map(sentiment.score_rows, parts) for r in part)
+    return scored, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=20, help="replicate the CSV this many times")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--chunk", type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = load_rows(args.copies)
+    print(f"{len(rows):,} texts")
+    print(f"{'workers':>8} {'seconds':>9} {'rows/sec':>12}")
+    labels = None
+    for workers in sorted(set(args.workers)):
+        scored, elapsed = run(rows, workers, args.chunk)
+        labels = labels or Counter(label for _, _, label in scored)
+        print(f"{workers:>8} {elapsed:>9.2f} {len(rows) / elapsed:>12,.0f}")
+    print("labels:", dict(labels))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_similarity.py
+"""Precision / recall and throughput of the MinHash-LSH duplicate index on the bundled CSV.
+
+    python benchmarks/bench_similarity.py
+    python benchmarks/bench_similarity.py --copies 20 --threshold 0.8
+
+Ground truth: two tickets are duplicates when they have the same heading and the same
+description. Each probe is a held-out ticket with light noise (a dropped word, a typo,
+a trailing remark), so exact string matching would miss most of them.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import similarity  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "data", "synthetic_client_queries.csv")
+REMARKS = ["please help", "urgent", "happened again today", "thanks", "any update"]
+
+def perturb(text, rng):
+    words = (text or "").split()
+    choice = rng.random()
+    if choice < 0.33 and len(words) > 3:
+        del words[rng.randrange(len(words))]
+    elif choice < 0.66 and words:
+        i = rng.randrange(len(words))
+        w = words[i]
+        if len(w) > 3:
+            j = rng.randrange(len(w) - 1)
+            words[i] = w[:j] + w[j + 1] + w[j] + w[j + 2:]
+    else:
+        words.append(rng.choice(REMARKS))
+    return " ".join(words)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=1, help="replicate the CSV to test larger indexes")
+    parser.add_argument("--probes", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=similarity.SUGGEST_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    df = pd.concat([pd.read_csv(CSV_PATH)] * args.copies, ignore_index=True)
+    df["query_id"] = np.arange(1, len(df) + 1)
+    key = df["query_heading"] + "\x00" + df["query_description"]
+
+    index = similarity.SimilarityIndex()
+    start = time.perf_counter()
+    for qid, heading, desc in zip(df["query_id"], df["query_heading"], df["query_description"]):
+        index.add(qid, heading, desc)
+    build = time.perf_counter() - start
+    print(f"Indexed {len(df):,} tickets in {build:.2f}s ({len(df) / build:,.0f} tickets/s)")
+
+    probes = df.sample(n=min(args.probes, len(df)), random_state=args.seed)
+    tp = fp = fn = with_duplicates = 0
+    latencies = []
+    key_by_id = dict(zip(df["query_id"], key))
+    copies_of = key.value_counts()
+    for qid, heading, desc in zip(probes["query_id"], probes["query_heading"], probes["query_description"]):
+        noisy = perturb(desc, rng)
+        t0 = time.perf_counter()
+        matches = index.similar(heading, noisy, k=5, threshold=args.threshold, exclude=qid)
+        latencies.append(time.perf_counter() - t0)
+        truth = key_by_id[qid]
+        has_duplicate = copies_of[truth] > 1
+        with_duplicates += has_duplicate
+        hits = [m for m in matches if key_by_id[m[0]] == truth]
+        tp += len(hits)
+        fp += len(matches) - len(hits)
+        if has_duplicate and not hits:
+            fn += 1
+
+    lat = np.array(latencies) * 1000
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = 1 - fn / with_duplicates if with_duplicates else 0.0
+    print(f"threshold {args.threshold}: precision {precision:.3f}, recall@5 {recall:.3f} "
+          f"over {len(probes):,} noisy probes")
+    print(f"lookup latency ms: p50 {np.percentile(lat, 50):.3f}  p95 {np.percentile(lat, 95):.3f}  "
+          f"p99 {np.percentile(lat, 99):.3f}  ({len(lat) / lat.sum() * 1000:,.0f} lookups/s)")
+
+    start = time.perf_counter()
+    clusters, _ = similarity.cluster(index, args.threshold)
+    print(f"Clustered into {len(clusters):,} groups in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
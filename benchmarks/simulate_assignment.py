@@ -0,0 +1,114 @@
+# benchmarks/simulate_assignment.py
+"""Replay the bundled tickets through a queue simulation to compare routing strategies.
+
+    python benchmarks/simulate_assignment.py
+    python benchmarks/simulate_assignment.py --agents 8 --service-scale 2 --seed 3
+
+Each agent works their own queue one ticket at a time. Tickets arrive at their CSV
+created date (spread randomly over the day), get a random priority, and take
+``resolution days * service-scale`` hours to handle. The least-load strategy uses
+assignment.AssignmentEngine exactly as the app does.
+"""
+import argparse
+import heapq
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import assignment  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "data", "synthetic_client_queries.csv")
+PRIORITIES = ["High", "Medium", "Low"]
+PRIORITY_MIX = [0.2, 0.5, 0.3]
+
+# ==============================
+# WORKLOAD
+# ==============================
+def workload(service_scale, seed):
+    """(arrival hour, service hours, priority) per ticket, sorted by arrival."""
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(CSV_PATH)
+    fmt = "%A, %B %d, %Y"
+    created = pd.to_datetime(df["query_created_time"], format=fmt, errors="coerce")
+    closed = pd.to_datetime(df["query_closed_time"], format=fmt, errors="coerce")
+    df = df[created.notna()]
+    created, closed = created[df.index], closed[df.index]
+
+    arrival = (created - created.min()).dt.total_seconds() / 3600 + rng.uniform(0, 24, len(df))
+    days = (closed - created).dt.days.fillna(1).clip(lower=0) + 1
+    service = days.to_numpy() * service_scale * rng.uniform(0.5, 1.5, len(df))
+    priority = rng.choice(PRIORITIES, len(df), p=PRIORITY_MIX)
+    order = np.argsort(arrival.to_numpy(), kind="stable")
+    return [(arrival.to_numpy()[i], service[i], priority[i]) for i in order]
+
+# ==============================
+# STRATEGIES
+# ==============================
+def least_load(agents, seed):
+    engine = assignment.AssignmentEngine(available=agents)
+
+    def route(priority):
+        return engine.pick(priority)
+
+    def done(agent, priority):
+        engine.apply_change({"assigned_to": agent, "priority": priority, "status": "Open"}, None)
+    return route, done
+
+def random_choice(agents, seed):
+    rng = np.random.default_rng(seed)
+    return (lambda priority: agents[rng.integers(len(agents))]), (lambda agent, priority: None)
+
+def top_heavy(agents, seed):
+    # Roughly what manual assignment looks like: the first names in the list get most tickets.
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(agents) + 1)
+    weights /= weights.sum()
+    return (lambda priority: agents[rng.choice(len(agents), p=weights)]), (lambda agent, priority: None)
+
+STRATEGIES = {"least_load": least_load, "random": random_choice, "top_heavy": top_heavy}
+
+# ==============================
+# SIMULATION
+# ==============================
+def simulate(tickets, agents, strategy, seed):
+    """Return the queue wait (hours before an agent starts the ticket) for every ticket."""
+    route, done = STRATEGIES[strategy](agents, seed)
+    free_at = {agent: 0.0 for agent in agents}
+    completions = []  # (finish time, agent, priority)
+    waits = []
+    for arrival, service, priority in tickets:
+        # Release finished work before routing so the engine sees current loads.
+        while completions and completions[0][0] <= arrival:
+            _, agent, done_priority = heapq.heappop(completions)
+            done(agent, done_priority)
+        agent = route(priority)
+        start = max(arrival, free_at[agent])
+        free_at[agent] = start + service
+        heapq.heappush(completions, (free_at[agent], agent, priority))
+        waits.append(start - arrival)
+    return np.array(waits)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=5)
+    parser.add_argument("--service-scale", type=float, default=1.0,
+                        help="handling hours per day the ticket stayed open")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tickets = workload(args.service_scale, args.seed)
+    agents = [f"support_{i:02d}" for i in range(args.agents)]
+    print(f"{len(tickets):,} tickets, {args.agents} agents")
+    print(f"{'strategy':>12} {'mean h':>8} {'p50 h':>8} {'p95 h':>8} {'max h':>8}")
+    for name in STRATEGIES:
+        waits = simulate(tickets, agents, name, args.seed)
+        p50, p95 = np.percentile(waits, [50, 95])
+        print(f"{name:>12} {waits.mean():>8.2f} {p50:>8.2f} {p95:>8.2f} {waits.max():>8.2f}")
+
+if __name__ == "__main__":
+    main()
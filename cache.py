@@ -0,0 +1,130 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+# ==============================
+# DATASETS
+# ==============================
+# dataset -> (ttl seconds, max entries). Ticket reads are the heaviest and change most.
+DEFAULT_DATASETS = {
+    "ticket_pages": (30, 256),
+    "ticket_counts": (30, 128),
+    "chat": (10, 64),
+    "doubts": (10, 32),
+    "availability": (10, 8),
+    "support_users": (300, 4),
+}
+
+def filters_match(filters, rows):
+    """True if any of ``rows`` (dicts of ticket fields) could appear under ``filters``.
+
+    Filters the rows don't describe (e.g. date ranges) are treated as matching.
+    """
+    for row in rows:
+        if row is None:
+            continue
+        ok = True
+        for field, wanted in filters.items():
+            if wanted is None or field not in row:
+                continue
+            allowed = wanted if isinstance(wanted, (list, tuple, set, frozenset)) else (wanted,)
+            if row[field] not in allowed:
+                ok = False
+                break
+        if ok:
+            return True
+    return False
+
+# ==============================
+# CACHE
+# ==============================
+class QueryCache:
+    """Process-wide TTL + LRU cache for dashboard reads, partitioned by dataset.
+
+    Each entry can carry ``tags`` (for ticket reads: the filters it was loaded with)
+    so writers can drop only the entries their change could affect.
+
+    Cached values (usually DataFrames) are shared by every session in the process:
+    callers must treat them as read-only and ``.copy()`` before changing anything.
+    """
+
+    def __init__(self, datasets=None):
+        self._config = dict(datasets or DEFAULT_DATASETS)
+        self._lock = threading.Lock()
+        self._entries = {name: OrderedDict() for name in self._config}
+        # Bumped by every invalidate(); a load that started before the bump is not stored.
+        self._generation = {name: 0 for name in self._config}
+        self._stats = {
+            name: {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_loads": 0}
+            for name in self._config
+        }
+
+    def get_or_load(self, dataset, key, loader, tags=None):
+        ttl, maxsize = self._config[dataset]
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries[dataset]
+            entry = entries.get(key)
+            if entry is not None and entry[0] > now:
+                entries.move_to_end(key)
+                self._stats[dataset]["hits"] += 1
+                return entry[1]
+            self._stats[dataset]["misses"] += 1
+            generation = self._generation[dataset]
+
+        # Load outside the lock so one slow query doesn't stall every other session.
+        value = loader()
+
+        with self._lock:
+            if self._generation[dataset] != generation:
+                # Invalidated mid-load: the value may predate the write, so serve it once but don't keep it.
+                self._stats[dataset]["stale_loads"] += 1
+                return value
+            entries = self._entries[dataset]
+            entries[key] = (time.monotonic() + ttl, value, tags)
+            entries.move_to_end(key)
+            while len(entries) > maxsize:
+                entries.popitem(last=False)
+                self._stats[dataset]["evictions"] += 1
+        return value
+
+    def invalidate(self, dataset, key=None, predicate=None):
+        """Drop one key, every entry whose tags satisfy ``predicate``, or the whole dataset."""
+        with self._lock:
+            self._generation[dataset] += 1
+            entries = self._entries[dataset]
+            if key is not None:
+                doomed = [key] if key in entries else []
+            elif predicate is not None:
+                doomed = [k for k, (_, _, tags) in entries.items() if tags is None or predicate(tags)]
+            else:
+                doomed = list(entries)
+            for k in doomed:
+                del entries[k]
+            self._stats[dataset]["invalidations"] += len(doomed)
+        return len(doomed)
+
+    def invalidate_tickets(self, rows=None):
+        # rows: before/after field dicts of the written tickets; None means "anything".
+        predicate = None if rows is None else (lambda filters: filters_match(filters, rows))
+        return sum(self.invalidate(ds, predicate=predicate) for ds in ("ticket_pages", "ticket_counts"))
+
+    def clear(self):
+        for dataset in self._config:
+            self.invalidate(dataset)
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for name, counters in self._stats.items():
+                ttl, maxsize = self._config[name]
+                lookups = counters["hits"] + counters["misses"]
+                out[name] = dict(
+                    counters,
+                    size=len(self._entries[name]),
+                    maxsize=maxsize,
+                    ttl=ttl,
+                    hit_ratio=round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                )
+        return out
@@ -1,10 +1,18 @@
 # db.py
-import psycopg2
+import io
+import threading
+import time
 import pandas as pd
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
+import access
+from instrumentation import InstrumentedCursor
+from migrations import migrate
+from partitioning import convert_small, ensure_partitions
+from pool import ConnectionPool
+
 # ==============================
 # LOAD ENV
 # ==============================
@@ -13,128 +21,156 @@ load_dotenv()
 # ==============================
 # DATABASE CONNECTION
 # ==============================
-def get_connection():
-    return psycopg2.connect(
+def connection_kwargs():
+    return dict(
         host=os.getenv("PG_HOST", "localhost"),
         port=os.getenv("PG_PORT", "5432"),
         database=os.getenv("PG_DB", "CQMS"),
         user=os.getenv("PG_USER", "postgres"),
         password=os.getenv("PG_PASSWORD", "123"),
+        # The row-level security policy denies sessions that don't say who they are.
+        options=access.session_options(),
+    )
+
+def create_pool():
+    return ConnectionPool(
+        minconn=int(os.getenv("PG_POOL_MIN", "1")),
+        maxconn=int(os.getenv("PG_POOL_MAX", "10")),
+        checkout_timeout=float(os.getenv("PG_POOL_TIMEOUT", "10")),
+        health_check_interval=float(os.getenv("PG_POOL_HEALTH_CHECK", "30")),
+        # Counts statements and rows per span / page render (see instrumentation.py).
+        cursor_factory=InstrumentedCursor,
+        **connection_kwargs(),
     )
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_pool()
+    return _pool
+
+def get_connection():
+    # Use as ``with get_connection() as conn:`` — the connection goes back to the pool on exit.
+    return get_pool().connection()
+
 # ==============================
 # INITIALIZE DATABASE
 # ==============================
 def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Drop existing tables (clean start)
-    cur.execute("DROP TABLE IF EXISTS ticket_comments CASCADE;")
-    cur.execute("DROP TABLE IF EXISTS queries CASCADE;")
-    cur.execute("DROP TABLE IF EXISTS users CASCADE;")
-
-    # USERS TABLE
-    cur.execute("""
-        CREATE TABLE users (
-            username VARCHAR(100) PRIMARY KEY,
-            hashed_password TEXT NOT NULL,
-            role VARCHAR(20) NOT NULL
-        );
-    """)
-
-    # QUERIES TABLE
-    cur.execute("""
-        CREATE TABLE queries (
-            query_id SERIAL PRIMARY KEY,
-            username VARCHAR(100),
-            mail_id VARCHAR(255),
-            mobile_number VARCHAR(20),
-            query_heading TEXT,
-            query_description TEXT,
-            priority VARCHAR(10),
-            status VARCHAR(20),
-            assigned_to VARCHAR(100),
-            sla_hours INT,
-            query_created_time TIMESTAMP,
-            query_closed_time TIMESTAMP
-        );
-    """)
-
-    # TICKET COMMENTS TABLE
-    cur.execute("""
-        CREATE TABLE ticket_comments (
-            id SERIAL PRIMARY KEY,
-            query_id INT REFERENCES queries(query_id),
-            commented_by VARCHAR(100),
-            comment TEXT,
-            sentiment VARCHAR(20),
-            commented_at TIMESTAMP
-        );
-    """)
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("✅ Tables created successfully!")
+    # Versioned and non-destructive: only migrations not yet recorded are applied.
+    with get_connection() as conn:
+        applied = migrate(conn)
+        try:
+            if convert_small(conn):
+                print("✅ Partitioned queries")
+        except Exception as e:
+            print(f"⚠️ Could not partition queries ({e}); run: python partitioning.py --convert")
+        try:
+            created = ensure_partitions(conn)
+        except Exception as e:
+            created = []
+            print(f"⚠️ Could not add partitions ({e}); run: python partitioning.py --maintain")
+    print(f"✅ Applied migrations: {applied}" if applied else "✅ Schema is up to date")
+    if created:
+        print(f"✅ Created partitions: {', '.join(created)}")
 
 # ==============================
 # LOAD CSV INTO QUERIES
 # ==============================
-def load_csv_into_queries(csv_path):
-    df = pd.read_csv(csv_path)
+CSV_COLUMNS = [
+    "query_id",
+    "mail_id",
+    "mobile_number",
+    "query_heading",
+    "query_description",
+    "status",
+    "query_created_time",
+    "query_closed_time",
+]
+
+# The CSV's own query_id (e.g. "Q0001") is stored as source_query_id so reloads are idempotent.
+STAGING_COLUMNS = ["source_query_id"] + CSV_COLUMNS[1:]
+
+def _parse_dates(series):
+    # Fast path for the bundled format ("Wednesday, February 26, 2025"), then generic coercion.
+    parsed = pd.to_datetime(series, format="%A, %B %d, %Y", errors="coerce")
+    retry = parsed.isna() & series.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(series[retry], errors="coerce")
+    return parsed
+
+def _prepare_chunk(chunk):
+    chunk = chunk.reindex(columns=CSV_COLUMNS)
+    for col in ["query_created_time", "query_closed_time"]:
+        chunk[col] = _parse_dates(chunk[col])
+    chunk.columns = STAGING_COLUMNS
+    return chunk
 
-    # Replace NaN with None
-    df = df.where(pd.notnull(df), None)
+def load_csv_into_queries(csv_path, chunksize=50_000):
+    """Stream a CSV into ``queries`` with COPY, one committed chunk at a time.
 
-    # Convert datetime columns safely
-    for col in ["query_created_time", "query_closed_time"]:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-
-    conn = get_connection()
-    cur = conn.cursor()
-
-    insert_sql = """
-        INSERT INTO queries (
-            mail_id,
-            mobile_number,
-            query_heading,
-            query_description,
-            status,
-            query_created_time,
-            query_closed_time
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s);
+    Rows whose CSV query_id is already loaded are skipped, so an interrupted load
+    can simply be re-run. Returns rows read/inserted and throughput.
     """
-
-    for _, row in df.iterrows():
-        created_time = row.get("query_created_time")
-        closed_time = row.get("query_closed_time")
-
-        # 🔑 FIX: NaT → None
-        if pd.isna(created_time):
-            created_time = None
-        if pd.isna(closed_time):
-            closed_time = None
-
-        cur.execute(
-            insert_sql,
-            (
-                row.get("mail_id"),
-                row.get("mobile_number"),
-                row.get("query_heading"),
-                row.get("query_description"),
-                row.get("status"),
-                created_time,
-                closed_time,
-            ),
-        )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("✅ CSV loaded successfully without any errors!")
+    columns = ", ".join(STAGING_COLUMNS)
+    start = time.perf_counter()
+    rows_read = rows_inserted = 0
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS queries_staging (
+                source_query_id VARCHAR(50),
+                mail_id VARCHAR(255),
+                mobile_number VARCHAR(20),
+                query_heading TEXT,
+                query_description TEXT,
+                status VARCHAR(20),
+                query_created_time TIMESTAMP,
+                query_closed_time TIMESTAMP
+            ) ON COMMIT DELETE ROWS;
+        """)
+
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            chunk = _prepare_chunk(chunk)
+
+            # Empty unquoted CSV fields (NaN / NaT) are read by COPY as NULL.
+            buf = io.StringIO()
+            chunk.to_csv(buf, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+            buf.seek(0)
+            cur.copy_expert(f"COPY queries_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+
+            # Anti-join rather than ON CONFLICT: the partitioned queries table has no unique
+            # index on source_query_id (one would have to include the partition keys).
+            cur.execute(f"""
+                INSERT INTO queries ({columns})
+                SELECT DISTINCT ON (s.source_query_id) {columns} FROM queries_staging s
+                WHERE NOT EXISTS (SELECT 1 FROM queries q WHERE q.source_query_id = s.source_query_id)
+                ORDER BY s.source_query_id;
+            """)
+            rows_inserted += cur.rowcount
+            conn.commit()
+
+            rows_read += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"  {rows_read:,} rows read, {rows_inserted:,} inserted ({rows_read / elapsed:,.0f} rows/sec)")
+
+        cur.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rows_read": rows_read,
+        "rows_inserted": rows_inserted,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows_read / elapsed, 1) if elapsed else 0.0,
+    }
+    print(f"✅ CSV loaded: {rows_inserted:,} new rows of {rows_read:,} ({stats['rows_per_sec']:,.0f} rows/sec)")
+    return stats
 
 # ==============================
 # MAIN
@@ -0,0 +1,200 @@
+# export.py
+import argparse
+import csv
+import gzip
+import io
+import time
+import uuid
+from decimal import Decimal
+
+import tickets
+
+# ==============================
+# DATASETS
+# ==============================
+# Exports read through a server-side (named) cursor: PostgreSQL keeps the result and we
+# pull it ``chunk`` rows at a time, so memory stays at one chunk whatever the size.
+CHUNK_ROWS = 10_000
+
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+# Analytics results honour the same ticket filters; {where} is filled in by dataset_sql.
+ANALYTICS_SQL = {
+    "monthly_volume": """
+        SELECT to_char(date_trunc('month', query_created_time), 'YYYY-MM') AS month,
+               status, COUNT(*) AS tickets
+        FROM queries{where}
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """,
+    "support_workload": """
+        SELECT assigned_to, priority, status, COUNT(*) AS tickets,
+               COUNT(*) FILTER (WHERE due_at < now() AND status <> 'Closed') AS overdue
+        FROM queries{where}
+        GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+    """,
+}
+DATASETS = ["tickets"] + list(ANALYTICS_SQL)
+
+def dataset_sql(dataset="tickets", columns=None, limit=None, **filters):
+    """``(sql, params)`` for an export; ticket rows come out in query_id order."""
+    if dataset in ANALYTICS_SQL:
+        filters.setdefault("archived", None)  # history counts too, not just live tickets
+    clauses, params = tickets._where(**filters)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    if dataset == "tickets":
+        columns = list(columns or tickets.TICKET_COLUMNS)
+        tickets._check_columns(columns)
+        sql = f"SELECT {', '.join(columns)} FROM queries{where} ORDER BY query_id"
+    elif dataset in ANALYTICS_SQL:
+        sql = ANALYTICS_SQL[dataset].format(where=where)
+    else:
+        raise ValueError(f"Unknown export dataset: {dataset}")
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(int(limit))
+    return sql, params
+
+# ==============================
+# WRITERS
+# ==============================
+class _CsvWriter:
+    def __init__(self, out, columns, type_codes, compress=False):
+        self._gzip = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) if compress else None
+        self._text = io.TextIOWrapper(self._gzip or out, encoding="utf-8", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(columns)
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()  # leave ``out`` open for the caller
+        if self._gzip is not None:
+            self._gzip.close()
+
+# PostgreSQL type OIDs -> Arrow types; anything else is written as text.
+_ARROW_TYPES = {
+    16: "bool_", 20: "int64", 21: "int16", 23: "int32", 700: "float32", 701: "float64",
+    1700: "float64", 1082: "date32", 1114: "timestamp", 1184: "timestamptz",
+}
+
+class _ParquetWriter:
+    def __init__(self, out, columns, type_codes):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self._pa = pa
+        fields = []
+        for name, oid in zip(columns, type_codes):
+            kind = _ARROW_TYPES.get(oid)
+            if kind == "timestamp":
+                arrow_type = pa.timestamp("us")
+            elif kind == "timestamptz":
+                arrow_type = pa.timestamp("us", tz="UTC")
+            elif kind:
+                arrow_type = getattr(pa, kind)()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        # The schema is fixed up front, so a chunk of all-NULLs cannot change a column's type.
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(out, self._schema, compression="zstd")
+
+    def write(self, rows):
+        # One row group per chunk.
+        columns = list(zip(*rows))
+        arrays = []
+        for field, values in zip(self._schema, columns):
+            if self._pa.types.is_string(field.type):
+                values = [None if v is None else str(v) for v in values]
+            elif self._pa.types.is_floating(field.type):
+                values = [float(v) if isinstance(v, Decimal) else v for v in values]
+            arrays.append(self._pa.array(values, type=field.type))
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def _writer(fmt, out, columns, type_codes):
+    if fmt == "csv":
+        return _CsvWriter(out, columns, type_codes)
+    if fmt == "csv.gz":
+        return _CsvWriter(out, columns, type_codes, compress=True)
+    if fmt == "parquet":
+        return _ParquetWriter(out, columns, type_codes)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+# ==============================
+# EXPORT
+# ==============================
+def export(conn, out, fmt="csv", dataset="tickets", columns=None, chunk=CHUNK_ROWS, limit=None, **filters):
+    """Stream a dataset into the binary file object ``out``.
+
+    Returns ``{"rows", "bytes", "seconds", "rows_per_sec"}`` (bytes only when ``out`` can tell).
+    """
+    sql, params = dataset_sql(dataset, columns, limit, **filters)
+    return export_query(conn, out, fmt, sql, params, chunk)
+
+def export_query(conn, out, fmt, sql, params=(), chunk=CHUNK_ROWS):
+    """Stream the result of any read-only ``sql`` into ``out``; the building block of ``export``."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    start = time.perf_counter()
+    offset = out.tell() if out.seekable() else None
+    rows_written = 0
+    cur = conn.cursor(name=f"cqms_export_{uuid.uuid4().hex[:12]}")
+    cur.itersize = chunk
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchmany(chunk)
+        writer = _writer(fmt, out, [d[0] for d in cur.description], [d[1] for d in cur.description])
+        while rows:
+            writer.write(rows)
+            rows_written += len(rows)
+            rows = cur.fetchmany(chunk)
+        writer.close()
+    finally:
+        cur.close()
+        conn.rollback()  # read-only; ends the transaction the named cursor lived in
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows_written,
+        "bytes": out.tell() - offset if offset is not None else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows_written / elapsed) if elapsed else None,
+    }
+
+def export_file(conn, path, fmt="csv", dataset="tickets", **kwargs):
+    with open(path, "wb") as out:
+        return export(conn, out, fmt, dataset, **kwargs)
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Export tickets or analytics results")
+    parser.add_argument("output")
+    parser.add_argument("--dataset", choices=DATASETS, default="tickets")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--status", nargs="+")
+    parser.add_argument("--priority", nargs="+")
+    parser.add_argument("--assigned-to")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--include-archived", action="store_true", help="also export archived tickets")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        stats = export_file(conn, args.output, args.format, args.dataset, chunk=args.chunk,
+                            status=args.status, priority=args.priority, assigned_to=args.assigned_to,
+                            **({"archived": None} if args.include_archived else {}))
+    print(f"✅ {stats['rows']:,} rows, {stats['bytes'] / 1e6:.1f} MB in {stats['seconds']}s "
+          f"({stats['rows_per_sec'] or 0:,} rows/sec) -> {args.output}")
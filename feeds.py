@@ -0,0 +1,72 @@
+# feeds.py
+import pandas as pd
+
+# ==============================
+# CURSOR FEEDS
+# ==============================
+# Chat and doubts are append-only, so the SERIAL id is a stable watermark:
+#   after_id  -> only rows newer than what the session already holds (oldest first)
+#   before_id -> one page of older history (returned oldest first as well)
+
+CHAT_COLUMNS = ["id", "sender", "receiver", "message", "created_at"]
+DOUBT_COLUMNS = ["id", "user_name", "doubt", "created_at"]
+
+def _fetch(conn, table, columns, clauses, params, after_id, before_id, limit):
+    clauses, params = list(clauses), list(params)
+    if after_id is not None:
+        clauses.append("id > %s")
+        params.append(int(after_id))
+    if before_id is not None:
+        clauses.append("id < %s")
+        params.append(int(before_id))
+    # New rows are read forward from the watermark; history (and the first load) backward.
+    order = "ASC" if after_id is not None else "DESC"
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY id {order} LIMIT %s"
+    params.append(limit)
+    df = pd.read_sql(sql, conn, params=params)
+    return df.sort_values("id").reset_index(drop=True)
+
+def fetch_chat(conn, participant=None, after_id=None, before_id=None, limit=100):
+    clauses, params = [], []
+    if participant is not None:
+        clauses.append("(sender = %s OR receiver = %s)")
+        params.extend([participant, participant])
+    return _fetch(conn, "support_chat", CHAT_COLUMNS, clauses, params, after_id, before_id, limit)
+
+def fetch_doubts(conn, user_name=None, after_id=None, before_id=None, limit=100):
+    clauses, params = [], []
+    if user_name is not None:
+        clauses.append("user_name = %s")
+        params.append(user_name)
+    return _fetch(conn, "support_doubts", DOUBT_COLUMNS, clauses, params, after_id, before_id, limit)
+
+# ==============================
+# SESSION STATE
+# ==============================
+def new_feed():
+    return {"items": None, "newest": None, "oldest": None, "has_older": True}
+
+def merge_new(feed, df, limit):
+    if df.empty:
+        if feed["items"] is None:
+            feed["items"], feed["has_older"] = df, False
+        return feed
+    # An empty first load leaves ``oldest`` unset, so the first rows to arrive still
+    # set up the "older" cursor (they were fetched newest-first, like a first load).
+    first_load = feed["oldest"] is None
+    feed["items"] = df if first_load else pd.concat([feed["items"], df], ignore_index=True)
+    feed["newest"] = int(feed["items"]["id"].iloc[-1])
+    if first_load:
+        feed["oldest"] = int(df["id"].iloc[0])
+        feed["has_older"] = len(df) >= limit
+    return feed
+
+def merge_older(feed, df, limit):
+    if not df.empty:
+        feed["items"] = pd.concat([df, feed["items"]], ignore_index=True)
+        feed["oldest"] = int(df["id"].iloc[0])
+    feed["has_older"] = len(df) >= limit
+    return feed
@@ -0,0 +1,203 @@
+# hashing.py
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+# ==============================
+# HASHERS
+# ==============================
+# Stored hashes identify their scheme, so several can coexist while users migrate:
+#   bcrypt   -> "$2b$<cost>$..."
+#   scrypt   -> "scrypt$<log2 n>$<r>$<p>$<salt hex>$<hash hex>"
+#   legacy   -> 64 hex chars, unsalted single-round SHA-256 (the original make_hash)
+
+class LegacySha256Hasher:
+    name = "sha256"
+
+    def identify(self, stored):
+        return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+    def hash(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password, stored):
+        return hmac.compare_digest(self.hash(password), stored)
+
+    def needs_rehash(self, stored):
+        return True
+
+
+# bcrypt takes at most 72 bytes: 5.x raises ValueError beyond that and older releases
+# silently ignored the rest. Longer passwords are reduced to their base64 SHA-256 (44
+# bytes) first, so every byte counts and nothing raises.
+BCRYPT_MAX_BYTES = 72
+
+def _bcrypt_secret(password):
+    secret = password.encode()
+    if len(secret) > BCRYPT_MAX_BYTES:
+        secret = base64.b64encode(hashlib.sha256(secret).digest())
+    return secret
+
+
+class BcryptHasher:
+    name = "bcrypt"
+
+    def __init__(self, rounds=12):
+        self.rounds = rounds
+
+    def identify(self, stored):
+        return stored.startswith(("$2a$", "$2b$", "$2y$"))
+
+    def hash(self, password):
+        return bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(rounds=self.rounds)).decode()
+
+    def verify(self, password, stored):
+        if bcrypt.checkpw(_bcrypt_secret(password), stored.encode()):
+            return True
+        # A long password hashed by bcrypt < 5 was stored truncated to its first 72 bytes.
+        secret = password.encode()
+        return len(secret) > BCRYPT_MAX_BYTES and bcrypt.checkpw(secret[:BCRYPT_MAX_BYTES], stored.encode())
+
+    def needs_rehash(self, stored):
+        return int(stored.split("$")[2]) != self.rounds
+
+
+class ScryptHasher:
+    name = "scrypt"
+
+    def __init__(self, log2_n=14, r=8, p=1):
+        self.log2_n, self.r, self.p = log2_n, r, p
+
+    def identify(self, stored):
+        return stored.startswith("scrypt$")
+
+    def _derive(self, password, salt, log2_n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=1 << log2_n, r=r, p=p,
+                              maxmem=256 * (1 << log2_n) * r + (1 << 20), dklen=32)
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.log2_n, self.r, self.p)
+        return f"scrypt${self.log2_n}${self.r}${self.p}${salt.hex()}${digest.hex()}"
+
+    def verify(self, password, stored):
+        _, log2_n, r, p, salt, digest = stored.split("$")
+        derived = self._derive(password, bytes.fromhex(salt), int(log2_n), int(r), int(p))
+        return hmac.compare_digest(derived.hex(), digest)
+
+    def needs_rehash(self, stored):
+        _, log2_n, r, p, _, _ = stored.split("$")
+        return (int(log2_n), int(r), int(p)) != (self.log2_n, self.r, self.p)
+
+
+class PasswordHasher:
+    """Hashes with the preferred scheme and verifies against any known one."""
+
+    def __init__(self, preferred, fallbacks=()):
+        self.preferred = preferred
+        self.schemes = [preferred] + [h for h in fallbacks if h is not preferred]
+
+    def hash(self, password):
+        return self.preferred.hash(password)
+
+    def _scheme_for(self, stored):
+        for scheme in self.schemes:
+            if scheme.identify(stored):
+                return scheme
+        return None
+
+    def verify(self, password, stored):
+        """Return ``(ok, new_hash)``; ``new_hash`` is set when the stored hash should be upgraded."""
+        scheme = self._scheme_for(stored or "")
+        if scheme is None or not scheme.verify(password, stored):
+            return False, None
+        if scheme is not self.preferred or scheme.needs_rehash(stored):
+            return True, self.hash(password)
+        return True, None
+
+def hasher_from_env():
+    scheme = os.getenv("PASSWORD_HASHER", "bcrypt")
+    bcrypt_hasher = BcryptHasher(rounds=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    scrypt_hasher = ScryptHasher(log2_n=int(os.getenv("SCRYPT_LOG2_N", "14")))
+    preferred = scrypt_hasher if scheme == "scrypt" else bcrypt_hasher
+    return PasswordHasher(preferred, [bcrypt_hasher, scrypt_hasher, LegacySha256Hasher()])
+
+# ==============================
+# VERIFICATION POOL
+# ==============================
+class VerificationBusy(Exception):
+    pass
+
+
+class VerificationPool:
+    """Runs slow KDF work off the Streamlit script thread with bounded concurrency.
+
+    At most ``workers`` hashes run at once and at most ``max_pending`` callers wait;
+    beyond that ``VerificationBusy`` is raised straight away so a login storm turns
+    into fast "try again" responses instead of a growing queue of blocked sessions.
+    """
+
+    def __init__(self, hasher, workers=4, max_pending=32, timeout=10.0):
+        self.hasher = hasher
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._admission = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._stats = {"verified": 0, "hashed": 0, "rejected_busy": 0, "timed_out": 0, "in_flight": 0}
+
+    def _run(self, counter, fn, *args):
+        if not self._admission.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected_busy"] += 1
+            raise VerificationBusy("Too many logins in progress, please retry in a moment")
+        start = time.perf_counter()
+        with self._lock:
+            self._stats["in_flight"] += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._finish(start, counter)
+            raise
+        # The slot is held until the hash itself finishes, not until this caller stops
+        # waiting, so ``max_pending`` really bounds the work queued on the executor.
+        future.add_done_callback(lambda _: self._finish(start, counter))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats["timed_out"] += 1
+            raise VerificationBusy("Password check is taking too long, please retry in a moment")
+
+    def _finish(self, start, counter):
+        self._admission.release()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["in_flight"] -= 1
+            self._stats[counter] += 1
+            self._latencies.append(elapsed)
+            # Keep a bounded window for percentile reporting.
+            if len(self._latencies) > 1000:
+                del self._latencies[:500]
+
+    def verify(self, password, stored):
+        return self._run("verified", self.hasher.verify, password, stored)
+
+    def hash(self, password):
+        return self._run("hashed", self.hasher.hash, password)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            window = sorted(self._latencies)
+        if window:
+            stats["p50_ms"] = round(window[len(window) // 2] * 1000, 1)
+            stats["p95_ms"] = round(window[int(len(window) * 0.95) - 1] * 1000, 1)
+            stats["max_ms"] = round(window[-1] * 1000, 1)
+        return stats
@@ -0,0 +1,334 @@
+# instrumentation.py
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2.extensions
+
+# ==============================
+# PER-THREAD STATE
+# ==============================
+# Streamlit runs each rerun on its own script thread, so thread-local counters are
+# per-rerun counters. Threads outside a render (sweeper, listener) still feed the
+# process-wide aggregates, just not a trace.
+_local = threading.local()
+
+def _counters():
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = _local.counters = {"queries": 0, "rows": 0, "db_seconds": 0.0}
+    return counters
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+# ==============================
+# CURSOR
+# ==============================
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """cursor_factory that counts statements, rows fetched and time spent in the database."""
+
+    def _timed(self, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            counters = _counters()
+            counters["queries"] += 1
+            counters["db_seconds"] += time.perf_counter() - start
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, file, size)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _counters()["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _counters()["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _counters()["rows"] += len(rows)
+        return rows
+
+# ==============================
+# AGGREGATES
+# ==============================
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_RENDERS = 50
+
+_lock = threading.Lock()
+_spans = {}
+_renders = {}
+_recent = deque(maxlen=RECENT_RENDERS)
+_gauges = {}
+
+def _new_stat():
+    return {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "queries": 0, "rows": 0,
+            "db_seconds": 0.0, "frame_rows": 0, "frame_bytes": 0, "buckets": [0] * len(BUCKETS)}
+
+def _observe(table, name, seconds, queries, rows, db_seconds):
+    with _lock:
+        stat = table.get(name)
+        if stat is None:
+            stat = table[name] = _new_stat()
+        stat["calls"] += 1
+        stat["seconds"] += seconds
+        stat["max_seconds"] = max(stat["max_seconds"], seconds)
+        stat["queries"] += queries
+        stat["rows"] += rows
+        stat["db_seconds"] += db_seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stat["buckets"][i] += 1
+
+def span_stats():
+    """``{span: {calls, seconds, max_seconds, queries, rows, db_seconds, frame_rows, frame_bytes}}``."""
+    with _lock:
+        return {name: {k: v for k, v in stat.items() if k != "buckets"} for name, stat in _spans.items()}
+
+def render_stats():
+    with _lock:
+        return {page: {k: v for k, v in stat.items() if k != "buckets"} for page, stat in _renders.items()}
+
+def recent_renders():
+    with _lock:
+        return [trace.summary() for trace in _recent]
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _renders.clear()
+        _recent.clear()
+
+# ==============================
+# SPANS
+# ==============================
+class Trace:
+    """Everything one page render did: nested spans, DataFrames produced, and totals."""
+
+    def __init__(self, page, detail=False):
+        self.page = page
+        self.detail = detail
+        self.started_at = time.time()
+        self.seconds = None
+        self.queries = self.rows = 0
+        self.db_seconds = 0.0
+        self.spans = []
+        self.frames = []
+        self.profile = None
+        self.depth = 0
+
+    def summary(self):
+        return {
+            "page": self.page,
+            "started_at": time.strftime("%H:%M:%S", time.localtime(self.started_at)),
+            "seconds": round(self.seconds or 0.0, 4),
+            "queries": self.queries,
+            "rows": self.rows,
+            "db_seconds": round(self.db_seconds, 4),
+            "frame_bytes": sum(f["bytes"] for f in self.frames),
+        }
+
+@contextmanager
+def span(name):
+    """Time a block; the statements and rows it caused are attributed to ``name``."""
+    trace = current_trace()
+    counters = _counters()
+    queries, rows, db_seconds = counters["queries"], counters["rows"], counters["db_seconds"]
+    entry = None
+    if trace is not None:
+        entry = {"span": name, "depth": trace.depth}
+        trace.spans.append(entry)
+        trace.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        d_queries = counters["queries"] - queries
+        d_rows = counters["rows"] - rows
+        d_db = counters["db_seconds"] - db_seconds
+        if entry is not None:
+            trace.depth -= 1
+            entry.update(seconds=round(seconds, 5), queries=d_queries, rows=d_rows, db_seconds=round(d_db, 5))
+        _observe(_spans, name, seconds, d_queries, d_rows, d_db)
+
+def record_frame(name, df):
+    """Note a DataFrame's size against the current render; deep (string) sizing only in detail mode."""
+    trace = current_trace()
+    if trace is None:
+        return
+    size = int(df.memory_usage(index=True, deep=trace.detail).sum())
+    trace.frames.append({"span": name, "rows": len(df), "columns": df.shape[1], "bytes": size})
+    with _lock:
+        stat = _spans.get(name)
+        if stat is not None:
+            stat["frame_rows"] += len(df)
+            stat["frame_bytes"] = max(stat["frame_bytes"], size)
+
+def timed(name=None):
+    """Decorator form of :func:`span`; DataFrames returned (alone or first in a tuple) are recorded."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                result = fn(*args, **kwargs)
+            frame = result[0] if isinstance(result, tuple) and result else result
+            if hasattr(frame, "memory_usage") and hasattr(frame, "shape"):
+                record_frame(label, frame)
+            return result
+        return wrapper
+    return decorate
+
+# ==============================
+# RENDERS + PROFILING
+# ==============================
+def _start_profiler(mode):
+    """Start a profiler for this thread; returns a function that stops it and returns a text report."""
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            mode = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+
+            def stop():
+                profiler.stop()
+                return profiler.output_text(unicode=True, color=False)
+            return stop
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        return out.getvalue()
+    return stop
+
+@contextmanager
+def render(page, profile=None, detail=False):
+    """Trace one page render. ``profile`` ("cprofile" or "pyinstrument") also profiles it."""
+    trace = Trace(page, detail=detail)
+    previous = current_trace()
+    _local.trace = trace
+    counters = _counters()
+    queries, rows, db_seconds = counters["queries"], counters["rows"], counters["db_seconds"]
+    stop = None
+    if profile:
+        try:
+            stop = _start_profiler(profile)
+        except ValueError as e:
+            # Python 3.12+ allows one profiler per process at a time.
+            trace.profile = f"Profiler unavailable: {e}"
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        if stop is not None:
+            trace.profile = stop()
+        trace.queries = counters["queries"] - queries
+        trace.rows = counters["rows"] - rows
+        trace.db_seconds = counters["db_seconds"] - db_seconds
+        _local.trace = previous
+        _observe(_renders, page, trace.seconds, trace.queries, trace.rows, trace.db_seconds)
+        with _lock:
+            _recent.append(trace)
+
+# ==============================
+# PROMETHEUS EXPORT
+# ==============================
+def register_gauge(name, fn, label="name", help_text=""):
+    """Export ``fn()`` as a gauge; a dict result becomes one sample per key (as ``label``)."""
+    _gauges[name] = (fn, label, help_text)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _histogram(lines, metric, label, table):
+    lines.append(f"# TYPE {metric}_seconds histogram")
+    for name, stat in sorted(table.items()):
+        key = f'{label}="{_escape(name)}"'
+        for bound, count in zip(BUCKETS, stat["buckets"]):
+            lines.append(f'{metric}_seconds_bucket{{{key},le="{bound}"}} {count}')
+        lines.append(f'{metric}_seconds_bucket{{{key},le="+Inf"}} {stat["calls"]}')
+        lines.append(f"{metric}_seconds_sum{{{key}}} {stat['seconds']:.6f}")
+        lines.append(f"{metric}_seconds_count{{{key}}} {stat['calls']}")
+    for field, suffix in (("queries", "db_queries_total"), ("rows", "db_rows_total"),
+                          ("db_seconds", "db_seconds_total")):
+        lines.append(f"# TYPE {metric}_{suffix} counter")
+        for name, stat in sorted(table.items()):
+            lines.append(f'{metric}_{suffix}{{{label}="{_escape(name)}"}} {stat[field]}')
+
+def prometheus_text():
+    """All aggregates and registered gauges in the Prometheus text exposition format."""
+    with _lock:
+        spans = {name: dict(stat, buckets=list(stat["buckets"])) for name, stat in _spans.items()}
+        renders = {page: dict(stat, buckets=list(stat["buckets"])) for page, stat in _renders.items()}
+    lines = []
+    _histogram(lines, "cqms_render", "page", renders)
+    _histogram(lines, "cqms_span", "span", spans)
+    lines.append("# TYPE cqms_span_frame_bytes gauge")
+    for name, stat in sorted(spans.items()):
+        if stat["frame_bytes"]:
+            lines.append(f'cqms_span_frame_bytes{{span="{_escape(name)}"}} {stat["frame_bytes"]}')
+    for name, (fn, label, help_text) in sorted(_gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue  # a broken gauge must not take the whole scrape down
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        samples = value.items() if isinstance(value, dict) else [(None, value)]
+        for key, sample in samples:
+            if isinstance(sample, bool) or not isinstance(sample, (int, float)):
+                continue
+            labels = f'{{{label}="{_escape(key)}"}}' if key is not None else ""
+            lines.append(f"{name}{labels} {sample}")
+    return "\n".join(lines) + "\n"
+
+def start_exporter(port, host="0.0.0.0"):
+    """Serve ``/metrics`` for a Prometheus scraper from a daemon thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
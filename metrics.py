@@ -0,0 +1,150 @@
+# metrics.py
+import argparse
+
+# ==============================
+# AGGREGATE TABLE + TRIGGERS
+# ==============================
+# ticket_metrics holds one row per counter: "total", "assigned" and "status:<status>".
+# Statement-level triggers with transition tables keep it current, so bulk updates and
+# COPY loads apply one aggregated delta per statement instead of one per row.
+
+def _deltas(rows, sign):
+    return f"""
+        SELECT 'total' AS metric, {sign} AS delta FROM {rows}
+        UNION ALL SELECT 'status:' || COALESCE(status, ''), {sign} FROM {rows}
+        UNION ALL SELECT 'assigned', {sign} FROM {rows} WHERE assigned_to IS NOT NULL
+    """
+
+def _apply(*parts):
+    # ORDER BY gives concurrent writers the same lock order on the counter rows.
+    return f"""
+        INSERT INTO ticket_metrics (metric, value)
+        SELECT metric, SUM(delta) FROM ({' UNION ALL '.join(parts)}) d
+        GROUP BY metric HAVING SUM(delta) <> 0
+        ORDER BY metric
+        ON CONFLICT (metric) DO UPDATE SET value = ticket_metrics.value + EXCLUDED.value;
+    """
+
+METRICS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS ticket_metrics (
+        metric VARCHAR(50) PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0
+    );
+
+    CREATE OR REPLACE FUNCTION ticket_metrics_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_apply(_deltas('new_rows', 1))}
+        ELSIF TG_OP = 'UPDATE' THEN
+            {_apply(_deltas('new_rows', 1), _deltas('old_rows', -1))}
+        ELSE
+            {_apply(_deltas('old_rows', -1))}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS ticket_metrics_ins ON queries;
+    DROP TRIGGER IF EXISTS ticket_metrics_upd ON queries;
+    DROP TRIGGER IF EXISTS ticket_metrics_del ON queries;
+    CREATE TRIGGER ticket_metrics_ins AFTER INSERT ON queries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticket_metrics_apply();
+    CREATE TRIGGER ticket_metrics_upd AFTER UPDATE ON queries
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticket_metrics_apply();
+    CREATE TRIGGER ticket_metrics_del AFTER DELETE ON queries
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ticket_metrics_apply();
+"""
+
+LIVE_METRICS_SQL = """
+    SELECT 'total', COUNT(*) FROM queries
+    UNION ALL SELECT 'assigned', COUNT(assigned_to) FROM queries
+    UNION ALL SELECT 'status:' || COALESCE(status, ''), COUNT(*) FROM queries GROUP BY status
+"""
+
+def install_metrics(conn):
+    cur = conn.cursor()
+    cur.execute(METRICS_DDL)
+    conn.commit()
+    cur.close()
+    rebuild_metrics(conn)
+
+# ==============================
+# READ
+# ==============================
+def get_ticket_metrics(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT metric, value FROM ticket_metrics")
+    raw = dict(cur.fetchall())
+    cur.close()
+    return {
+        "total": raw.get("total", 0),
+        "open": raw.get("status:Open", 0),
+        "closed": raw.get("status:Closed", 0),
+        "in_progress": raw.get("status:In Progress", 0),
+        "assigned": raw.get("assigned", 0),
+    }
+
+# ==============================
+# REBUILD / VERIFY
+# ==============================
+def rebuild_metrics(conn):
+    cur = conn.cursor()
+    try:
+        # SHARE mode blocks writers (and therefore the triggers) while we recount.
+        cur.execute("LOCK TABLE queries IN SHARE MODE")
+        cur.execute("DELETE FROM ticket_metrics")
+        cur.execute(f"INSERT INTO ticket_metrics (metric, value) {LIVE_METRICS_SQL}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def verify_metrics(conn):
+    """Return ``{metric: (stored, live)}`` for every counter that disagrees with the table."""
+    # SET TRANSACTION must be the first statement, so end whatever the connection had open.
+    conn.rollback()
+    cur = conn.cursor()
+    try:
+        # One snapshot for both reads, so a concurrent write can't show up as a mismatch.
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cur.execute("SELECT metric, value FROM ticket_metrics WHERE value <> 0")
+        stored = dict(cur.fetchall())
+        cur.execute(LIVE_METRICS_SQL)
+        live = {k: v for k, v in cur.fetchall() if v}
+    finally:
+        conn.rollback()
+        cur.close()
+    return {
+        m: (stored.get(m, 0), live.get(m, 0))
+        for m in set(stored) | set(live)
+        if stored.get(m, 0) != live.get(m, 0)
+    }
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Maintain the ticket_metrics aggregate table")
+    parser.add_argument("--install", action="store_true", help="create table/triggers and rebuild")
+    parser.add_argument("--rebuild", action="store_true", help="recompute counters from queries")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        if args.install:
+            install_metrics(conn)
+        elif args.rebuild:
+            rebuild_metrics(conn)
+        mismatches = verify_metrics(conn)
+
+    if mismatches:
+        for metric, (stored, live) in sorted(mismatches.items()):
+            print(f"❌ {metric}: stored={stored} live={live}")
+        raise SystemExit(1)
+    print("✅ ticket_metrics matches live data")
@@ -0,0 +1,298 @@
+# migrations.py
+import argparse
+import json
+
+import metrics
+import partitioning
+import sentiment
+import similarity
+import sla
+import tickets
+import timeline
+
+# ==============================
+# MIGRATIONS
+# ==============================
+# Append-only: never edit a migration that has shipped, add a new one instead.
+# Each entry is (version, name, sql-or-callable); callables receive the open connection.
+
+def _install_metrics(conn):
+    cur = conn.cursor()
+    cur.execute(metrics.METRICS_DDL)
+    cur.execute("DELETE FROM ticket_metrics")
+    cur.execute(f"INSERT INTO ticket_metrics (metric, value) {metrics.LIVE_METRICS_SQL}")
+    cur.close()
+
+MIGRATIONS = [
+    (1, "base tables", """
+        CREATE TABLE IF NOT EXISTS users (
+            username VARCHAR(100) PRIMARY KEY,
+            hashed_password TEXT NOT NULL,
+            role VARCHAR(20) NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS queries (
+            query_id SERIAL PRIMARY KEY,
+            source_query_id VARCHAR(50) UNIQUE,
+            username VARCHAR(100),
+            mail_id VARCHAR(255),
+            mobile_number VARCHAR(20),
+            query_heading TEXT,
+            query_description TEXT,
+            priority VARCHAR(10),
+            status VARCHAR(20),
+            assigned_to VARCHAR(100),
+            sla_hours INT,
+            query_created_time TIMESTAMP,
+            query_closed_time TIMESTAMP
+        );
+        -- Databases created by the old init_db predate the CSV key.
+        ALTER TABLE queries ADD COLUMN IF NOT EXISTS source_query_id VARCHAR(50) UNIQUE;
+
+        CREATE TABLE IF NOT EXISTS ticket_comments (
+            id SERIAL PRIMARY KEY,
+            query_id INT REFERENCES queries(query_id),
+            commented_by VARCHAR(100),
+            comment TEXT,
+            sentiment VARCHAR(20),
+            commented_at TIMESTAMP
+        );
+    """),
+    (2, "support tables", """
+        CREATE TABLE IF NOT EXISTS support_chat (
+            id SERIAL PRIMARY KEY,
+            sender VARCHAR(100) NOT NULL,
+            receiver VARCHAR(100) NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS support_doubts (
+            id SERIAL PRIMARY KEY,
+            user_name VARCHAR(100) NOT NULL,
+            doubt TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS support_availability (
+            username VARCHAR(100) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """),
+    (3, "ticket metrics aggregates", _install_metrics),
+    (4, "hot path indexes", """
+        -- Paged ticket grids: ORDER BY query_created_time DESC NULLS LAST, query_id DESC
+        CREATE INDEX IF NOT EXISTS idx_queries_created
+            ON queries (query_created_time DESC NULLS LAST, query_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_queries_username_created
+            ON queries (username, query_created_time DESC NULLS LAST, query_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_queries_assignee_created
+            ON queries (assigned_to, query_created_time DESC NULLS LAST, query_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_queries_assignee_status ON queries (assigned_to, status);
+        CREATE INDEX IF NOT EXISTS idx_queries_status_created
+            ON queries (status, query_created_time DESC NULLS LAST, query_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_queries_priority_created
+            ON queries (priority, query_created_time DESC NULLS LAST, query_id DESC);
+        -- Open work (and the overdue scan) only ever looks at unclosed tickets
+        CREATE INDEX IF NOT EXISTS idx_queries_open_created
+            ON queries (query_created_time) WHERE status <> 'Closed';
+
+        CREATE INDEX IF NOT EXISTS idx_users_role_username ON users (role, username);
+        CREATE INDEX IF NOT EXISTS idx_ticket_comments_query
+            ON ticket_comments (query_id, commented_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_support_chat_created ON support_chat (created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_support_chat_receiver_created
+            ON support_chat (receiver, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_support_doubts_created ON support_doubts (created_at DESC);
+    """),
+    (5, "feed cursor indexes", """
+        -- Per-user feeds walk the id watermark inside one participant's rows
+        CREATE INDEX IF NOT EXISTS idx_support_chat_sender_id ON support_chat (sender, id);
+        CREATE INDEX IF NOT EXISTS idx_support_chat_receiver_id ON support_chat (receiver, id);
+        CREATE INDEX IF NOT EXISTS idx_support_doubts_user_id ON support_doubts (user_name, id);
+    """),
+    (6, "queries.updated_at watermark", """
+        ALTER TABLE queries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+
+        CREATE OR REPLACE FUNCTION queries_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS queries_touch_updated_at ON queries;
+        CREATE TRIGGER queries_touch_updated_at BEFORE UPDATE ON queries
+            FOR EACH ROW EXECUTE FUNCTION queries_touch_updated_at();
+
+        CREATE INDEX IF NOT EXISTS idx_queries_updated_at ON queries (updated_at);
+    """),
+    (7, "sla deadlines", sla.install_sla),
+    (8, "ticket full-text search", """
+        -- Stored so neither search nor ranking re-parses the text; rewrites queries once.
+        ALTER TABLE queries ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', COALESCE(query_heading, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(query_description, '')), 'B')
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_queries_search ON queries USING GIN (search_vector);
+    """),
+    (9, "duplicate ticket links", similarity.LINKS_DDL),
+    (10, "ticket history", timeline.HISTORY_DDL),
+    (11, "sentiment scores and triage rank", sentiment.SENTIMENT_DDL),
+    (12, "partitioned queries and archive", partitioning.install_partitioning),
+    (13, "unique ticket ids on partitioned queries", partitioning.install_integrity),
+]
+
+# ==============================
+# RUNNER
+# ==============================
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """)
+    conn.commit()
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {r[0] for r in cur.fetchall()}
+    cur.close()
+    return versions
+
+def migrate(conn, target=None):
+    """Apply pending migrations in order, each in its own transaction. Returns applied versions."""
+    applied_versions(conn)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        cur = conn.cursor()
+        try:
+            # Serialise concurrent app starts; re-check once we hold the lock.
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('cqms_migrations'))")
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+            if cur.fetchone() is None:
+                if callable(step):
+                    step(conn)
+                else:
+                    cur.execute(step)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return applied
+
+# ==============================
+# INDEX USAGE CHECK
+# ==============================
+def dashboard_queries():
+    """Representative (name, sql, params) for every dashboard read path."""
+    after = ("2025-01-01 00:00:00", 1)
+    checks = [
+        ("client page", *tickets.page_sql(username="client")),
+        ("client next page", *tickets.page_sql(username="client", after=after)),
+        ("client ticket", "SELECT query_id FROM queries WHERE query_id = %s AND username = %s", [1, "client"]),
+        ("client visible ids", "SELECT query_id FROM queries WHERE query_id = ANY(%s) AND username = %s",
+         [[1, 2], "client"]),
+        ("support assigned page", *tickets.page_sql(assigned_to="support")),
+        ("support status page", *tickets.page_sql(status="Open")),
+        ("admin all page", *tickets.page_sql()),
+        ("admin all next page", *tickets.page_sql(after=after)),
+        ("admin priority page", *tickets.page_sql(priority="High")),
+        ("assigned count", "SELECT COUNT(*) FROM queries WHERE assigned_to = %s", ["support"]),
+        ("assigned open count", "SELECT COUNT(*) FROM queries WHERE assigned_to = %s AND status = %s",
+         ["support", "Open"]),
+        ("sla counts", "SELECT COUNT(*) FROM queries WHERE status <> 'Closed' AND due_at < now()", []),
+        ("sla due list", "SELECT query_id FROM queries WHERE status <> 'Closed' "
+                         "AND due_at < now() + make_interval(hours => %s) ORDER BY due_at LIMIT 50", [4]),
+        ("sla breached count", "SELECT COUNT(*) FROM queries WHERE sla_breached_at IS NOT NULL", []),
+        ("sla sweep", "SELECT query_id FROM queries WHERE status <> 'Closed' "
+                      "AND sla_breached_at IS NULL AND due_at < now() ORDER BY due_at LIMIT 1000", []),
+        ("authenticate", "SELECT hashed_password FROM users WHERE username=%s AND role=%s",
+         ["u", "Client"]),
+        ("support users", "SELECT username FROM users WHERE role='Support' ORDER BY username", []),
+        ("chat feed", "SELECT * FROM support_chat WHERE id > %s ORDER BY id ASC LIMIT 100", [0]),
+        ("chat feed for user", "SELECT * FROM support_chat WHERE (sender = %s OR receiver = %s) "
+                               "AND id > %s ORDER BY id ASC LIMIT 100", ["support", "support", 0]),
+        ("doubts history", "SELECT * FROM support_doubts WHERE id < %s ORDER BY id DESC LIMIT 100", [100]),
+        ("ticket search", "SELECT query_id FROM queries, to_tsquery('english', %s) q "
+                          "WHERE search_vector @@ q AND status = %s", ["login:*", "Open"]),
+        ("triage queue", f"SELECT query_id FROM queries WHERE status <> 'Closed' "
+                         f"ORDER BY {sentiment.TRIAGE_RANK_SQL} DESC, due_at LIMIT 20", []),
+        ("unscored tickets", "SELECT query_id FROM queries WHERE sentiment_score IS NULL "
+                             "AND query_id > %s ORDER BY query_id LIMIT 5000", [0]),
+        ("archive candidates", "SELECT query_id FROM queries WHERE NOT archived AND status = 'Closed' "
+                               "AND COALESCE(query_closed_time, query_created_time) < now() - make_interval(days => %s) "
+                               "LIMIT %s", [partitioning.ARCHIVE_AFTER_DAYS, partitioning.ARCHIVE_BATCH]),
+        ("ticket store refresh", "SELECT query_id, status FROM queries WHERE updated_at >= %s",
+         ["2025-01-01 00:00:00"]),
+        ("ticket timeline comments", "SELECT * FROM ticket_comments WHERE query_id = %s "
+                                     "ORDER BY commented_at DESC, id DESC LIMIT 51", [1]),
+        ("ticket timeline changes", "SELECT * FROM ticket_history WHERE query_id = %s "
+                                    "ORDER BY changed_at DESC, id DESC LIMIT 51", [1]),
+    ]
+    return checks
+
+def _seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+def check_index_usage(conn, queries=None):
+    """EXPLAIN every dashboard query with seq scans disabled; return {name: [tables seq-scanned]}.
+
+    With enable_seqscan off the planner still falls back to a Seq Scan when no index
+    can serve the query, so any Seq Scan left in the plan is a missing index.
+    """
+    problems = {}
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, sql, params in queries or dashboard_queries():
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _seq_scans(plan[0]["Plan"])
+            if scans:
+                problems[name] = scans
+    finally:
+        conn.rollback()
+        cur.close()
+    return problems
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Apply CQMS schema migrations")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--check", action="store_true", help="verify dashboard queries use indexes")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        applied = migrate(conn, args.target)
+        print(f"✅ Applied migrations: {applied}" if applied else "✅ Schema is up to date")
+        if args.check:
+            problems = check_index_usage(conn)
+            for name, tables in problems.items():
+                print(f"❌ {name}: sequential scan on {', '.join(tables)}")
+            if problems:
+                raise SystemExit(1)
+            print("✅ Every dashboard query uses an index")
@@ -0,0 +1,149 @@
+# notify.py
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "cqms_events"
+TOPICS = ("tickets", "chat", "doubts", "availability")
+
+# Identifies events this process published itself (already applied locally).
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+# ==============================
+# PUBLISH
+# ==============================
+def publish(cur, topic, **data):
+    """Queue a change notification on the writer's transaction; delivered only on commit."""
+    payload = json.dumps({"topic": topic, "origin": ORIGIN, **data}, default=str)
+    # NOTIFY payloads are capped at 8000 bytes; drop details and let listeners refresh the topic.
+    if len(payload) > 7900:
+        payload = json.dumps({"topic": topic, "origin": ORIGIN})
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+# ==============================
+# LISTEN
+# ==============================
+class EventHub:
+    """Background asyncio LISTEN loop that fans database change events out to subscribers.
+
+    Runs on one dedicated (non-pooled) connection in a daemon thread. Subscribers are
+    plain callables taking the decoded event dict; ``version(topic)`` lets sessions
+    detect changes with an in-memory comparison instead of querying the database.
+    """
+
+    def __init__(self, conn_kwargs, channel=CHANNEL, reconnect_delay=5.0):
+        self._conn_kwargs = conn_kwargs
+        self._channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._lock = threading.Lock()
+        self._versions = defaultdict(int)
+        self._subscribers = []
+        self._thread = None
+        self._loop = None
+        self._stop = None
+        self.connected = False
+        self.events_received = 0
+
+    # ---------- subscribers ----------
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def version(self, *topics):
+        with self._lock:
+            return tuple(self._versions[t] for t in topics)
+
+    def bump(self, topic):
+        # Local writes bump immediately so the writer's own session refreshes without a round trip.
+        with self._lock:
+            self._versions[topic] += 1
+
+    def _dispatch(self, event):
+        topic = event.get("topic")
+        with self._lock:
+            self.events_received += 1
+            self._versions[topic] += 1
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                log.exception("Event subscriber failed for %s", topic)
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_thread, name="cqms-listener", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run_thread(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._listen_forever())
+        finally:
+            self._loop.close()
+
+    async def _listen_forever(self):
+        self._stop = asyncio.Event()
+        while not self._stop.is_set():
+            try:
+                await self._listen_once()
+            except psycopg2.Error:
+                log.warning("LISTEN connection lost; reconnecting in %ss", self._reconnect_delay)
+                self.connected = False
+                # Anything could have changed while we were disconnected.
+                for topic in TOPICS:
+                    self._dispatch({"topic": topic, "origin": None})
+            self.connected = False
+            try:
+                await asyncio.wait_for(self._stop.wait(), self._reconnect_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _listen_once(self):
+        conn = psycopg2.connect(**self._conn_kwargs)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self._channel}")
+            self.connected = True
+            loop.add_reader(conn.fileno(), readable.set)
+            stop_task = asyncio.ensure_future(self._stop.wait())
+            try:
+                while not self._stop.is_set():
+                    read_task = asyncio.ensure_future(readable.wait())
+                    await asyncio.wait({read_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+                    read_task.cancel()
+                    readable.clear()
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(note.payload)
+                        except ValueError:
+                            event = {"topic": note.payload}
+                        self._dispatch(event)
+            finally:
+                stop_task.cancel()
+                loop.remove_reader(conn.fileno())
+        finally:
+            conn.close()
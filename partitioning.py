@@ -0,0 +1,681 @@
+# partitioning.py
+import argparse
+import glob
+import os
+import re
+import time
+from datetime import date
+
+import access
+import export
+import notify
+import sla
+
+# ==============================
+# LAYOUT
+# ==============================
+# queries is LIST-partitioned on ``archived`` and each half RANGE-partitioned on
+# query_created_time:
+#
+#   queries
+#     queries_live      archived = false   monthly   queries_live_p2025_02 ... + queries_live_default
+#     queries_archive   archived = true    yearly    queries_archive_p2024 ... + queries_archive_default
+#
+# Dashboard reads carry ``NOT archived`` (tickets._where), so the planner prunes the
+# archive away; analytics reads (ticket_store, admin analytics, export --include-archived)
+# still see every row. The archival job sets ``archived`` on old Closed tickets and
+# PostgreSQL moves each one into the archive partition for its year. Rows outside every
+# range (NULL created time, months not created yet) land in the default partitions.
+LIVE = "queries_live"
+ARCHIVE = "queries_archive"
+SHADOW = "queries_part"
+LEGACY = "queries_legacy"
+
+MONTHS_AHEAD = 3
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH = 5_000
+BACKFILL_BATCH = 20_000
+# Tables up to this size are converted at startup (init_db); larger ones with --convert.
+AUTO_CONVERT_MAX_ROWS = 200_000
+# Row-level BEFORE triggers on partitioned tables, which the id check below needs.
+MIN_SERVER_VERSION = 130000
+
+PREPARE_DDL = """
+    ALTER TABLE queries ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT false;
+"""
+
+# A partitioned table cannot carry the old foreign keys into queries, so the children
+# check their ticket ids with a trigger, and deleting a ticket still cascades to its
+# links and history (and is refused while it has comments, as before). A row that
+# moves between partitions is deleted and re-inserted; that must not cascade.
+INTEGRITY_DDL = """
+    CREATE OR REPLACE FUNCTION queries_ref_check() RETURNS trigger AS $$
+    DECLARE
+        col TEXT;
+        ref INT;
+    BEGIN
+        FOREACH col IN ARRAY TG_ARGV LOOP
+            EXECUTE format('SELECT ($1).%I', col) INTO ref USING NEW;
+            CONTINUE WHEN ref IS NULL;
+            PERFORM 1 FROM queries WHERE query_id = ref FOR KEY SHARE;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION USING ERRCODE = 'foreign_key_violation',
+                    MESSAGE = format('%s.%s = %s is not a ticket', TG_TABLE_NAME, col, ref);
+            END IF;
+        END LOOP;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION queries_delete_dependents() RETURNS trigger AS $$
+    BEGIN
+        IF current_setting('cqms.partition_move', true) = 'on'
+           OR EXISTS (SELECT 1 FROM queries WHERE query_id = OLD.query_id) THEN
+            RETURN NULL;
+        END IF;
+        IF EXISTS (SELECT 1 FROM ticket_comments WHERE query_id = OLD.query_id) THEN
+            RAISE EXCEPTION USING ERRCODE = 'foreign_key_violation',
+                MESSAGE = format('ticket %s still has comments', OLD.query_id);
+        END IF;
+        DELETE FROM ticket_links WHERE query_id = OLD.query_id OR duplicate_of = OLD.query_id;
+        DELETE FROM ticket_history WHERE query_id = OLD.query_id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS queries_delete_dependents ON queries;
+    CREATE TRIGGER queries_delete_dependents AFTER DELETE ON queries
+        FOR EACH ROW EXECUTE FUNCTION queries_delete_dependents();
+
+    DROP TRIGGER IF EXISTS ticket_comments_query_ref ON ticket_comments;
+    CREATE TRIGGER ticket_comments_query_ref BEFORE INSERT OR UPDATE OF query_id ON ticket_comments
+        FOR EACH ROW EXECUTE FUNCTION queries_ref_check('query_id');
+    DROP TRIGGER IF EXISTS ticket_history_query_ref ON ticket_history;
+    CREATE TRIGGER ticket_history_query_ref BEFORE INSERT ON ticket_history
+        FOR EACH ROW EXECUTE FUNCTION queries_ref_check('query_id');
+    DROP TRIGGER IF EXISTS ticket_links_query_ref ON ticket_links;
+    CREATE TRIGGER ticket_links_query_ref BEFORE INSERT OR UPDATE ON ticket_links
+        FOR EACH ROW EXECUTE FUNCTION queries_ref_check('query_id', 'duplicate_of');
+"""
+
+# Nor can it keep query_id unique: a unique index would have to include the partition
+# keys. Instead every id is also kept in query_ids, a plain table whose primary key
+# refuses a duplicate. Its triggers are statement-level with transition tables, so a
+# bulk load costs one extra INSERT ... SELECT and no per-row locks, and they do not
+# fire when an UPDATE moves rows between partitions. Installed on the shadow table
+# before the backfill, so the registry fills up as rows are copied.
+QUERY_IDS_FN_DDL = """
+    CREATE TABLE IF NOT EXISTS query_ids (query_id INT PRIMARY KEY);
+
+    CREATE OR REPLACE FUNCTION query_ids_add() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO query_ids SELECT query_id FROM new_rows WHERE query_id IS NOT NULL;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION query_ids_remove() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM query_ids i USING old_rows o WHERE i.query_id = o.query_id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION query_ids_renumber() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.query_id IS DISTINCT FROM OLD.query_id THEN
+            DELETE FROM query_ids WHERE query_id = OLD.query_id;
+            INSERT INTO query_ids VALUES (NEW.query_id);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+def _query_ids_ddl(table):
+    return f"""
+        DROP TRIGGER IF EXISTS queries_ids_add ON {table};
+        CREATE TRIGGER queries_ids_add AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION query_ids_add();
+        DROP TRIGGER IF EXISTS queries_ids_remove ON {table};
+        CREATE TRIGGER queries_ids_remove AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION query_ids_remove();
+        DROP TRIGGER IF EXISTS queries_ids_renumber ON {table};
+        CREATE TRIGGER queries_ids_renumber BEFORE UPDATE OF query_id ON {table}
+            FOR EACH ROW EXECUTE FUNCTION query_ids_renumber();
+    """
+
+# ==============================
+# PARTITIONS
+# ==============================
+def _month(day):
+    return date(day.year, day.month, 1)
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def _bounds(parent, day):
+    """``(name, lo, hi)`` of the partition of ``parent`` that holds ``day``."""
+    if parent == LIVE:
+        lo = _month(day)
+        return f"{LIVE}_p{lo:%Y_%m}", lo, _add_months(lo, 1)
+    lo = date(day.year, 1, 1)
+    return f"{ARCHIVE}_p{lo:%Y}", lo, date(day.year + 1, 1, 1)
+
+def _ident(name, suffix):
+    # PostgreSQL truncates identifiers at 63 bytes.
+    return name[:63 - len(suffix)] + suffix
+
+def server_supported(cur):
+    cur.execute("SELECT current_setting('server_version_num')::int")
+    return cur.fetchone()[0] >= MIN_SERVER_VERSION
+
+def is_partitioned(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('queries')")
+    row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+def _partitions(cur, parent):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (parent,))
+    return {r[0] for r in cur.fetchall()}
+
+def _columns(cur, table="queries"):
+    """Stored (non-generated) columns, in table order."""
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, (table,))
+    return [r[0] for r in cur.fetchall()]
+
+def _add_partition(cur, parent, day):
+    """Create the partition of ``parent`` holding ``day`` unless it exists; returns its name or None."""
+    name, lo, hi = _bounds(parent, day)
+    if name in _partitions(cur, parent):
+        return None
+    default = f"{parent}_default"
+    bounds = f"FOR VALUES FROM ('{lo}') TO ('{hi}')"
+    cur.execute(f"SELECT 1 FROM {default} WHERE query_created_time >= %s AND query_created_time < %s LIMIT 1",
+                (lo, hi))
+    if cur.fetchone() is None:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF {parent} {bounds}")
+        return name
+    # The default partition already holds rows for this range, which would make
+    # CREATE ... PARTITION OF fail: move them into a plain table and attach that.
+    columns = ", ".join(_columns(cur))
+    cur.execute("SELECT set_config('cqms.partition_move', 'on', true)")
+    cur.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING GENERATED)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {default} WHERE query_created_time >= %s AND query_created_time < %s
+            RETURNING {columns}
+        )
+        INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+    """, (lo, hi))
+    cur.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} {bounds}")
+    cur.execute("SELECT set_config('cqms.partition_move', 'off', true)")
+    return name
+
+def _default_archive_years(cur):
+    # Tickets loaded or archived for a year that had no partition yet wait in the default.
+    cur.execute(f"""SELECT DISTINCT EXTRACT(YEAR FROM query_created_time)::int FROM {ARCHIVE}_default
+                    WHERE query_created_time IS NOT NULL""")
+    return sorted(r[0] for r in cur.fetchall())
+
+def ensure_partitions(conn, months_ahead=MONTHS_AHEAD, today=None):
+    """Create this and the next ``months_ahead`` live months and this year's archive; returns names created.
+
+    Any year with rows waiting in the archive default gets its archive partition too.
+    """
+    created = []
+    cur = conn.cursor()
+    try:
+        if not is_partitioned(cur):
+            conn.rollback()
+            return created
+        # Creating a partition briefly locks the parent; give up rather than queue readers behind us.
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        today = today or date.today()
+        for months in range(months_ahead + 1):
+            created.append(_add_partition(cur, LIVE, _add_months(_month(today), months)))
+        created.append(_add_partition(cur, ARCHIVE, today))
+        for year in _default_archive_years(cur):
+            created.append(_add_partition(cur, ARCHIVE, date(year, 1, 1)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return [name for name in created if name]
+
+def partition_stats(conn):
+    """Estimated rows and on-disk size of every leaf partition, live first."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT parent.relname, c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE i.inhparent IN (to_regclass(%s), to_regclass(%s))
+        ORDER BY parent.relname DESC, c.relname
+    """, (LIVE, ARCHIVE))
+    rows = [{"tier": parent.replace("queries_", ""), "partition": name, "rows": rows, "bytes": size}
+            for parent, name, rows, size in cur.fetchall()]
+    cur.close()
+    conn.rollback()
+    return rows
+
+# ==============================
+# ONLINE CONVERSION
+# ==============================
+# 1. prepare: build the partitioned shadow table with every index of queries, and a
+#    trigger that mirrors each write on queries into it.
+# 2. backfill: copy existing rows across in short batches (re-runnable).
+# 3. swap: one short transaction renames the tables, moves triggers over and swaps the
+#    foreign keys for INTEGRITY_DDL. The old table stays as queries_legacy until
+#    --drop-legacy, and no longer receives writes.
+def _sync_ddl(columns):
+    values = ", ".join(f"NEW.{c}" for c in columns)
+    return f"""
+        CREATE OR REPLACE FUNCTION queries_sync_part() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM {SHADOW} WHERE query_id = OLD.query_id;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO {SHADOW} ({', '.join(columns)}) VALUES ({values});
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS queries_sync_part ON queries;
+        CREATE TRIGGER queries_sync_part AFTER INSERT OR UPDATE OR DELETE ON queries
+            FOR EACH ROW EXECUTE FUNCTION queries_sync_part();
+    """
+
+def prepare(cur, months_ahead=MONTHS_AHEAD, today=None):
+    """Create the shadow table, its partitions, indexes and the sync trigger; no-op if it exists."""
+    cur.execute("SELECT to_regclass(%s)", (SHADOW,))
+    if cur.fetchone()[0] is not None:
+        return False
+    cur.execute(f"""CREATE TABLE {SHADOW} (LIKE queries INCLUDING DEFAULTS INCLUDING GENERATED
+                    INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY LIST (archived)""")
+    for parent, flag in ((LIVE, "false"), (ARCHIVE, "true")):
+        cur.execute(f"""CREATE TABLE {parent} PARTITION OF {SHADOW} FOR VALUES IN ({flag})
+                        PARTITION BY RANGE (query_created_time)""")
+        cur.execute(f"CREATE TABLE {parent}_default PARTITION OF {parent} DEFAULT")
+
+    # Live months start where archiving leaves off; older open tickets sit in the default.
+    today = today or date.today()
+    cur.execute("SELECT MIN(query_created_time) FROM queries")
+    first = cur.fetchone()[0]
+    first = first.date() if first else today
+    month = max(_month(first), _add_months(_month(today), -(ARCHIVE_AFTER_DAYS // 30 + 1)))
+    while month <= _add_months(_month(today), months_ahead):
+        _add_partition(cur, LIVE, month)
+        month = _add_months(month, 1)
+    for year in range(first.year, today.year + 1):
+        _add_partition(cur, ARCHIVE, date(year, 1, 1))
+
+    # Same indexes as queries, plus the archival job's candidate index. Unique ones lose
+    # UNIQUE (it would have to include the partition keys; queries_unique_id stands in)
+    # and their name, so e.g. no plain index ends up called queries_pkey.
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() AND tablename = 'queries'")
+    for name, definition in cur.fetchall():
+        unique = definition.startswith("CREATE UNIQUE ")
+        copy = _ident(name, "_nonunique" if unique else "_p")
+        cur.execute(re.sub(r"^CREATE (UNIQUE )?INDEX \S+ ON \S+ ",
+                           f"CREATE INDEX {copy} ON {SHADOW} ", definition))
+    cur.execute(f"""CREATE INDEX IF NOT EXISTS idx_queries_archivable
+                    ON {SHADOW} ((COALESCE(query_closed_time, query_created_time)))
+                    WHERE status = 'Closed' AND NOT archived""")
+    cur.execute(QUERY_IDS_FN_DDL)
+    cur.execute("TRUNCATE query_ids")  # left over from an abandoned conversion
+    cur.execute(_query_ids_ddl(SHADOW))
+    cur.execute(_sync_ddl(_columns(cur)))
+    return True
+
+def backfill(conn, cur, batch=BACKFILL_BATCH, commit=True, progress=None):
+    """Copy rows missing from the shadow table in query_id batches; returns rows copied."""
+    columns = ", ".join(_columns(cur))
+    cur.execute("SELECT COALESCE(MAX(query_id), 0) FROM queries")
+    top = cur.fetchone()[0]
+    copied = lo = 0
+    while lo < top:
+        hi = lo + batch
+        # Hold the batch still while it is copied; writes after this go through the sync trigger.
+        cur.execute("SELECT COUNT(*) FROM (SELECT 1 FROM queries WHERE query_id > %s AND query_id <= %s "
+                    "FOR SHARE) s", (lo, hi))
+        cur.execute(f"""
+            INSERT INTO {SHADOW} ({columns})
+            SELECT {columns} FROM queries q
+            WHERE q.query_id > %s AND q.query_id <= %s
+              AND NOT EXISTS (SELECT 1 FROM {SHADOW} p WHERE p.query_id = q.query_id)
+        """, (lo, hi))
+        copied += cur.rowcount
+        if commit:
+            conn.commit()
+        lo = hi
+        if progress:
+            progress(min(hi, top), top, copied)
+    return copied
+
+def swap(cur):
+    """Put the shadow table in place of queries; runs in the caller's transaction."""
+    cur.execute(f"SELECT (SELECT COUNT(*) FROM queries), (SELECT COUNT(*) FROM {SHADOW})")
+    legacy_rows, shadow_rows = cur.fetchone()
+    if legacy_rows != shadow_rows:
+        raise RuntimeError(f"{SHADOW} has {shadow_rows:,} rows but queries has {legacy_rows:,}; "
+                           "re-run the backfill")
+
+    cur.execute("SET LOCAL lock_timeout = '10s'")
+    cur.execute(f"LOCK TABLE queries, {SHADOW} IN ACCESS EXCLUSIVE MODE")
+    cur.execute("""SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+                   WHERE tgrelid = 'queries'::regclass AND NOT tgisinternal AND tgname <> 'queries_sync_part'""")
+    triggers = cur.fetchall()
+    cur.execute("""SELECT conrelid::regclass::text, conname FROM pg_constraint
+                   WHERE confrelid = 'queries'::regclass AND contype = 'f'""")
+    foreign_keys = cur.fetchall()
+    cur.execute("SELECT relrowsecurity FROM pg_class WHERE oid = 'queries'::regclass")
+    rls = cur.fetchone()[0]
+    cur.execute("SELECT pg_get_serial_sequence('queries', 'query_id')")
+    sequence = cur.fetchone()[0]
+
+    cur.execute("DROP TRIGGER queries_sync_part ON queries")
+    cur.execute("DROP FUNCTION queries_sync_part()")
+    for table, constraint in foreign_keys:
+        cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+    for name, _ in triggers:
+        cur.execute(f"DROP TRIGGER {name} ON queries")
+
+    cur.execute(f"ALTER TABLE queries RENAME TO {LEGACY}")
+    cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                (LEGACY,))
+    for (name,) in cur.fetchall():
+        cur.execute(f"ALTER INDEX {name} RENAME TO {_ident(name, '_legacy')}")
+        cur.execute(f"ALTER INDEX IF EXISTS {_ident(name, '_p')} RENAME TO {name}")
+    cur.execute(f"ALTER TABLE {SHADOW} RENAME TO queries")
+    if sequence:
+        cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY queries.query_id")
+
+    for _, definition in triggers:
+        cur.execute(definition)  # "ON public.queries" now names the partitioned table
+    cur.execute(INTEGRITY_DDL)
+    if rls:
+        cur.execute(access.RLS_DDL)
+
+def convert(conn, batch=BACKFILL_BATCH, progress=None):
+    """Convert queries to the partitioned layout online; returns False if it already is.
+
+    Prepare and every backfill batch commit on their own, so the app keeps reading and
+    writing throughout; only the final swap takes a short exclusive lock. Safe to re-run
+    after an interruption. Needs PostgreSQL 13+.
+    """
+    cur = conn.cursor()
+    try:
+        if not server_supported(cur):
+            raise RuntimeError("Partitioning queries needs PostgreSQL 13 or newer")
+        # Two app processes starting at once must not both build the shadow table.
+        cur.execute("SELECT pg_advisory_lock(hashtext('cqms_partitioning'))")
+        try:
+            if is_partitioned(cur):
+                conn.rollback()
+                return False
+            prepare(cur)
+            conn.commit()
+            backfill(conn, cur, batch, progress=progress)
+            swap(cur)
+            conn.commit()
+            cur.execute("ANALYZE queries")
+            conn.commit()
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(hashtext('cqms_partitioning'))")
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return True
+
+def drop_legacy(conn):
+    cur = conn.cursor()
+    try:
+        if not is_partitioned(cur):
+            raise RuntimeError("queries is not partitioned yet; the old table is still live")
+        cur.execute(f"DROP TABLE IF EXISTS {LEGACY}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def install_partitioning(conn):
+    """Migration 12: the ``archived`` flag and a row-move-safe SLA trigger.
+
+    The conversion itself runs outside the migration transaction, batch by batch:
+    convert_small() at startup, or ``python partitioning.py --convert``.
+    """
+    cur = conn.cursor()
+    cur.execute(PREPARE_DDL)
+    cur.execute(sla.SET_DUE_AT_FN)
+    cur.close()
+
+def install_integrity(conn):
+    """Migration 13: the query_ids registry (unique ticket ids) on an already partitioned table."""
+    cur = conn.cursor()
+    partitioned = is_partitioned(cur)
+    cur.execute("SELECT to_regclass('query_ids')")
+    if partitioned and cur.fetchone()[0] is None:
+        cur.execute(QUERY_IDS_FN_DDL)
+        cur.execute("INSERT INTO query_ids SELECT DISTINCT query_id FROM queries WHERE query_id IS NOT NULL")
+        cur.execute(_query_ids_ddl("queries"))
+    cur.close()
+
+def convert_small(conn, max_rows=AUTO_CONVERT_MAX_ROWS):
+    """Partition queries at startup if the server supports it and the table is small; returns True if converted."""
+    cur = conn.cursor()
+    try:
+        if is_partitioned(cur):
+            return False
+        if not server_supported(cur):
+            print("ℹ️ PostgreSQL 13+ is needed to partition queries; keeping the plain table")
+            return False
+        cur.execute("SELECT COUNT(*) FROM (SELECT 1 FROM queries LIMIT %s) s", (max_rows + 1,))
+        small = cur.fetchone()[0] <= max_rows
+    finally:
+        cur.close()
+        conn.rollback()
+    if not small:
+        print(f"ℹ️ queries has more than {max_rows:,} rows; partition it online with: "
+              "python partitioning.py --convert")
+        return False
+    if convert(conn):
+        # Nothing worth keeping a fallback copy of at this size.
+        drop_legacy(conn)
+        return True
+    return False
+
+# ==============================
+# ARCHIVAL
+# ==============================
+ARCHIVE_SQL = """
+    WITH picked AS (
+        SELECT query_id FROM queries
+        WHERE NOT archived AND status = 'Closed'
+          AND COALESCE(query_closed_time, query_created_time) < now() - make_interval(days => %s)
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE queries q SET archived = true
+    FROM picked
+    WHERE q.query_id = picked.query_id AND NOT q.archived
+"""
+
+def archive_closed(conn, older_than_days=ARCHIVE_AFTER_DAYS, batch=ARCHIVE_BATCH):
+    """Archive Closed tickets closed more than ``older_than_days`` ago, one short transaction per batch.
+
+    Each row moves to the archive partition for its year. Rows locked by someone else
+    are skipped and picked up next run. Returns the number of tickets archived.
+    """
+    archived = 0
+    cur = conn.cursor()
+    try:
+        while True:
+            cur.execute(ARCHIVE_SQL, (older_than_days, batch))
+            moved = cur.rowcount
+            if moved:
+                notify.publish(cur, "tickets", count=moved)
+            conn.commit()
+            archived += moved
+            if moved < batch:
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return archived
+
+# ==============================
+# COLD STORAGE
+# ==============================
+# Whole archive years can leave the database as files: tickets, comments, history and
+# duplicate links for the year are written first, and the rows are deleted only once
+# all four are on disk. read_cold_storage() brings them back for analytics.
+COLD_KINDS = ["tickets", "comments", "history", "links"]
+
+def _cold_sql(partition, columns):
+    ids = f"SELECT query_id FROM {partition}"
+    return {
+        "tickets": f"SELECT {', '.join(columns)} FROM {partition} ORDER BY query_id",
+        "comments": f"SELECT * FROM ticket_comments WHERE query_id IN ({ids}) ORDER BY id",
+        "history": f"SELECT * FROM ticket_history WHERE query_id IN ({ids}) ORDER BY id",
+        # Either end may be in the year; deleting the ticket drops the link both ways.
+        "links": f"SELECT * FROM ticket_links WHERE query_id IN ({ids}) OR duplicate_of IN ({ids}) "
+                 "ORDER BY query_id",
+    }
+
+def move_to_cold_storage(conn, directory, before_year, fmt="parquet"):
+    """Move archive years before ``before_year`` out to ``directory``; returns ``{year: tickets}``."""
+    os.makedirs(directory, exist_ok=True)
+    # Years only present in the archive default get their own partition first; the
+    # default itself is never moved out.
+    ensure_partitions(conn)
+    cur = conn.cursor()
+    partitions = _partitions(cur, ARCHIVE)
+    columns = _columns(cur)
+    cur.close()
+    conn.rollback()
+    years = sorted(int(name.rsplit("_p", 1)[1]) for name in partitions if name != f"{ARCHIVE}_default")
+
+    moved = {}
+    for year in [y for y in years if y < before_year]:
+        partition = f"{ARCHIVE}_p{year}"
+        queries = _cold_sql(partition, columns)
+        written = {}
+        for kind in COLD_KINDS:
+            path = os.path.join(directory, f"{kind}_{year}{export.FORMATS[fmt][0]}")
+            with open(path + ".tmp", "wb") as out:
+                written[kind] = export.export_query(conn, out, fmt, queries[kind])["rows"]
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(path + ".tmp", path)
+
+        cur = conn.cursor()
+        try:
+            # Writes to the year are held off from here; anything that slipped in since
+            # the files were written means they are stale, so stop and let a re-run redo them.
+            cur.execute(f"LOCK TABLE {partition} IN EXCLUSIVE MODE")
+            for kind in COLD_KINDS:
+                cur.execute(f"SELECT COUNT(*) FROM ({queries[kind]}) s")
+                if cur.fetchone()[0] != written[kind]:
+                    raise RuntimeError(f"{kind} for {year} changed while it was exported; re-run")
+            cur.execute(f"DELETE FROM ticket_comments WHERE query_id IN (SELECT query_id FROM {partition})")
+            # Through the parent so the ticket_metrics and cascade triggers fire.
+            cur.execute("DELETE FROM queries WHERE archived AND query_created_time >= %s "
+                        "AND query_created_time < %s", (date(year, 1, 1), date(year + 1, 1, 1)))
+            cur.execute(f"ALTER TABLE {ARCHIVE} DETACH PARTITION {partition}")
+            cur.execute(f"DROP TABLE {partition}")
+            notify.publish(cur, "tickets", count=written["tickets"])
+            # updated_at never reports deleted rows: in-memory copies must reload.
+            notify.publish(cur, "purges", count=written["tickets"])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        moved[year] = written["tickets"]
+    return moved
+
+def read_cold_storage(directory, kind="tickets"):
+    """All cold-storage files of one kind as a DataFrame (e.g. to feed analytics.frame_analytics)."""
+    import pandas as pd
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, f"{kind}_*"))):
+        if path.endswith(".parquet"):
+            frames.append(pd.read_parquet(path))
+        elif path.endswith((".csv", ".csv.gz")):
+            frames.append(pd.read_csv(path))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Partition, archive and age out the queries table")
+    parser.add_argument("--convert", action="store_true", help="partition an existing queries table online")
+    parser.add_argument("--batch", type=int, default=BACKFILL_BATCH, help="rows per backfill transaction")
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the pre-partitioning table")
+    parser.add_argument("--maintain", action="store_true", help="create upcoming partitions")
+    parser.add_argument("--archive", action="store_true", help="archive old Closed tickets")
+    parser.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_DAYS, metavar="DAYS")
+    parser.add_argument("--cold-storage", metavar="DIR", help="move old archive years out to files in DIR")
+    parser.add_argument("--before-year", type=int, default=date.today().year - 1)
+    parser.add_argument("--format", choices=["parquet", "csv.gz"], default="parquet")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="repeat --maintain/--archive forever")
+    parser.add_argument("--stats", action="store_true", help="print rows and size per partition")
+    args = parser.parse_args()
+
+    def progress(done, top, copied):
+        print(f"  backfill {done:,}/{top:,} ids, {copied:,} rows copied")
+
+    with get_connection() as conn:
+        if args.convert:
+            start = time.perf_counter()
+            if convert(conn, args.batch, progress=progress):
+                print(f"✅ queries is partitioned ({time.perf_counter() - start:.1f}s); "
+                      f"old table kept as {LEGACY} until --drop-legacy")
+            else:
+                print("✅ queries is already partitioned")
+        if args.drop_legacy:
+            drop_legacy(conn)
+            print(f"✅ Dropped {LEGACY}")
+        while True:
+            if args.maintain:
+                created = ensure_partitions(conn)
+                print(f"✅ Created partitions: {', '.join(created)}" if created else "✅ Partitions are in place")
+            if args.archive:
+                print(f"✅ Archived {archive_closed(conn, args.older_than):,} Closed tickets")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+        if args.cold_storage:
+            for year, rows in move_to_cold_storage(conn, args.cold_storage, args.before_year, args.format).items():
+                print(f"✅ {year}: {rows:,} tickets moved to {args.cold_storage}")
+        if args.stats:
+            for row in partition_stats(conn):
+                print(f"{row['tier']:>8} {row['partition']:<28} {row['rows']:>12,} {row['bytes'] / 1e6:>9.1f} MB")
@@ -0,0 +1,135 @@
+# pool.py
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+
+# ==============================
+# CONNECTION POOL
+# ==============================
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool with health checks and checkout metrics.
+
+    Connections are checked out with ``with pool.connection() as conn:``. Any
+    transaction left open by the caller is rolled back when the connection is
+    returned, so callers still commit explicitly as before.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, checkout_timeout=10.0,
+                 health_check_interval=30.0, **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=%s maxconn=%s" % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead.
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._stats = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "checkout_wait_seconds": 0.0,
+            "max_checkout_wait_seconds": 0.0,
+            "health_checks": 0,
+            "discarded": 0,
+            "in_use": 0,
+        }
+
+    # ---------- checkout / return ----------
+    def getconn(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._stats["checkout_timeouts"] += 1
+            raise pg_pool.PoolError(
+                "Timed out after %.1fs waiting for a database connection" % self.checkout_timeout
+            )
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["checkout_wait_seconds"] += waited
+            self._stats["max_checkout_wait_seconds"] = max(self._stats["max_checkout_wait_seconds"], waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+            self._stats["in_use"] -= 1
+            if close:
+                self._stats["discarded"] += 1
+                self._last_used.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    # ---------- health ----------
+    def _checkout_healthy(self):
+        # Try every slot once; a stale connection is discarded and replaced.
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            with self._lock:
+                self._stats["discarded"] += 1
+                self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+        raise pg_pool.PoolError("Could not obtain a healthy database connection")
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        with self._lock:
+            self._stats["health_checks"] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    # ---------- metrics ----------
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["minconn"] = self.minconn
+        stats["maxconn"] = self.maxconn
+        stats["avg_checkout_wait_seconds"] = (
+            stats["checkout_wait_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        )
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
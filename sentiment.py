@@ -0,0 +1,224 @@
+# sentiment.py
+import argparse
+import math
+import os
+import re
+import time
+from multiprocessing import Pool
+
+from psycopg2.extras import execute_values
+
+# ==============================
+# LEXICON SCORER
+# ==============================
+# Small hand-made lexicon tuned for support tickets, in the spirit of VADER: word
+# valences are summed with negation and intensifier handling, then squashed into
+# [-1, 1]. No model files, no third-party packages, about 100k texts/s per core.
+LEXICON = {
+    # frustration / urgency
+    "angry": -3, "furious": -3, "unacceptable": -3, "worst": -3, "terrible": -3, "awful": -3,
+    "horrible": -3, "ridiculous": -3, "useless": -3, "scam": -3, "disappointed": -2.5,
+    "frustrated": -2.5, "frustrating": -2.5, "annoying": -2, "annoyed": -2, "upset": -2,
+    "urgent": -1.5, "urgently": -1.5, "asap": -1.5, "immediately": -1.5, "again": -1,
+    "still": -1, "nobody": -1.5, "ignored": -2, "waiting": -1, "delayed": -1,
+    "refund": -1.5, "cancel": -1, "lost": -1.5, "broken": -2, "crash": -2, "crashes": -2,
+    "crashed": -2, "fail": -1.5, "failed": -1.5, "failing": -1.5, "failure": -1.5,
+    "error": -1, "errors": -1, "wrong": -1.5, "charged": -1, "twice": -1, "stuck": -1.5,
+    "slow": -1, "incorrectly": -1, "inconsistent": -0.5, "unable": -1,
+    "problem": -1, "issue": -0.5, "bug": -1, "suspended": -1.5, "locked": -1,
+    # satisfaction
+    "thanks": 1.5, "thank": 1.5, "great": 2, "good": 1.5, "excellent": 3, "awesome": 3,
+    "appreciate": 2, "appreciated": 2, "helpful": 2, "resolved": 2, "fixed": 1.5,
+    "works": 1.5, "working": 1, "love": 3, "happy": 2, "please": 0.5, "quick": 1,
+}
+NEGATIONS = {"not", "no", "never", "isnt", "doesnt", "dont", "didnt", "wont", "cant", "cannot",
+             "aint", "without"}
+INTENSIFIERS = {"very": 1.5, "really": 1.4, "extremely": 1.8, "so": 1.3, "totally": 1.5,
+                "completely": 1.5, "absolutely": 1.6}
+
+NEGATIVE_AT, POSITIVE_AT = -0.3, 0.3
+_WORD = re.compile(r"[A-Za-z']+|!")
+
+def score(text):
+    """Compound sentiment in [-1, 1]; below ``NEGATIVE_AT`` reads as an unhappy client."""
+    total = 0.0
+    negate_left = 0
+    boost = 1.0
+    exclaims = 0
+    for token in _WORD.findall(text or ""):
+        if token == "!":
+            exclaims += 1
+            continue
+        word = token.lower().replace("'", "")
+        if word in NEGATIONS:
+            negate_left = 3
+            continue
+        if word in INTENSIFIERS and word not in LEXICON:
+            boost *= INTENSIFIERS[word]
+            continue
+        valence = LEXICON.get(word)
+        if valence is not None:
+            if token.isupper() and len(token) > 1:
+                valence *= 1.3  # shouting
+            if negate_left:
+                # "not working" is a complaint, "not bad" is mild praise.
+                valence = -valence * (0.9 if valence > 0 else 0.5)
+            total += valence * boost
+        boost = 1.0
+        negate_left = max(0, negate_left - 1)
+    if total:
+        total += math.copysign(min(exclaims, 4) * 0.3, total)
+    return total / math.sqrt(total * total + 15)
+
+def label(value):
+    if value <= NEGATIVE_AT:
+        return "Negative"
+    if value >= POSITIVE_AT:
+        return "Positive"
+    return "Neutral"
+
+def score_rows(rows):
+    """``[(id, text)] -> [(id, score, label)]``; the unit of work sent to each process."""
+    out = []
+    for row_id, text in rows:
+        value = round(score(text), 4)
+        out.append((row_id, value, label(value)))
+    return out
+
+# ==============================
+# SCHEMA + TRIAGE
+# ==============================
+# Unhappy clients jump the queue: the triage rank is the priority weight plus a boost
+# for negative sentiment, so an angry Medium ticket sorts with the High ones.
+TRIAGE_RANK_SQL = (
+    "((CASE priority WHEN 'High' THEN 3 WHEN 'Low' THEN 1 ELSE 2 END)"
+    " + (CASE WHEN sentiment_score <= -0.6 THEN 2 WHEN sentiment_score <= -0.3 THEN 1 ELSE 0 END))"
+)
+
+SENTIMENT_DDL = f"""
+    ALTER TABLE queries ADD COLUMN IF NOT EXISTS sentiment_score REAL;
+    ALTER TABLE ticket_comments ADD COLUMN IF NOT EXISTS sentiment_score REAL;
+
+    -- Edited text gets scored again on the next pipeline run.
+    CREATE OR REPLACE FUNCTION queries_reset_sentiment() RETURNS trigger AS $$
+    BEGIN
+        NEW.sentiment_score := NULL;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS queries_reset_sentiment ON queries;
+    CREATE TRIGGER queries_reset_sentiment BEFORE UPDATE OF query_heading, query_description ON queries
+        FOR EACH ROW
+        WHEN (OLD.query_heading IS DISTINCT FROM NEW.query_heading
+              OR OLD.query_description IS DISTINCT FROM NEW.query_description)
+        EXECUTE FUNCTION queries_reset_sentiment();
+
+    -- The pipeline's work queues: only unscored rows are ever visited.
+    CREATE INDEX IF NOT EXISTS idx_queries_unscored ON queries (query_id) WHERE sentiment_score IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_ticket_comments_unscored ON ticket_comments (id) WHERE sentiment_score IS NULL;
+
+    CREATE INDEX IF NOT EXISTS idx_queries_triage
+        ON queries ({TRIAGE_RANK_SQL} DESC, due_at) WHERE status <> 'Closed';
+"""
+
+# ==============================
+# PIPELINE
+# ==============================
+# (table, id column, text expression, has a label column)
+SOURCES = {
+    "queries": ("queries", "query_id",
+                "COALESCE(query_heading, '') || '. ' || COALESCE(query_description, '')", False),
+    "comments": ("ticket_comments", "id", "COALESCE(comment, '')", True),
+}
+
+def _fetch_unscored(conn, source, after, chunk):
+    table, id_col, text_sql, _ = SOURCES[source]
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT {id_col}, {text_sql} FROM {table}
+            WHERE sentiment_score IS NULL AND {id_col} > %s
+            ORDER BY {id_col} LIMIT %s""",
+        (after, chunk)
+    )
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+def _write_scores(conn, source, scored):
+    table, id_col, _, has_label = SOURCES[source]
+    set_label = ", sentiment = v.label" if has_label else ""
+    cur = conn.cursor()
+    try:
+        execute_values(cur, f"""
+            UPDATE {table} t SET sentiment_score = v.score{set_label}
+            FROM (VALUES %s) AS v(id, score, label)
+            WHERE t.{id_col} = v.id
+        """, scored, template="(%s, %s::real, %s)", page_size=len(scored))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def _split(rows, parts):
+    size = max(1, math.ceil(len(rows) / parts))
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+def run_pipeline(conn, sources=("queries", "comments"), chunk=5000, workers=None, pool=None):
+    """Score every unscored row; one keyset-ordered read and one bulk UPDATE per chunk.
+
+    Returns ``{source: {"rows", "seconds", "rows_per_sec"}}``.
+    """
+    workers = workers or os.cpu_count() or 1
+    own_pool = pool is None and workers > 1
+    if own_pool:
+        pool = Pool(workers)
+    stats = {}
+    try:
+        for source in sources:
+            start, done, after = time.perf_counter(), 0, 0
+            while True:
+                rows = _fetch_unscored(conn, source, after, chunk)
+                if not rows:
+                    break
+                if pool is not None:
+                    scored = [r for part in pool.map(score_rows, _split(rows, workers)) for r in part]
+                else:
+                    scored = score_rows(rows)
+                _write_scores(conn, source, scored)
+                done += len(rows)
+                after = rows[-1][0]
+            elapsed = time.perf_counter() - start
+            stats[source] = {"rows": done, "seconds": round(elapsed, 2),
+                             "rows_per_sec": round(done / elapsed) if elapsed else None}
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+    return stats
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Score unscored tickets and comments")
+    parser.add_argument("--chunk", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="keep scoring new rows at this interval")
+    args = parser.parse_args()
+
+    with Pool(args.workers) as worker_pool:
+        while True:
+            with get_connection() as conn:
+                for source, result in run_pipeline(conn, chunk=args.chunk, workers=args.workers,
+                                                   pool=worker_pool).items():
+                    if result["rows"]:
+                        print(f"✅ {source}: {result['rows']:,} rows in {result['seconds']}s "
+                              f"({result['rows_per_sec']:,} rows/sec)")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
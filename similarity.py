@@ -0,0 +1,327 @@
+# similarity.py
+import argparse
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+# ==============================
+# MINHASH
+# ==============================
+# Tickets are reduced to character 5-gram shingles of their normalised heading +
+# description, then to a MinHash signature whose matching positions estimate Jaccard
+# similarity. LSH banding (BANDS x ROWS) turns "find similar" into a few dict lookups:
+# two tickets share a bucket with probability 1 - (1 - s^ROWS)^BANDS, about 50% at
+# s = 0.5 and over 99% at s = 0.8.
+SHINGLE = 5
+NUM_PERM = 64
+BANDS, ROWS = 16, 4
+SUGGEST_THRESHOLD = 0.6
+AUTO_LINK_THRESHOLD = 0.9
+# ``updated_at`` never reports deleted tickets, so every so often the index checks its
+# ids against the table and drops the ones that are gone.
+RECONCILE_SECONDS = 900.0
+
+_PRIME = np.uint64((1 << 32) - 5)
+_rng = np.random.default_rng(20240917)
+# a < 2^31 and shingle hashes < 2^32 keep a * x + b inside uint64.
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+def normalise(heading, description):
+    return " ".join(re.findall(r"\w+", f"{heading or ''} {description or ''}".lower()))
+
+def shingles(text):
+    if len(text) <= SHINGLE:
+        return {text}
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+def signature(heading, description):
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode()) for s in shingles(normalise(heading, description))),
+        dtype=np.uint64,
+    )
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+def estimate(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+def _band_keys(sig):
+    return [sig[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+# ==============================
+# INDEX
+# ==============================
+class SimilarityIndex:
+    """In-memory LSH index of ticket signatures, refreshed from ``queries`` by ``updated_at``.
+
+    Signatures are saved to an ``.npz`` file so a restart only reads tickets changed
+    since the last save instead of re-shingling the whole table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sigs = {}
+        self._meta = {}  # query_id -> (heading, status)
+        self._buckets = [dict() for _ in range(BANDS)]
+        self._watermark = None
+        self._reconciled_at = 0.0
+        self.version = None  # the caller's change counter at the last refresh
+        self.purges = None  # the caller's purge counter at the last requested reconcile
+        self.stats_counters = {"queries": 0, "query_seconds": 0.0, "refreshed_rows": 0, "removed_rows": 0}
+
+    def __len__(self):
+        return len(self._sigs)
+
+    # ---------- maintenance ----------
+    def _remove(self, qid):
+        sig = self._sigs.pop(qid, None)
+        if sig is not None:
+            for band, key in zip(self._buckets, _band_keys(sig)):
+                members = band.get(key)
+                if members:
+                    members.discard(qid)
+                    if not members:
+                        del band[key]
+
+    def _insert(self, qid, sig, meta):
+        self._remove(qid)
+        self._sigs[qid] = sig
+        self._meta[qid] = meta
+        for band, key in zip(self._buckets, _band_keys(sig)):
+            band.setdefault(key, set()).add(qid)
+
+    def add(self, qid, heading, description, status="Open"):
+        sig = signature(heading, description)
+        with self._lock:
+            self._insert(int(qid), sig, (heading, status))
+
+    def set_status(self, qid, status):
+        with self._lock:
+            if qid in self._meta:
+                self._meta[qid] = (self._meta[qid][0], status)
+
+    def reconcile_due(self, max_age=RECONCILE_SECONDS):
+        return time.monotonic() - self._reconciled_at > max_age
+
+    def request_reconcile(self):
+        """Make the next refresh drop deleted tickets (e.g. after a cold-storage move)."""
+        self._reconciled_at = 0.0
+
+    def reconcile(self, conn):
+        """Drop indexed tickets that are no longer in ``queries``; returns how many."""
+        with self._lock:
+            # Only ids known before the read can be judged: add() may race it.
+            known = set(self._sigs)
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT query_id FROM queries")
+            present = {qid for (qid,) in cur.fetchall()}
+        finally:
+            cur.close()
+        gone = known - present
+        with self._lock:
+            for qid in gone:
+                self._remove(qid)
+                self._meta.pop(qid, None)
+        self._reconciled_at = time.monotonic()
+        self.stats_counters["removed_rows"] += len(gone)
+        return len(gone)
+
+    def refresh(self, conn, overlap_seconds=5, reconcile_seconds=RECONCILE_SECONDS):
+        """Index tickets inserted or edited since the last refresh; returns rows read."""
+        if self.reconcile_due(reconcile_seconds):
+            self.reconcile(conn)
+        sql = "SELECT query_id, query_heading, query_description, status, updated_at FROM queries"
+        params = []
+        if self._watermark is not None:
+            sql += " WHERE updated_at >= %s"
+            params.append((self._watermark - pd.Timedelta(seconds=overlap_seconds)).to_pydatetime())
+        df = pd.read_sql(sql, conn, params=params)
+        sigs = [signature(h, d) for h, d in zip(df["query_heading"], df["query_description"])]
+        with self._lock:
+            for qid, heading, status, sig in zip(df["query_id"], df["query_heading"], df["status"], sigs):
+                self._insert(int(qid), sig, (heading, status))
+            if not df.empty:
+                newest = pd.Timestamp(df["updated_at"].max())
+                self._watermark = newest if self._watermark is None else max(self._watermark, newest)
+        self.stats_counters["refreshed_rows"] += len(df)
+        return len(df)
+
+    # ---------- lookup ----------
+    def similar(self, heading, description, k=5, threshold=SUGGEST_THRESHOLD, exclude=None):
+        """Return up to ``k`` ``(query_id, similarity, heading, status)`` tuples, most similar first."""
+        start = time.perf_counter()
+        sig = signature(heading, description)
+        with self._lock:
+            candidates = set()
+            for band, key in zip(self._buckets, _band_keys(sig)):
+                candidates |= band.get(key, set())
+            candidates.discard(exclude)
+            scored = [(qid, estimate(sig, self._sigs[qid])) for qid in candidates]
+            matches = sorted(
+                ((qid, s, *self._meta[qid]) for qid, s in scored if s >= threshold),
+                key=lambda m: (-m[1], m[0]),
+            )[:k]
+        self.stats_counters["queries"] += 1
+        self.stats_counters["query_seconds"] += time.perf_counter() - start
+        return matches
+
+    def pair_similarity(self, a, b):
+        """Estimated similarity of two indexed tickets."""
+        with self._lock:
+            return estimate(self._sigs[a], self._sigs[b])
+
+    def anchored_pairs(self, threshold=SUGGEST_THRESHOLD):
+        """``(anchor, member, similarity)`` for each bucket member close to its bucket's oldest ticket.
+
+        Comparing against one anchor per bucket keeps clustering linear in bucket size;
+        comparing all pairs would be quadratic in exactly the heavily duplicated buckets.
+        """
+        with self._lock:
+            pairs = []
+            for band in self._buckets:
+                for members in band.values():
+                    if len(members) < 2:
+                        continue
+                    anchor = min(members)
+                    for qid in members:
+                        if qid != anchor:
+                            s = estimate(self._sigs[anchor], self._sigs[qid])
+                            if s >= threshold:
+                                pairs.append((anchor, qid, s))
+        return pairs
+
+    # ---------- persistence ----------
+    def save(self, path):
+        with self._lock:
+            ids = np.fromiter(self._sigs, dtype=np.int64, count=len(self._sigs))
+            sigs = np.stack([self._sigs[i] for i in ids]) if len(ids) else np.empty((0, NUM_PERM), np.uint32)
+            meta = np.array([self._meta[i] for i in ids], dtype=object).astype(str) if len(ids) else np.empty((0, 2), str)
+            watermark = "" if self._watermark is None else str(self._watermark)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, ids=ids, sigs=sigs, meta=meta, watermark=np.array(watermark))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with np.load(path, allow_pickle=False) as data:
+            if data["sigs"].shape[1:] != (NUM_PERM,):
+                return index  # saved with different parameters; rebuild
+            for qid, sig, (heading, status) in zip(data["ids"], data["sigs"], data["meta"]):
+                index._insert(int(qid), sig, (str(heading), str(status)))
+            watermark = str(data["watermark"])
+        index._watermark = pd.Timestamp(watermark) if watermark else None
+        return index
+
+    def stats(self):
+        queries = self.stats_counters["queries"]
+        return {
+            "tickets": len(self._sigs),
+            "buckets": sum(len(b) for b in self._buckets),
+            "queries": queries,
+            "avg_query_ms": round(self.stats_counters["query_seconds"] / queries * 1000, 3) if queries else None,
+            "refreshed_rows": self.stats_counters["refreshed_rows"],
+            "removed_rows": self.stats_counters["removed_rows"],
+            "watermark": None if self._watermark is None else str(self._watermark),
+        }
+
+# ==============================
+# LINKS
+# ==============================
+LINKS_DDL = """
+    CREATE TABLE IF NOT EXISTS ticket_links (
+        query_id INT PRIMARY KEY REFERENCES queries(query_id) ON DELETE CASCADE,
+        duplicate_of INT NOT NULL REFERENCES queries(query_id) ON DELETE CASCADE,
+        similarity REAL NOT NULL,
+        linked_by VARCHAR(20) NOT NULL,
+        linked_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS idx_ticket_links_duplicate_of ON ticket_links (duplicate_of);
+"""
+
+def link_duplicates(conn, links, linked_by="submit"):
+    """Upsert ``(query_id, duplicate_of, similarity)`` links in one statement."""
+    if not links:
+        return 0
+    cur = conn.cursor()
+    try:
+        execute_values(cur, """
+            INSERT INTO ticket_links (query_id, duplicate_of, similarity, linked_by)
+            VALUES %s
+            ON CONFLICT (query_id) DO UPDATE
+            SET duplicate_of = EXCLUDED.duplicate_of, similarity = EXCLUDED.similarity,
+                linked_by = EXCLUDED.linked_by, linked_at = now()
+        """, [(int(q), int(d), float(s), linked_by) for q, d, s in links], page_size=1000)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(links)
+
+def cluster(index, threshold=SUGGEST_THRESHOLD):
+    """Union-find over anchored LSH pairs.
+
+    Returns ``({root: [members]}, {member: similarity to its root})`` for clusters of 2+.
+    """
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _ in index.anchored_pairs(threshold):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            # The oldest ticket (lowest id) stays the root everything links to.
+            parent[max(ra, rb)] = min(ra, rb)
+    clusters = {}
+    for qid in parent:
+        clusters.setdefault(find(qid), []).append(qid)
+    clusters = {root: sorted(m) for root, m in clusters.items() if len(m) > 1}
+    # Members joined through a chain of anchors can sit below the threshold against the
+    # root itself, so each link is scored against the ticket it actually points at.
+    scores = {m: index.pair_similarity(root, m) for root, members in clusters.items()
+              for m in members if m != root}
+    return clusters, scores
+
+# ==============================
+# MAIN
+# ==============================
+INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join("data", "similarity_index.npz"))
+
+if __name__ == "__main__":
+    from db import get_connection
+
+    parser = argparse.ArgumentParser(description="Build the ticket similarity index / cluster the backlog")
+    parser.add_argument("--path", default=INDEX_PATH)
+    parser.add_argument("--cluster", action="store_true", help="link every ticket to its cluster's oldest ticket")
+    parser.add_argument("--threshold", type=float, default=AUTO_LINK_THRESHOLD)
+    args = parser.parse_args()
+
+    index = SimilarityIndex.load(args.path)
+    start = time.perf_counter()
+    with get_connection() as conn:
+        rows = index.refresh(conn)
+        print(f"✅ Indexed {rows:,} changed tickets in {time.perf_counter() - start:.1f}s ({len(index):,} total)")
+        index.save(args.path)
+        if args.cluster:
+            clusters, scores = cluster(index, args.threshold)
+            links = [(m, root, scores[m]) for root, members in clusters.items()
+                     for m in members if m != root]
+            link_duplicates(conn, links, linked_by="batch")
+            sizes = sorted((len(m) for m in clusters.values()), reverse=True)
+            print(f"✅ {len(clusters):,} clusters, {len(links):,} tickets linked; largest: {sizes[:5]}")
@@ -0,0 +1,321 @@
+# sla.py
+import argparse
+import logging
+import threading
+import time
+
+import pandas as pd
+
+import notify
+
+log = logging.getLogger(__name__)
+
+# ==============================
+# POLICY + SCHEMA
+# ==============================
+# Each ticket's deadline is stored in queries.due_at (created time + its own sla_hours,
+# or the sla_policies hours for its priority), so overdue and at-risk reads are range
+# scans on a partial index instead of date arithmetic over every row.
+PRIORITY_SLA_HOURS = {"High": 8, "Medium": 24, "Low": 72}
+AT_RISK_HOURS = 4
+
+SLA_DDL = """
+    CREATE TABLE IF NOT EXISTS sla_policies (
+        priority VARCHAR(10) PRIMARY KEY,
+        hours INT NOT NULL CHECK (hours > 0)
+    );
+
+    ALTER TABLE queries ADD COLUMN IF NOT EXISTS due_at TIMESTAMP;
+    ALTER TABLE queries ADD COLUMN IF NOT EXISTS sla_breached_at TIMESTAMP;
+
+    CREATE OR REPLACE FUNCTION sla_policy_hours(p VARCHAR) RETURNS INT AS $$
+        SELECT COALESCE(
+            (SELECT hours FROM sla_policies WHERE priority = p),
+            (SELECT hours FROM sla_policies WHERE priority = 'Medium'),
+            24)
+    $$ LANGUAGE sql STABLE;
+
+    CREATE OR REPLACE FUNCTION queries_set_due_at() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT'
+           OR NEW.priority IS DISTINCT FROM OLD.priority
+           OR NEW.sla_hours IS DISTINCT FROM OLD.sla_hours
+           OR NEW.query_created_time IS DISTINCT FROM OLD.query_created_time THEN
+            NEW.due_at := NEW.query_created_time
+                + make_interval(hours => COALESCE(NEW.sla_hours, sla_policy_hours(NEW.priority)));
+        END IF;
+        -- A moved deadline is judged again from scratch.
+        IF TG_OP = 'UPDATE' AND NEW.due_at IS DISTINCT FROM OLD.due_at THEN
+            NEW.sla_breached_at := NULL;
+        END IF;
+        -- Flag at write time when we already know; the sweeper catches tickets that simply age.
+        -- Parenthesised: PL/pgSQL would end the IF condition at the CASE's first THEN.
+        IF NEW.sla_breached_at IS NULL AND NEW.due_at < (CASE
+               WHEN NEW.status = 'Closed' THEN COALESCE(NEW.query_closed_time, now())
+               ELSE now() END) THEN
+            NEW.sla_breached_at := NEW.due_at;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS queries_set_due_at ON queries;
+    CREATE TRIGGER queries_set_due_at BEFORE INSERT OR UPDATE ON queries
+        FOR EACH ROW EXECUTE FUNCTION queries_set_due_at();
+
+    -- Overdue / at-risk reads, the sweeper's pending set, and breach counts.
+    CREATE INDEX IF NOT EXISTS idx_queries_open_due
+        ON queries (due_at) WHERE status <> 'Closed';
+    CREATE INDEX IF NOT EXISTS idx_queries_sla_pending
+        ON queries (due_at) WHERE status <> 'Closed' AND sla_breached_at IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_queries_sla_breached
+        ON queries (sla_breached_at) WHERE sla_breached_at IS NOT NULL;
+"""
+
+# Migration 12 replaces the trigger function: an INSERT that already carries a deadline
+# keeps it, so a ticket moved between partitions (see partitioning.py) is not judged
+# again against today's policy.
+SET_DUE_AT_FN = """
+    CREATE OR REPLACE FUNCTION queries_set_due_at() RETURNS trigger AS $$
+    BEGIN
+        IF (TG_OP = 'INSERT' AND NEW.due_at IS NULL)
+           OR (TG_OP = 'UPDATE' AND (NEW.priority IS DISTINCT FROM OLD.priority
+               OR NEW.sla_hours IS DISTINCT FROM OLD.sla_hours
+               OR NEW.query_created_time IS DISTINCT FROM OLD.query_created_time)) THEN
+            NEW.due_at := NEW.query_created_time
+                + make_interval(hours => COALESCE(NEW.sla_hours, sla_policy_hours(NEW.priority)));
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.due_at IS DISTINCT FROM OLD.due_at THEN
+            NEW.sla_breached_at := NULL;
+        END IF;
+        IF NEW.sla_breached_at IS NULL AND NEW.due_at < (CASE
+               WHEN NEW.status = 'Closed' THEN COALESCE(NEW.query_closed_time, now())
+               ELSE now() END) THEN
+            NEW.sla_breached_at := NEW.due_at;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# The trigger only fires on writes; existing rows get their deadline here.
+BACKFILL_SQL = """
+    UPDATE queries
+    SET due_at = query_created_time + make_interval(hours => COALESCE(sla_hours, sla_policy_hours(priority)))
+    WHERE due_at IS NULL AND query_created_time IS NOT NULL
+"""
+
+def install_sla(conn):
+    """Create the SLA schema and backfill deadlines; runs inside the caller's transaction."""
+    cur = conn.cursor()
+    cur.execute(SLA_DDL)
+    cur.executemany(
+        "INSERT INTO sla_policies (priority, hours) VALUES (%s, %s) ON CONFLICT (priority) DO NOTHING",
+        list(PRIORITY_SLA_HOURS.items())
+    )
+    cur.execute(BACKFILL_SQL)
+    cur.close()
+
+def get_policies(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT priority, hours FROM sla_policies ORDER BY hours")
+    policies = dict(cur.fetchall())
+    cur.close()
+    return policies
+
+def set_policy(conn, priority, hours):
+    """Change a priority's SLA and move the deadline of its open tickets that use the default."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """INSERT INTO sla_policies (priority, hours) VALUES (%s, %s)
+               ON CONFLICT (priority) DO UPDATE SET hours = EXCLUDED.hours""",
+            (priority, hours)
+        )
+        cur.execute(
+            """UPDATE queries SET due_at = query_created_time + make_interval(hours => %s)
+               WHERE priority = %s AND sla_hours IS NULL AND status <> 'Closed'""",
+            (hours, priority)
+        )
+        moved = cur.rowcount
+        notify.publish(cur, "tickets", count=moved)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return moved
+
+# ==============================
+# READS
+# ==============================
+def _scope(clauses, params, username=None, assigned_to=None):
+    if username is not None:
+        clauses.append("username = %s")
+        params.append(username)
+    if assigned_to is not None:
+        clauses.append("assigned_to = %s")
+        params.append(assigned_to)
+
+def sla_counts(conn, at_risk_hours=AT_RISK_HOURS, **scope):
+    """Return overdue (open, past due), at_risk (open, due within the window) and breached counts."""
+    clauses, params = [], []
+    _scope(clauses, params, **scope)
+    extra = "".join(f" AND {c}" for c in clauses)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM queries
+             WHERE status <> 'Closed' AND due_at < now(){extra}),
+            (SELECT COUNT(*) FROM queries
+             WHERE status <> 'Closed' AND due_at >= now()
+               AND due_at < now() + make_interval(hours => %s){extra}),
+            (SELECT COUNT(*) FROM queries WHERE sla_breached_at IS NOT NULL{extra})
+    """, params + [at_risk_hours] + params + params)
+    overdue, at_risk, breached = cur.fetchone()
+    cur.close()
+    return {"overdue": overdue, "at_risk": at_risk, "breached": breached}
+
+def fetch_due(conn, at_risk_hours=AT_RISK_HOURS, limit=50, **scope):
+    """Open tickets that are overdue or due within ``at_risk_hours``, most urgent first."""
+    clauses = ["status <> 'Closed'", "due_at < now() + make_interval(hours => %s)"]
+    params = [at_risk_hours]
+    _scope(clauses, params, **scope)
+    return pd.read_sql(
+        f"""SELECT query_id, query_heading, priority, status, assigned_to, due_at,
+                   due_at < now() AS overdue
+            FROM queries WHERE {' AND '.join(clauses)}
+            ORDER BY due_at LIMIT %s""",
+        conn, params=params + [limit]
+    )
+
+# ==============================
+# SWEEPER
+# ==============================
+SWEEP_SQL = """
+    WITH due AS (
+        SELECT query_id FROM queries
+        WHERE status <> 'Closed' AND sla_breached_at IS NULL AND due_at < now()
+        ORDER BY due_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE queries q SET sla_breached_at = q.due_at
+    FROM due WHERE q.query_id = due.query_id
+    RETURNING q.query_id, q.username, q.status, q.priority, q.assigned_to
+"""
+
+def sweep_breaches(conn, batch=1000):
+    """Flag up to ``batch`` newly breached open tickets; returns their facet dicts.
+
+    Only rows not yet flagged are visited (partial index), and SKIP LOCKED lets
+    several app processes sweep at once without blocking each other or writers.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(SWEEP_SQL, (batch,))
+        rows = [
+            {"query_id": qid, "username": user, "status": status, "priority": priority, "assigned_to": agent}
+            for qid, user, status, priority, agent in cur.fetchall()
+        ]
+        if rows:
+            notify.publish(cur, "tickets", count=len(rows))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows
+
+
+class SlaSweeper:
+    """Daemon thread that runs ``sweep_breaches`` every ``interval`` seconds.
+
+    ``on_flagged`` is called with the flagged rows after each non-empty sweep.
+    """
+
+    def __init__(self, pool, interval=60.0, batch=1000, on_flagged=None):
+        self._pool = pool
+        self.interval = interval
+        self.batch = batch
+        self._on_flagged = on_flagged
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"sweeps": 0, "flagged": 0, "last_sweep": None, "last_error": None}
+
+    def sweep_once(self):
+        flagged = []
+        with self._pool.connection() as conn:
+            while True:
+                rows = sweep_breaches(conn, self.batch)
+                flagged.extend(rows)
+                if len(rows) < self.batch:
+                    break
+        with self._lock:
+            self._stats["sweeps"] += 1
+            self._stats["flagged"] += len(flagged)
+            self._stats["last_sweep"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        if flagged and self._on_flagged:
+            self._on_flagged(flagged)
+        return flagged
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep_once()
+            except Exception as exc:
+                log.warning("SLA sweep failed: %s", exc)
+                with self._lock:
+                    self._stats["last_error"] = str(exc)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sla-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+# ==============================
+# MAIN
+# ==============================
+if __name__ == "__main__":
+    from db import get_connection, get_pool
+
+    parser = argparse.ArgumentParser(description="SLA deadlines and breach sweeping")
+    parser.add_argument("--sweep", action="store_true", help="flag newly breached tickets once")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="keep sweeping at this interval")
+    parser.add_argument("--policy", metavar="PRIORITY=HOURS", action="append", default=[],
+                        help="set a priority's SLA hours, e.g. High=4")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        for item in args.policy:
+            priority, hours = item.split("=")
+            moved = set_policy(conn, priority, int(hours))
+            print(f"✅ {priority}: {hours}h ({moved} open tickets re-dated)")
+        if args.sweep:
+            print(f"✅ Flagged {len(sweep_breaches(conn))} newly breached tickets")
+        print(sla_counts(conn))
+
+    if args.watch:
+        sweeper = SlaSweeper(get_pool(), interval=args.watch,
+                             on_flagged=lambda rows: print(f"flagged {len(rows)} tickets"))
+        sweeper.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            sweeper.stop()
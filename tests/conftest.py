@@ -0,0 +1,41 @@
+# conftest.py
+import os
+import sys
+import uuid
+
+import psycopg2
+import pytest
+
+# The modules live at the repository root, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ==============================
+# DATABASE
+# ==============================
+# Database tests run against the server in the usual PG_* settings (PG_TEST_ADMIN_DB is
+# the database scratch databases are created from) and are skipped when none answers.
+@pytest.fixture(scope="session")
+def pg_server():
+    import db
+
+    kwargs = dict(db.connection_kwargs(), database=os.getenv("PG_TEST_ADMIN_DB", "postgres"))
+    try:
+        psycopg2.connect(connect_timeout=3, **kwargs).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no PostgreSQL server for database tests: {e}")
+    return kwargs
+
+@pytest.fixture
+def scratch_db(pg_server):
+    """Connection kwargs of a new, empty database that is dropped after the test."""
+    name = f"cqms_test_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(**pg_server)
+    admin.autocommit = True
+    cur = admin.cursor()
+    cur.execute(f"CREATE DATABASE {name}")
+    try:
+        yield dict(pg_server, database=name)
+    finally:
+        cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        cur.close()
+        admin.close()
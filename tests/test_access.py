@@ -0,0 +1,174 @@
+# test_access.py
+import pytest
+
+import access
+import tickets
+
+
+# ==============================
+# ROLE COLUMNS
+# ==============================
+def test_client_columns_leave_out_triage_fields():
+    client = set(access.ROLE_COLUMNS["Client"])
+    assert client < set(tickets.TICKET_COLUMNS)
+    for column in ("username", "assigned_to", "sla_hours", "sentiment_score"):
+        assert column not in client
+
+def test_staff_roles_see_every_ticket_column():
+    for role in ("Support", "Admin"):
+        assert access.ROLE_COLUMNS[role] == list(tickets.TICKET_COLUMNS)
+
+
+# ==============================
+# ROW SCOPE
+# ==============================
+def test_row_scope_pins_clients_to_their_own_tickets():
+    assert access.row_scope("Client", "alice") == {"username": "alice"}
+
+@pytest.mark.parametrize("role", ["Support", "Admin"])
+def test_row_scope_is_empty_for_staff(role):
+    assert access.row_scope(role, "bob") == {}
+
+@pytest.mark.parametrize("role", ["", "client", "System", None])
+def test_row_scope_rejects_unknown_roles(role):
+    with pytest.raises(PermissionError):
+        access.row_scope(role, "alice")
+
+
+# ==============================
+# SCOPED
+# ==============================
+def test_scoped_defaults_to_the_role_columns():
+    columns, filters = access.scoped("Client", "alice")
+    assert columns == access.ROLE_COLUMNS["Client"]
+    assert filters == {"username": "alice"}
+
+def test_scoped_denies_columns_outside_the_role():
+    with pytest.raises(PermissionError, match="assigned_to"):
+        access.scoped("Client", "alice", columns=["query_id", "assigned_to"])
+
+def test_scoped_allows_a_subset_of_the_role_columns():
+    columns, _ = access.scoped("Client", "alice", columns=["query_id", "status"])
+    assert columns == ["query_id", "status"]
+
+def test_scoped_rejects_a_client_reading_another_username():
+    with pytest.raises(PermissionError):
+        access.scoped("Client", "alice", username="mallory")
+
+def test_scoped_accepts_a_client_naming_itself():
+    _, filters = access.scoped("Client", "alice", username="alice", status="Open")
+    assert filters == {"username": "alice", "status": "Open"}
+
+def test_scoped_lets_staff_filter_by_any_username():
+    _, filters = access.scoped("Support", "bob", username="alice")
+    assert filters == {"username": "alice"}
+
+def test_scoped_filters_become_the_where_clause():
+    _, filters = access.scoped("Client", "alice", status=["Open", "In Progress"], priority="High")
+    clauses, params = tickets._where(**filters)
+    assert "NOT archived" in clauses
+    assert "username = %s" in clauses
+    assert "priority = %s" in clauses
+    assert "alice" in params and "High" in params
+    assert ["Open", "In Progress"] in params
+
+def test_staff_where_clause_has_no_username():
+    _, filters = access.scoped("Admin", "root")
+    clauses, params = tickets._where(**filters)
+    assert clauses == ["NOT archived"]
+    assert params == []
+
+
+# ==============================
+# RLS
+# ==============================
+def test_session_options_tag_the_system_role():
+    assert access.session_options() == f"-c cqms.role={access.SYSTEM_ROLE}"
+
+
+# ==============================
+# DATABASE
+# ==============================
+# The guarantee itself: a Client session only ever receives its own rows, both through
+# the scoped reads and, with RLS installed, from any query it manages to run.
+@pytest.fixture
+def ticket_db(scratch_db):
+    import psycopg2
+
+    import migrations
+    from instrumentation import InstrumentedCursor
+
+    conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **scratch_db)
+    migrations.migrate(conn)
+    cur = conn.cursor()
+    # alice: 120 live tickets (three pages) and 5 archived; bob: 40 live.
+    cur.execute("""
+        INSERT INTO queries (username, query_heading, status, priority, query_created_time, archived)
+        SELECT CASE WHEN i <= 125 THEN 'alice' ELSE 'bob' END, 'Ticket ' || i, 'Open', 'Low',
+               timestamp '2025-01-01' + i * interval '1 hour', i BETWEEN 121 AND 125
+        FROM generate_series(1, 165) i
+    """)
+    conn.commit()
+    cur.close()
+    yield conn
+    conn.close()
+
+def _count(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM queries")
+    count = cur.fetchone()[0]
+    cur.close()
+    return count
+
+def test_client_pages_hold_only_own_tickets(ticket_db):
+    assert access.check_client_scope(ticket_db, "alice") == []
+    assert access.check_client_scope(ticket_db, "bob", page_size=7) == []
+
+def test_client_reads_return_only_own_rows(ticket_db):
+    df, _ = access.fetch_tickets(ticket_db, "Client", "bob", limit=500)
+    assert len(df) == 40
+    assert list(df.columns) == access.ROLE_COLUMNS["Client"]
+    cur = ticket_db.cursor()
+    cur.execute("SELECT query_id FROM queries WHERE username = 'alice' LIMIT 1")
+    alices = cur.fetchone()[0]
+    cur.close()
+    assert access.get_ticket(ticket_db, "Client", "bob", alices) is None
+    assert access.visible_ids(ticket_db, "Client", "bob", [alices]) == set()
+
+def test_rls_policy_scopes_sessions_by_role(ticket_db, monkeypatch):
+    import uuid
+
+    # Superusers skip policies, so the reads run as a plain role.
+    role = f"cqms_test_{uuid.uuid4().hex[:12]}"
+    access.install_rls(ticket_db)
+    cur = ticket_db.cursor()
+    cur.execute(f"CREATE ROLE {role}")
+    cur.execute(f"GRANT SELECT ON queries TO {role}")
+    ticket_db.commit()
+    monkeypatch.setattr(access, "RLS_ENABLED", True)
+    try:
+        def rows_seen(role_tag, username=None):
+            cur.execute(f"SET LOCAL ROLE {role}")
+            access.tag_transaction(ticket_db, role_tag, username)
+            count = _count(ticket_db)
+            ticket_db.rollback()
+            return count
+
+        assert rows_seen("Client", "alice") == 125
+        assert rows_seen("Client", "bob") == 40
+        assert rows_seen("Client", "mallory") == 0
+        assert rows_seen("Support") == 165
+        assert rows_seen(access.SYSTEM_ROLE) == 165
+        # Untagged sessions are denied by default.
+        assert rows_seen("") == 0
+
+        cur.execute(f"SET LOCAL ROLE {role}")
+        df, _ = access.fetch_tickets(ticket_db, "Client", "bob", limit=500)
+        assert len(df) == 40
+        ticket_db.rollback()
+    finally:
+        ticket_db.rollback()
+        cur.execute(f"DROP OWNED BY {role}")
+        cur.execute(f"DROP ROLE {role}")
+        ticket_db.commit()
+        cur.close()
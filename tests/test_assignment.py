@@ -0,0 +1,64 @@
+# test_assignment.py
+import psycopg2
+import pytest
+
+import assignment
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.cur = FakeCursor(rows)
+        self.rolled_back = False
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        raise AssertionError("nothing should be committed")
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.fixture
+def failing_update(monkeypatch):
+    def execute_values(*args, **kwargs):
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    monkeypatch.setattr(assignment, "execute_values", execute_values)
+
+
+# ==============================
+# FAILED WRITES
+# ==============================
+def test_failed_backlog_update_releases_reservations(failing_update):
+    engine = assignment.AssignmentEngine({"amy": 2, "ben": 0}, ["amy", "ben"])
+    before = engine.loads()
+    conn = FakeConn([(1, "High"), (2, "Low"), (3, "Medium")])
+    with pytest.raises(psycopg2.OperationalError):
+        assignment.assign_backlog(conn, engine)
+    assert conn.rolled_back and conn.cur.closed
+    assert engine.loads() == before
+
+def test_failed_rebalance_puts_loads_back(failing_update):
+    engine = assignment.AssignmentEngine({"amy": 12, "ben": 0}, ["amy", "ben"])
+    before = engine.loads()
+    conn = FakeConn([(1, "amy", "High"), (2, "amy", "High")])
+    with pytest.raises(psycopg2.OperationalError):
+        assignment.rebalance(conn, engine)
+    assert conn.rolled_back
+    assert engine.loads() == before
@@ -0,0 +1,52 @@
+# test_hashing.py
+import time
+
+import bcrypt
+
+import hashing
+
+LONG = "correct horse battery staple " * 4  # 116 bytes, past bcrypt's 72
+
+
+def _hasher():
+    fast = hashing.BcryptHasher(rounds=4)
+    return hashing.PasswordHasher(fast, [fast, hashing.LegacySha256Hasher()])
+
+
+# ==============================
+# BCRYPT
+# ==============================
+def test_long_passwords_hash_and_verify():
+    hasher = _hasher()
+    stored = hasher.hash(LONG)
+    assert hasher.verify(LONG, stored) == (True, None)
+    assert hasher.verify(LONG[:-1] + "X", stored) == (False, None)
+
+def test_every_byte_of_a_long_password_counts():
+    stored = _hasher().hash(LONG)
+    assert _hasher().verify(LONG[:72], stored) == (False, None)
+
+def test_legacy_user_with_a_long_password_is_upgraded():
+    legacy = hashing.LegacySha256Hasher().hash(LONG)
+    ok, new_hash = _hasher().verify(LONG, legacy)
+    assert ok and new_hash.startswith("$2b$")
+    assert _hasher().verify(LONG, new_hash) == (True, None)
+
+def test_hashes_from_truncating_bcrypt_releases_still_verify():
+    stored = bcrypt.hashpw(LONG.encode()[:72], bcrypt.gensalt(rounds=4)).decode()
+    assert _hasher().verify(LONG, stored)[0]
+
+
+# ==============================
+# VERIFICATION POOL
+# ==============================
+def test_pool_counts_hashes_and_verifications_apart():
+    pool = hashing.VerificationPool(_hasher(), workers=1, max_pending=1)
+    stored = pool.hash("secret")
+    assert pool.verify("secret", stored) == (True, None)
+    # The slot is released by a done-callback, which may run just after result() returns.
+    deadline = time.monotonic() + 5
+    while pool.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = pool.stats()
+    assert (stats["hashed"], stats["verified"], stats["in_flight"]) == (1, 1, 0)
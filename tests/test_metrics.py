@@ -0,0 +1,36 @@
+# test_metrics.py
+import psycopg2
+import pytest
+
+import metrics
+import migrations
+
+
+@pytest.fixture
+def conn(scratch_db):
+    conn = psycopg2.connect(**scratch_db)
+    migrations.migrate(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO queries (username, query_heading, query_description, priority, status)
+        SELECT 'alice', 'Ticket ' || i, 'Details', 'Low', 'Open' FROM generate_series(1, 5) i
+    """)
+    conn.commit()
+    cur.close()
+    yield conn
+    conn.close()
+
+
+def test_verify_runs_on_a_connection_already_in_a_transaction(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT 1")  # psycopg2 has opened a transaction
+    cur.close()
+    assert metrics.verify_metrics(conn) == {}
+    assert conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+def test_verify_reports_drifted_counters(conn):
+    cur = conn.cursor()
+    cur.execute("UPDATE ticket_metrics SET value = value + 2 WHERE metric = 'total'")
+    conn.commit()
+    cur.close()
+    assert metrics.verify_metrics(conn) == {"total": (7, 5)}
@@ -0,0 +1,37 @@
+# test_migrations.py
+from datetime import datetime
+
+import psycopg2
+
+import migrations
+
+VERSIONS = [version for version, _, _ in migrations.MIGRATIONS]
+
+
+def test_migrate_installs_every_migration_on_an_empty_database(scratch_db):
+    conn = psycopg2.connect(**scratch_db)
+    try:
+        assert migrations.migrate(conn) == VERSIONS
+        assert migrations.migrate(conn) == []
+    finally:
+        conn.close()
+
+def test_migrated_triggers_run_on_insert(scratch_db):
+    # PL/pgSQL bodies are only fully checked when they run, so write a ticket through them.
+    conn = psycopg2.connect(**scratch_db)
+    try:
+        migrations.migrate(conn)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO queries (username, query_heading, query_description, priority, status,
+                                 query_created_time, query_closed_time)
+            VALUES ('alice', 'Login fails', 'Cannot log in', 'High', 'Closed', %s, %s)
+            RETURNING due_at, sla_breached_at
+        """, (datetime(2025, 1, 1, 9), datetime(2025, 1, 3, 9)))
+        due_at, breached_at = cur.fetchone()
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    assert due_at == datetime(2025, 1, 1, 17)
+    assert breached_at == due_at
@@ -0,0 +1,72 @@
+# test_partitioning.py
+import psycopg2
+import pytest
+
+import migrations
+import partitioning
+
+
+@pytest.fixture
+def conn(scratch_db):
+    conn = psycopg2.connect(**scratch_db)
+    migrations.migrate(conn)
+    assert partitioning.convert_small(conn)
+    yield conn
+    conn.close()
+
+def _insert(cur, count, created="2023-03-01", start=1):
+    cur.execute("""
+        INSERT INTO queries (query_id, username, query_heading, status, query_created_time, query_closed_time)
+        SELECT i, 'client' || mod(i, 7), 'Ticket ' || i, 'Closed', %s::timestamp, %s::timestamp + interval '1 day'
+        FROM generate_series(%s, %s) i
+    """, (created, created, start, start + count - 1))
+
+
+# ==============================
+# UNIQUE IDS
+# ==============================
+def test_bulk_insert_and_archive_take_no_lock_per_row(conn):
+    # Well past max_locks_per_transaction * max_connections (6,400 by default).
+    cur = conn.cursor()
+    _insert(cur, 20_000)
+    conn.commit()
+    assert partitioning.archive_closed(conn, older_than_days=30, batch=20_000) == 20_000
+    cur.execute("SELECT (SELECT COUNT(*) FROM queries WHERE archived), (SELECT COUNT(*) FROM query_ids)")
+    assert cur.fetchone() == (20_000, 20_000)
+
+def test_duplicate_ids_are_refused(conn):
+    cur = conn.cursor()
+    _insert(cur, 3)
+    conn.commit()
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        _insert(cur, 1, created="2024-06-01", start=2)
+    conn.rollback()
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        cur.execute("UPDATE queries SET query_id = 1 WHERE query_id = 3")
+    conn.rollback()
+
+def test_deleted_ids_can_be_reused(conn):
+    cur = conn.cursor()
+    _insert(cur, 2)
+    cur.execute("DELETE FROM queries WHERE query_id = 2")
+    _insert(cur, 1, start=2)
+    cur.execute("SELECT COUNT(*) FROM query_ids")
+    assert cur.fetchone()[0] == 2
+
+
+# ==============================
+# ARCHIVE YEARS
+# ==============================
+def test_rows_archived_for_a_year_without_a_partition_reach_cold_storage(conn, tmp_path):
+    cur = conn.cursor()
+    _insert(cur, 50, created="2021-05-01")
+    conn.commit()
+    partitioning.archive_closed(conn, older_than_days=30)
+    cur.execute(f"SELECT COUNT(*) FROM {partitioning.ARCHIVE}_default")
+    assert cur.fetchone()[0] == 50
+    conn.rollback()
+
+    assert partitioning.move_to_cold_storage(conn, str(tmp_path), before_year=2022) == {2021: 50}
+    cur.execute("SELECT COUNT(*) FROM queries")
+    assert cur.fetchone()[0] == 0
+    assert len(partitioning.read_cold_storage(str(tmp_path))) == 50
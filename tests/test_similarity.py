@@ -0,0 +1,32 @@
+# test_similarity.py
+import similarity
+
+
+class ChainIndex:
+    """Tickets 1-2 and 2-3 share buckets (2 anchors its own bucket); 1 and 3 don't."""
+
+    SIMS = {(1, 2): 0.9, (2, 3): 0.9, (1, 3): 0.6}
+
+    def anchored_pairs(self, threshold):
+        return [(a, b, s) for (a, b), s in self.SIMS.items() if (a, b) != (1, 3)]
+
+    def pair_similarity(self, a, b):
+        return self.SIMS[(min(a, b), max(a, b))]
+
+
+# ==============================
+# CLUSTERING
+# ==============================
+def test_links_are_scored_against_the_root():
+    clusters, scores = similarity.cluster(ChainIndex(), threshold=0.8)
+    assert clusters == {1: [1, 2, 3]}
+    assert scores == {2: 0.9, 3: 0.6}
+
+def test_real_index_scores_match_the_estimate():
+    index = similarity.SimilarityIndex()
+    text = "Unable to log in to the billing portal after the password reset"
+    for qid in (1, 2, 3):
+        index.add(qid, "Login failure", text)
+    clusters, scores = similarity.cluster(index, threshold=0.8)
+    assert clusters == {1: [1, 2, 3]}
+    assert scores == {2: index.pair_similarity(1, 2), 3: index.pair_similarity(1, 3)}
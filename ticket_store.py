@@ -0,0 +1,187 @@
+# ticket_store.py
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# ==============================
+# LAYOUT
+# ==============================
+# Low-cardinality strings are stored as categoricals (int codes + one copy of each value).
+# Free text (description, contact details) is not held in the frame at all; it is
+# fetched by id on demand and kept in a small LRU.
+CATEGORICAL_COLUMNS = ["username", "status", "priority", "assigned_to", "query_heading"]
+COMPACT_COLUMNS = ["query_id"] + CATEGORICAL_COLUMNS + [
+    "sla_hours", "query_created_time", "query_closed_time", "updated_at",
+]
+LAZY_COLUMNS = ["query_description", "mail_id", "mobile_number"]
+
+# Re-read a few seconds behind the watermark: a transaction that stamped updated_at
+# before our last refresh may only have committed after it.
+WATERMARK_OVERLAP = pd.Timedelta(seconds=5)
+# The watermark never sees deleted rows, nor a transaction that committed later than the
+# overlap; a periodic full load catches both.
+FULL_RELOAD_SECONDS = 900.0
+
+
+class TicketStore:
+    """Process-wide compact copy of ``queries`` refreshed incrementally by ``updated_at``.
+
+    ``frame()`` returns an immutable snapshot: refreshes build a new frame and swap the
+    reference, so readers never see a half-merged state and need no lock.
+    """
+
+    def __init__(self, pool, text_cache_size=2000, full_reload_seconds=FULL_RELOAD_SECONDS):
+        self._pool = pool
+        self.full_reload_seconds = full_reload_seconds
+        self._full_loaded_at = 0.0
+        self.purges = None  # the caller's purge counter at the last requested full reload
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._frame = None
+        self._watermark = None
+        self._version = None
+        self._refreshed_at = 0.0
+        self._text = OrderedDict()
+        self._text_cache_size = text_cache_size
+        self.stats_counters = {"full_loads": 0, "incremental_refreshes": 0, "rows_merged": 0}
+
+    # ---------- read ----------
+    def frame(self):
+        if self._frame is None:
+            self.refresh()
+        return self._frame
+
+    def text(self, ids):
+        """Lazily load description / contact columns for ``ids``; returns a frame indexed by query_id."""
+        ids = [int(i) for i in ids]
+        with self._lock:
+            missing = [i for i in ids if i not in self._text]
+        if missing:
+            with self._pool.connection() as conn:
+                fetched = pd.read_sql(
+                    f"SELECT query_id, {', '.join(LAZY_COLUMNS)} FROM queries WHERE query_id = ANY(%s)",
+                    conn, params=[missing],
+                )
+            with self._lock:
+                for row in fetched.itertuples(index=False):
+                    self._text[row.query_id] = row[1:]
+                while len(self._text) > self._text_cache_size:
+                    self._text.popitem(last=False)
+        with self._lock:
+            rows = [(i, *self._text[i]) for i in ids if i in self._text]
+            for i in ids:
+                if i in self._text:
+                    self._text.move_to_end(i)
+        return pd.DataFrame(rows, columns=["query_id"] + LAZY_COLUMNS).set_index("query_id")
+
+    # ---------- refresh ----------
+    def _needs_refresh(self, version, max_age):
+        stale = time.monotonic() - self._refreshed_at > max_age
+        return self._frame is None or stale or version != self._version or self._full_reload_due()
+
+    def _full_reload_due(self):
+        return time.monotonic() - self._full_loaded_at > self.full_reload_seconds
+
+    def refresh_if_needed(self, version=None, max_age=60.0):
+        # ``version`` is the LISTEN hub's ticket counter: a change there means rows moved.
+        if self._needs_refresh(version, max_age):
+            with self._refresh_lock:
+                # Sessions that queued behind another refresher reuse its result.
+                if self._needs_refresh(version, max_age):
+                    self._refresh(version)
+
+    def refresh(self, version=None, full=False):
+        with self._refresh_lock:
+            self._refresh(version, full)
+
+    def request_full_reload(self):
+        """Make the next refresh a full load (e.g. after tickets were deleted elsewhere)."""
+        self._full_loaded_at = 0.0
+
+    def evict(self, ids):
+        """Drop tickets that left the table right away, without waiting for a full load."""
+        ids = [int(i) for i in ids]
+        with self._refresh_lock:
+            if self._frame is not None:
+                self._frame = self._frame.drop(index=ids, errors="ignore")
+            with self._lock:
+                for qid in ids:
+                    self._text.pop(qid, None)
+
+    def _refresh(self, version, full=False):
+        full = full or self._frame is None or self._full_reload_due()
+        watermark = None if full else self._watermark
+        sql = f"SELECT {', '.join(COMPACT_COLUMNS)} FROM queries"
+        params = []
+        if watermark is not None:
+            sql += " WHERE updated_at >= %s"
+            params.append((watermark - WATERMARK_OVERLAP).to_pydatetime())
+        with self._pool.connection() as conn:
+            delta = pd.read_sql(sql, conn, params=params)
+        delta = _compact(delta)
+
+        if watermark is None:
+            # Rows that are gone from the table simply aren't in the new frame.
+            merged = _by_id(delta)
+            self.stats_counters["full_loads"] += 1
+            self._full_loaded_at = time.monotonic()
+            self._watermark = None if delta.empty else delta["updated_at"].max()
+            with self._lock:
+                self._text.clear()
+        else:
+            merged = _merge(self._frame, delta)
+            self.stats_counters["incremental_refreshes"] += 1
+            if not delta.empty:
+                self._watermark = max(watermark, delta["updated_at"].max())
+                # Text for changed tickets may be stale.
+                with self._lock:
+                    for qid in delta["query_id"]:
+                        self._text.pop(int(qid), None)
+        self.stats_counters["rows_merged"] += len(delta)
+        self._frame = merged
+        self._version = version
+        self._refreshed_at = time.monotonic()
+
+    # ---------- metrics ----------
+    def memory_usage(self):
+        frame = self._frame
+        frame_bytes = int(frame.memory_usage(deep=True).sum()) if frame is not None else 0
+        with self._lock:
+            text_bytes = sum(len(v or "") for row in self._text.values() for v in row if isinstance(v, str))
+            text_rows = len(self._text)
+        return {
+            "rows": 0 if frame is None else len(frame),
+            "frame_bytes": frame_bytes,
+            "text_cache_rows": text_rows,
+            "text_cache_bytes": text_bytes,
+            "watermark": None if self._watermark is None else str(self._watermark),
+            **self.stats_counters,
+        }
+
+# ==============================
+# HELPERS
+# ==============================
+def _compact(df):
+    df["query_id"] = df["query_id"].astype("int32")
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+    df["sla_hours"] = df["sla_hours"].astype("Int16")
+    return df
+
+def _by_id(df):
+    df.index = df["query_id"].to_numpy()
+    return df
+
+def _merge(base, delta):
+    delta = _by_id(delta)
+    base = base.copy()
+    for col in CATEGORICAL_COLUMNS:
+        # Grow the shared category set so concat keeps the categorical dtype.
+        extra = pd.Index(delta[col].dropna().unique()).difference(base[col].cat.categories)
+        if len(extra):
+            base[col] = base[col].cat.add_categories(extra)
+        delta[col] = pd.Categorical(delta[col], categories=base[col].cat.categories)
+    base = base.drop(index=delta.index, errors="ignore")
+    return pd.concat([base, delta])
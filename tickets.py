@@ -0,0 +1,369 @@
+# tickets.py
+import re
+
+import pandas as pd
+from datetime import datetime
+
+import notify
+import sentiment
+import timeline
+
+# ==============================
+# COLUMNS
+# ==============================
+# Whitelist used for projection and grouping; identifiers are never taken from user input.
+TICKET_COLUMNS = [
+    "query_id",
+    "username",
+    "mail_id",
+    "mobile_number",
+    "query_heading",
+    "query_description",
+    "priority",
+    "status",
+    "assigned_to",
+    "sla_hours",
+    "due_at",
+    "sentiment_score",
+    "query_created_time",
+    "query_closed_time",
+]
+
+# Optional columns some deployments add to ``queries``; only used for grouping.
+OPTIONAL_COLUMNS = ["support_group"]
+
+# ==============================
+# FILTERS
+# ==============================
+def _in_or_eq(column, value, clauses, params):
+    if value is None:
+        return
+    if isinstance(value, (list, tuple, set)):
+        clauses.append(f"{column} = ANY(%s)")
+        params.append(list(value))
+    else:
+        clauses.append(f"{column} = %s")
+        params.append(value)
+
+def _where(username=None, assigned_to=None, status=None, priority=None,
+           created_from=None, created_to=None, archived=False):
+    # Dashboards read live tickets only, which prunes the archive partitions;
+    # archived=True reads the archive, None reads both.
+    clauses, params = [], []
+    if archived is not None:
+        clauses.append("archived" if archived else "NOT archived")
+    _in_or_eq("username", username, clauses, params)
+    _in_or_eq("assigned_to", assigned_to, clauses, params)
+    _in_or_eq("status", status, clauses, params)
+    _in_or_eq("priority", priority, clauses, params)
+    if created_from is not None:
+        clauses.append("query_created_time >= %s")
+        params.append(created_from)
+    if created_to is not None:
+        clauses.append("query_created_time < %s")
+        params.append(created_to)
+    return clauses, params
+
+def _check_columns(columns):
+    unknown = [c for c in columns if c not in TICKET_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown ticket columns: {unknown}")
+
+def _py(value):
+    # psycopg2 cannot adapt numpy scalars / pandas timestamps directly.
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+# ==============================
+# PAGED FETCH
+# ==============================
+def page_sql(columns=None, after=None, limit=50, descending=True, **filters):
+    columns = list(columns or TICKET_COLUMNS)
+    _check_columns(columns)
+    select_cols = columns + [c for c in ("query_id", "query_created_time") if c not in columns]
+
+    clauses, params = _where(**filters)
+    op = "<" if descending else ">"
+    if after is not None:
+        created, qid = after
+        if created is None:
+            clauses.append(f"(query_created_time IS NULL AND query_id {op} %s)")
+            params.append(qid)
+        else:
+            clauses.append(
+                f"((query_created_time, query_id) {op} (%s, %s) OR query_created_time IS NULL)"
+            )
+            params.extend([created, qid])
+
+    direction = "DESC" if descending else "ASC"
+    sql = f"SELECT {', '.join(select_cols)} FROM queries"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY query_created_time {direction} NULLS LAST, query_id {direction} LIMIT %s"
+    # One extra row tells us whether another page exists without a COUNT(*).
+    params.append(limit + 1)
+    return sql, params
+
+def fetch_tickets(conn, columns=None, after=None, limit=50, descending=True, **filters):
+    """Return ``(df, next_cursor)`` for one page of tickets ordered by created time.
+
+    ``after`` is the cursor returned by the previous page (keyset pagination on
+    ``(query_created_time, query_id)``, NULL times last); ``next_cursor`` is None on
+    the last page. ``filters`` accepts username, assigned_to, status, priority
+    (a value or a list), created_from and created_to.
+    """
+    columns = list(columns or TICKET_COLUMNS)
+    sql, params = page_sql(columns, after, limit, descending, **filters)
+    df = pd.read_sql(sql, conn, params=params)
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        next_cursor = (_py(last["query_created_time"]), _py(last["query_id"]))
+    return df[columns].reset_index(drop=True), next_cursor
+
+def get_ticket(conn, qid, columns=None):
+    """One ticket as a dict, or None if it does not exist."""
+    columns = list(columns or TICKET_COLUMNS)
+    _check_columns(columns)
+    cur = conn.cursor()
+    cur.execute(f"SELECT {', '.join(columns)} FROM queries WHERE query_id = %s", (int(qid),))
+    row = cur.fetchone()
+    cur.close()
+    return None if row is None else dict(zip(columns, row))
+
+# ==============================
+# SEARCH
+# ==============================
+# queries.search_vector is a stored tsvector (heading weighted A, description B) with a
+# GIN index, so matching is an index lookup; only the matching rows are ranked.
+SEARCH_CONFIG = "english"
+SEARCH_COLUMNS = ["query_id", "query_heading", "status", "priority", "assigned_to", "query_created_time"]
+
+def search_query(text):
+    """Turn free text into a tsquery string: every word must match, as a prefix."""
+    words = re.findall(r"\w+", (text or "").lower())
+    # One-letter prefixes match nearly everything; require those as whole words.
+    return " & ".join(f"{w}:*" if len(w) > 1 else w for w in words)
+
+def _search_where(text, **filters):
+    clauses, params = ["search_vector @@ q"], []
+    if text.strip().isdigit():
+        # Typing a ticket number finds that ticket too.
+        clauses = ["(search_vector @@ q OR query_id = %s)"]
+        params.append(int(text.strip()))
+    extra, extra_params = _where(**filters)
+    return clauses + extra, params + extra_params
+
+def search_tickets(conn, text, after=None, limit=20, **filters):
+    """Return ``(df, next_cursor)`` of tickets matching ``text``, best match first.
+
+    ``after`` is the ``(rank, query_id)`` cursor from the previous page; ``filters``
+    are the same as ``fetch_tickets``. An empty search returns no rows.
+    """
+    tsquery = search_query(text)
+    if not tsquery:
+        return pd.DataFrame(columns=SEARCH_COLUMNS + ["rank"]), None
+    clauses, params = _search_where(text, **filters)
+    sql = f"""
+        SELECT * FROM (
+            SELECT {', '.join(SEARCH_COLUMNS)}, ts_rank_cd(search_vector, q) AS rank
+            FROM queries, to_tsquery('{SEARCH_CONFIG}', %s) q
+            WHERE {' AND '.join(clauses)}
+        ) s
+    """
+    params.insert(0, tsquery)
+    if after is not None:
+        sql += " WHERE (rank, query_id) < (%s::real, %s)"
+        params.extend(after)
+    sql += " ORDER BY rank DESC, query_id DESC LIMIT %s"
+    params.append(limit + 1)
+    df = pd.read_sql(sql, conn, params=params)
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        next_cursor = (_py(last["rank"]), _py(last["query_id"]))
+    return df.reset_index(drop=True), next_cursor
+
+def search_facets(conn, text, **filters):
+    """Status and priority counts over every ticket matching ``text``: ``{"status": {...}, "priority": {...}}``."""
+    facets = {"status": {}, "priority": {}}
+    tsquery = search_query(text)
+    if not tsquery:
+        return facets
+    clauses, params = _search_where(text, **filters)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT GROUPING(status), status, priority, COUNT(*)
+        FROM queries, to_tsquery('{SEARCH_CONFIG}', %s) q
+        WHERE {' AND '.join(clauses)}
+        GROUP BY GROUPING SETS ((status), (priority))
+    """, [tsquery] + params)
+    for status_grouped, status, priority, count in cur.fetchall():
+        if status_grouped:
+            facets["priority"][priority] = count
+        else:
+            facets["status"][status] = count
+    cur.close()
+    return facets
+
+# ==============================
+# TRIAGE
+# ==============================
+TRIAGE_COLUMNS = ["query_id", "query_heading", "priority", "status", "assigned_to", "sentiment_score", "due_at"]
+
+def fetch_triage_queue(conn, limit=20, **filters):
+    """Open tickets by triage rank (priority boosted by negative sentiment), then deadline."""
+    clauses, params = _where(**filters)
+    clauses.insert(0, "status <> 'Closed'")
+    rank = sentiment.TRIAGE_RANK_SQL
+    return pd.read_sql(
+        f"""SELECT {', '.join(TRIAGE_COLUMNS)}, {rank} AS triage_rank
+            FROM queries WHERE {' AND '.join(clauses)}
+            ORDER BY {rank} DESC, due_at
+            LIMIT %s""",
+        conn, params=params + [limit]
+    )
+
+# ==============================
+# AGGREGATES
+# ==============================
+def count_tickets(conn, **filters):
+    clauses, params = _where(**filters)
+    sql = "SELECT COUNT(*) FROM queries"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    count = cur.fetchone()[0]
+    cur.close()
+    return count
+
+def has_ticket_column(conn, column):
+    cur = conn.cursor()
+    cur.execute(
+        """SELECT 1 FROM information_schema.columns
+           WHERE table_name = 'queries' AND column_name = %s""",
+        (column,)
+    )
+    found = cur.fetchone() is not None
+    cur.close()
+    return found
+
+def ticket_group_counts(conn, column, limit=None, **filters):
+    if column not in TICKET_COLUMNS + OPTIONAL_COLUMNS:
+        raise ValueError(f"Unknown ticket column: {column}")
+    clauses, params = _where(**filters)
+    clauses.append(f"{column} IS NOT NULL")
+    sql = (
+        f"SELECT {column}, COUNT(*) AS count FROM queries WHERE " + " AND ".join(clauses)
+        + f" GROUP BY {column} ORDER BY count DESC"
+    )
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return pd.read_sql(sql, conn, params=params)
+
+# ==============================
+# BULK UPDATE
+# ==============================
+def bulk_update_tickets(conn, ids, status, priority, assigned_to=None, changed_by=None):
+    """Apply one status/priority (and optional assignee) to many tickets in one transaction.
+
+    Returns ``{query_id: "updated" | "not_found"}``. ``query_closed_time`` is stamped
+    only when the new status is Closed, exactly like ``update_ticket``, and every
+    changed field is appended to the ticket history in the same transaction.
+    """
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return {}
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """UPDATE queries q SET
+               status = %s,
+               priority = %s,
+               assigned_to = COALESCE(%s, q.assigned_to),
+               query_closed_time = CASE WHEN %s = 'Closed' THEN %s ELSE q.query_closed_time END
+               FROM (SELECT query_id, status, priority, assigned_to FROM queries
+                     WHERE query_id = ANY(%s) ORDER BY query_id FOR UPDATE) old
+               WHERE q.query_id = old.query_id
+               RETURNING q.query_id, old.status, old.priority, old.assigned_to,
+                         q.status, q.priority, q.assigned_to""",
+            (status, priority, assigned_to or None, status, datetime.now(), ids)
+        )
+        fields = timeline.TRACKED_FIELDS
+        changes = [(row[0], dict(zip(fields, row[1:4])), dict(zip(fields, row[4:]))) for row in cur.fetchall()]
+        updated = {qid for qid, _, _ in changes}
+        timeline.record_changes(cur, changes, changed_by)
+        if updated:
+            # No per-row facets: listeners refresh every ticket view.
+            notify.publish(cur, "tickets", count=len(updated))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {qid: "updated" if qid in updated else "not_found" for qid in ids}
+
+# ==============================
+# WRITES
+# ==============================
+_FACETS = ["username", "status", "priority", "assigned_to"]
+
+def create_ticket(conn, username, email, mobile, heading, desc, assigned_to=None):
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO queries
+           (username, mail_id, mobile_number, query_heading, query_description,
+            status, priority, assigned_to, query_created_time)
+           VALUES (%s,%s,%s,%s,%s,'Open','Medium',%s,%s)
+           RETURNING query_id""",
+        (username, email, mobile, heading, desc, assigned_to, datetime.now())
+    )
+    qid = cur.fetchone()[0]
+    notify.publish(cur, "tickets", rows=[
+        {"username": username, "status": "Open", "priority": "Medium", "assigned_to": assigned_to}
+    ])
+    conn.commit()
+    cur.close()
+    return qid
+
+def update_ticket(conn, qid, status, heading, desc, priority, assigned_to=None, changed_by=None):
+    """Update one ticket; returns ``(before, after)`` dicts of username/status/priority/assigned_to.
+
+    An empty ``assigned_to`` keeps the current assignee. Both dicts are None if the
+    ticket does not exist. Changed status/priority/assignee values are appended to the
+    ticket history in the same transaction.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """UPDATE queries q SET
+           status=%s, query_heading=%s, query_description=%s, priority=%s,
+           assigned_to = COALESCE(%s, q.assigned_to),
+           query_closed_time = CASE WHEN %s='Closed' THEN %s ELSE q.query_closed_time END
+           FROM (SELECT query_id, username, status, priority, assigned_to
+                 FROM queries WHERE query_id=%s FOR UPDATE) old
+           WHERE q.query_id = old.query_id
+           RETURNING old.username, old.status, old.priority, old.assigned_to,
+                     q.username, q.status, q.priority, q.assigned_to""",
+        (status, heading, desc, priority, assigned_to or None, status, datetime.now(), int(qid))
+    )
+    row = cur.fetchone()
+    if row is None:
+        conn.commit()
+        cur.close()
+        return None, None
+    before, after = dict(zip(_FACETS, row[:4])), dict(zip(_FACETS, row[4:]))
+    timeline.record_changes(cur, [(qid, before, after)], changed_by)
+    notify.publish(cur, "tickets", rows=[before, after])
+    conn.commit()
+    cur.close()
+    return before, after
@@ -0,0 +1,146 @@
+# timeline.py
+import pandas as pd
+from psycopg2.extras import execute_values
+
+# ==============================
+# SCHEMA
+# ==============================
+# ticket_history is append-only: one row per changed field, written by the same
+# transaction as the ticket update. Rows can only disappear together with their ticket
+# (the FK cascade runs one trigger level deeper than a direct DELETE).
+TRACKED_FIELDS = ["status", "priority", "assigned_to"]
+
+HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS ticket_history (
+        id BIGSERIAL PRIMARY KEY,
+        query_id INT NOT NULL REFERENCES queries(query_id) ON DELETE CASCADE,
+        field VARCHAR(20) NOT NULL,
+        old_value TEXT,
+        new_value TEXT,
+        changed_by VARCHAR(100),
+        changed_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS idx_ticket_history_timeline
+        ON ticket_history (query_id, changed_at DESC, id DESC);
+
+    CREATE OR REPLACE FUNCTION ticket_history_append_only() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' OR pg_trigger_depth() < 2 THEN
+            RAISE EXCEPTION 'ticket_history is append-only';
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS ticket_history_append_only ON ticket_history;
+    CREATE TRIGGER ticket_history_append_only BEFORE UPDATE OR DELETE ON ticket_history
+        FOR EACH ROW EXECUTE FUNCTION ticket_history_append_only();
+
+    ALTER TABLE ticket_comments ALTER COLUMN commented_at SET DEFAULT now();
+    CREATE INDEX IF NOT EXISTS idx_ticket_comments_timeline
+        ON ticket_comments (query_id, commented_at DESC, id DESC);
+"""
+
+# ==============================
+# WRITES
+# ==============================
+def record_changes(cur, changes, changed_by=None):
+    """Append history rows on the caller's cursor (and so inside its transaction).
+
+    ``changes`` is an iterable of ``(query_id, before, after)`` with facet dicts; only
+    tracked fields whose value actually changed are written.
+    """
+    rows = [
+        (int(qid), field, before.get(field), after.get(field), changed_by)
+        for qid, before, after in changes
+        for field in TRACKED_FIELDS
+        if before.get(field) != after.get(field)
+    ]
+    if rows:
+        execute_values(cur, """
+            INSERT INTO ticket_history (query_id, field, old_value, new_value, changed_by)
+            VALUES %s
+        """, rows, page_size=1000)
+    return len(rows)
+
+def add_comment(conn, qid, author, comment, sentiment=None):
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """INSERT INTO ticket_comments (query_id, commented_by, comment, sentiment, commented_at)
+               VALUES (%s, %s, %s, %s, now())
+               RETURNING id""",
+            (int(qid), author, comment, sentiment)
+        )
+        comment_id = cur.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return comment_id
+
+# ==============================
+# READS
+# ==============================
+TIMELINE_COLUMNS = ["kind", "id", "at", "actor", "comment", "field", "old_value", "new_value"]
+
+def fetch_timeline(conn, qid, before=None, limit=50):
+    """Return ``(df, next_cursor)`` with one ticket's comments and changes, newest first.
+
+    Each branch walks its own ``(query_id, at DESC, id DESC)`` index and stops after
+    ``limit + 1`` rows, so a page costs the same however long the history is. ``before``
+    is the ``(at, kind, id)`` cursor returned by the previous page.
+    """
+    comment_where, change_where = "query_id = %s", "query_id = %s"
+    comment_params, change_params = [int(qid)], [int(qid)]
+    if before is not None:
+        comment_where += " AND (commented_at, 'comment', id) < (%s, %s, %s)"
+        change_where += " AND (changed_at, 'change', id) < (%s, %s, %s)"
+        comment_params.extend(before)
+        change_params.extend(before)
+    sql = f"""
+        (SELECT 'comment' AS kind, id, commented_at AS at, commented_by AS actor, comment,
+                NULL AS field, NULL AS old_value, NULL AS new_value
+         FROM ticket_comments WHERE {comment_where}
+         ORDER BY commented_at DESC, id DESC LIMIT %s)
+        UNION ALL
+        (SELECT 'change', id, changed_at, changed_by, NULL, field, old_value, new_value
+         FROM ticket_history WHERE {change_where}
+         ORDER BY changed_at DESC, id DESC LIMIT %s)
+        ORDER BY at DESC, kind DESC, id DESC
+        LIMIT %s
+    """
+    params = comment_params + [limit + 1] + change_params + [limit + 1, limit + 1]
+    df = pd.read_sql(sql, conn, params=params)
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        next_cursor = (last["at"].to_pydatetime(), last["kind"], int(last["id"]))
+    return df[TIMELINE_COLUMNS].reset_index(drop=True), next_cursor
+
+def latest_comments(conn, ids):
+    """``{query_id: {"commented_by", "comment", "commented_at"}}`` for many tickets in one query."""
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return {}
+    cur = conn.cursor()
+    # One index probe per ticket inside a single round trip.
+    cur.execute("""
+        SELECT t.query_id, c.commented_by, c.comment, c.commented_at
+        FROM unnest(%s::int[]) AS t(query_id)
+        CROSS JOIN LATERAL (
+            SELECT commented_by, comment, commented_at FROM ticket_comments
+            WHERE query_id = t.query_id
+            ORDER BY commented_at DESC, id DESC
+            LIMIT 1
+        ) c
+    """, (ids,))
+    latest = {
+        qid: {"commented_by": by, "comment": comment, "commented_at": at}
+        for qid, by, comment, at in cur.fetchall()
+    }
+    cur.close()
+    return latest
@@ -0,0 +1,344 @@
+# writebehind.py
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
+
+import instrumentation
+import notify
+
+log = logging.getLogger(__name__)
+
+# ==============================
+# ACKNOWLEDGEMENTS
+# ==============================
+class WriteFailed(Exception):
+    """A queued write that will not be committed: rejected, queue stopped, or failed for good."""
+
+
+class WriteQueueFull(WriteFailed):
+    pass
+
+
+class Ack:
+    """Resolves once the queued write is committed, or once it has failed for good."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.error = None
+
+    def _resolve(self, error=None):
+        self.error = error
+        self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """True once committed, False if still pending after ``timeout``; raises WriteFailed if it failed."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise WriteFailed("Could not save your change, please try again") from self.error
+        return True
+
+# ==============================
+# ROWS
+# ==============================
+# Chat rows are (sender, receiver, message, created_at, attempts, ack), doubts
+# (user_name, doubt, created_at, attempts, ack) and availability {username: (status,
+# updated_at, attempts, acks)}: attempts counts the flushes each row has failed.
+def _acks(chat, doubts, availability):
+    return ([row[-1] for row in chat] + [row[-1] for row in doubts]
+            + [ack for entry in availability.values() for ack in entry[3]])
+
+def _combine(parts):
+    chat, doubts, availability = [], [], {}
+    for part_chat, part_doubts, part_availability in parts:
+        chat += part_chat
+        doubts += part_doubts
+        availability.update(part_availability)
+    return chat, doubts, availability
+
+def _retry_or_give_up(failed, max_attempts):
+    """Count one more attempt on each failed row; ``(parts to requeue, [(acks, error)] to fail)``."""
+    retry, gave_up = [], []
+
+    def settle(part, attempts, acks, exc):
+        if attempts < max_attempts:
+            retry.append(part)
+        else:
+            gave_up.append((acks, exc))
+
+    for (chat, doubts, availability), exc in failed:
+        for row in chat:
+            row = row[:-2] + (row[-2] + 1, row[-1])
+            settle(([row], [], {}), row[-2], [row[-1]], exc)
+        for row in doubts:
+            row = row[:-2] + (row[-2] + 1, row[-1])
+            settle(([], [row], {}), row[-2], [row[-1]], exc)
+        for user, (status, at, attempts, acks) in availability.items():
+            settle(([], [], {user: (status, at, attempts + 1, acks)}), attempts + 1, acks, exc)
+    return retry, gave_up
+
+def _unreachable(exc):
+    # Connection trouble fails every row alike, so retrying rows one by one is pointless.
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError, pg_pool.PoolError))
+
+# ==============================
+# QUEUE
+# ==============================
+class WriteBehindQueue:
+    """Batches small support-side writes (chat, doubts, availability) into one transaction.
+
+    A daemon thread flushes every ``interval`` seconds after the first pending write, or
+    as soon as ``max_batch`` writes are waiting. Availability is coalesced to the latest
+    status per user. Every submit returns an :class:`Ack`. When a batch fails, its rows are
+    retried one per transaction so a single bad row cannot sink the rest; each row's ack
+    fails only after that row has failed ``max_attempts`` times. ``stop()`` (also run at exit) flushes
+    whatever is left. ``on_flush`` gets ``{"chat": [(sender, receiver)], "doubts":
+    [user_name], "availability": {username: status}}`` after each commit.
+    """
+
+    def __init__(self, pool, interval=0.25, max_batch=500, max_depth=10_000,
+                 max_attempts=3, retry_delay=1.0, on_flush=None):
+        self._pool = pool
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._on_flush = on_flush
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._chat, self._doubts, self._availability = [], [], {}
+        self._first_at = None
+        self._stopping = False
+        self._thread = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "flushes": 0,
+            "flushed_rows": 0,
+            "failures": 0,
+            "failed_writes": 0,
+            "max_depth": 0,
+            "flush_seconds": 0.0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "last_error": None,
+        }
+
+    # ---------- submit ----------
+    def _depth(self):
+        return len(self._chat) + len(self._doubts) + len(self._availability)
+
+    def _enqueue(self, put):
+        with self._cond:
+            if self._stopping:
+                raise WriteFailed("Write-behind queue is stopped")
+            if self._depth() >= self.max_depth:
+                self._stats["rejected"] += 1
+                raise WriteQueueFull("Too many pending writes, please retry in a moment")
+            ack = Ack()
+            put(ack)
+            self._stats["enqueued"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], self._depth())
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+        return ack
+
+    def submit_chat(self, sender, receiver, message):
+        now = datetime.now()
+        return self._enqueue(lambda ack: self._chat.append((sender, receiver, message, now, 0, ack)))
+
+    def submit_doubt(self, user_name, doubt):
+        now = datetime.now()
+        return self._enqueue(lambda ack: self._doubts.append((user_name, doubt, now, 0, ack)))
+
+    def submit_availability(self, username, status):
+        now = datetime.now()
+
+        def put(ack):
+            # Latest status wins; acks of superseded toggles resolve with the write that replaced them.
+            previous = self._availability.pop(username, None)
+            if previous is not None:
+                self._stats["coalesced"] += 1
+            acks = (previous[3] if previous else []) + [ack]
+            self._availability[username] = (status, now, 0, acks)
+        return self._enqueue(put)
+
+    # ---------- flush ----------
+    def _write(self, chat, doubts, availability):
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                if chat:
+                    execute_values(cur, """
+                        INSERT INTO support_chat (sender, receiver, message, created_at) VALUES %s
+                    """, [row[:4] for row in chat], page_size=1000)
+                    for sender, receiver in dict.fromkeys((row[0], row[1]) for row in chat):
+                        notify.publish(cur, "chat", sender=sender, receiver=receiver)
+                if doubts:
+                    execute_values(cur, """
+                        INSERT INTO support_doubts (user_name, doubt, created_at) VALUES %s
+                    """, [row[:3] for row in doubts], page_size=1000)
+                    for user_name in dict.fromkeys(row[0] for row in doubts):
+                        notify.publish(cur, "doubts", user_name=user_name)
+                if availability:
+                    execute_values(cur, """
+                        INSERT INTO support_availability (username, status, updated_at) VALUES %s
+                        ON CONFLICT (username)
+                        DO UPDATE SET status=EXCLUDED.status, updated_at=EXCLUDED.updated_at
+                    """, [(user, status, at) for user, (status, at, _, _) in sorted(availability.items())])
+                    for user, (status, _, _, _) in availability.items():
+                        notify.publish(cur, "availability", username=user, status=status)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def _requeue(self, chat, doubts, availability):
+        with self._cond:
+            self._chat = chat + self._chat
+            self._doubts = doubts + self._doubts
+            for user, (status, at, attempts, acks) in availability.items():
+                newer = self._availability.get(user)
+                if newer is None:
+                    self._availability[user] = (status, at, attempts, acks)
+                else:
+                    self._availability[user] = (newer[0], newer[1], newer[2], acks + newer[3])
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+
+    def _write_isolated(self, chat, doubts, availability):
+        """Retry a failed batch one row per transaction; returns ``(written, [(part, error)])``."""
+        parts = ([([row], [], {}) for row in chat] + [([], [row], {}) for row in doubts]
+                 + [([], [], {user: entry}) for user, entry in availability.items()])
+        written, failed = [], []
+        for i, part in enumerate(parts):
+            try:
+                self._write(*part)
+                written.append(part)
+            except Exception as exc:
+                failed.append((part, exc))
+                if _unreachable(exc):
+                    # The database is gone, not the row; the rest waits for the next flush.
+                    failed.extend((rest, exc) for rest in parts[i + 1:])
+                    break
+        return written, failed
+
+    def flush_once(self):
+        """Write everything pending, in one transaction unless it fails; returns the rows written."""
+        with self._flush_lock:
+            with self._cond:
+                chat, doubts, availability = self._chat, self._doubts, self._availability
+                self._chat, self._doubts, self._availability = [], [], {}
+                self._first_at = None
+            if not (chat or doubts or availability):
+                return 0
+            batch = (chat, doubts, availability)
+            start = time.perf_counter()
+            with instrumentation.span("write_behind.flush"):
+                try:
+                    self._write(*batch)
+                    written, failed = [batch], []
+                except Exception as exc:
+                    if _unreachable(exc):
+                        written, failed = [], [(batch, exc)]
+                    else:
+                        written, failed = self._write_isolated(*batch)
+            elapsed = time.perf_counter() - start
+
+            chat, doubts, availability = _combine(written)
+            rows = len(chat) + len(doubts) + len(availability)
+            retry, gave_up = _retry_or_give_up(failed, self.max_attempts)
+            with self._cond:
+                if failed:
+                    self._stats["failures"] += 1
+                    self._stats["last_error"] = str(failed[-1][1])
+                    self._stats["failed_writes"] += sum(len(acks) for acks, _ in gave_up)
+                if written:
+                    self._stats["flushes"] += 1
+                    self._stats["flushed_rows"] += rows
+                    self._stats["flush_seconds"] += elapsed
+                    self._stats["last_flush_seconds"] = elapsed
+                    self._stats["max_flush_seconds"] = max(self._stats["max_flush_seconds"], elapsed)
+            if retry:
+                self._requeue(*_combine(retry))
+            for acks, exc in gave_up:
+                for ack in acks:
+                    ack._resolve(exc)
+            for ack in _acks(chat, doubts, availability):
+                ack._resolve()
+        if written and self._on_flush:
+            self._on_flush({
+                "chat": list(dict.fromkeys((row[0], row[1]) for row in chat)),
+                "doubts": list(dict.fromkeys(row[0] for row in doubts)),
+                "availability": {user: status for user, (status, _, _, _) in availability.items()},
+            })
+        if failed:
+            raise failed[-1][1]
+        return rows
+
+    # ---------- thread ----------
+    def _due(self):
+        if self._first_at is None:
+            return False
+        return self._depth() >= self.max_batch or time.monotonic() - self._first_at >= self.interval
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._due():
+                    timeout = None if self._first_at is None else max(
+                        0.0, self.interval - (time.monotonic() - self._first_at))
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+            try:
+                self.flush_once()
+            except Exception as exc:
+                log.warning("Write-behind flush failed: %s", exc)
+                time.sleep(self.retry_delay)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=10.0):
+        """Stop the flusher and write what is still queued (retrying up to ``max_attempts``)."""
+        with self._cond:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        for _ in range(self.max_attempts):
+            try:
+                self.flush_once()
+                return
+            except Exception as exc:
+                log.warning("Write-behind flush on shutdown failed: %s", exc)
+                time.sleep(self.retry_delay)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["depth"] = self._depth()
+        stats["avg_flush_seconds"] = stats["flush_seconds"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats